@@ -2,363 +2,319 @@
 import streamlit as st
 import pandas as pd
 import duckdb
+import hashlib
 import json
 import os
+import time
 from datetime import timedelta, date
-from typing import List, Dict, Any
-import pytz
+from typing import List, Dict, Any, Iterator, Optional
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 
+from ingest import (IngestCache, content_hash, read_table_cached, describe_stats, stream_to_store, store_glob,
+                    iter_store_batches, to_utc_datetime, COERCION_REPORT_COLUMNS, STORE_BATCH_ROWS)
+from telemetry import (TelemetryFrame, SparseSignals, as_machine_category, signal_stats, bucket_mode, history_changed,
+                       resample_sql, downsample_frame, RESAMPLE_INTERVALS, DOWNSAMPLE_WIDTH)
+from events import EventTracker, evict_state_dirs, EVENT_STATE_DIR, PGM_STRING, MODE_STRING
+from catalog import SignalCatalog
+from rollups import RollupPyramid
+from warehouse import AnalyticsWarehouse, EventsWindow, QueryCache, window_params
+from shifts import SHIFT_KPI_SQL, SHIFT_NAMES, SHIFT_TZ
+from display import DisplayCache, plot_time, timeseries_figure, value_ranges, Y_AXES
+from stages import StageCache, StageLog
+
 st.set_page_config(page_title="Machine Analytics — Extended", layout="wide")
 
 # =============================
 # Constants & schema
 # =============================
-DEFAULT_TZ = "Europe/Central"  # Generic Central European timezone
 MACHINE_COL = "name"
 TIMESTAMP_COL = "time"
 
-# Helpful optional fields
-EXEC_STRING = "exec_STRING"
-EXEC_PROG_COMPLETED = "exec_program_completed_BOOL"
-EXEC_ACTIVE = "exec_active_BOOL"
-EXEC_STOPPED = "exec_stopped_BOOL"
-EXEC_READY = "exec_ready_BOOL"
-PGM_STRING = "pgm_STRING"
-MODE_STRING = "mode_STRING"
-
 # =============================
 # Helpers
 # =============================
+@st.cache_resource(show_spinner=False)
+def get_ingest_cache():
+    """Persistent Parquet ingest cache shared by all sessions (None if the directory is not writable)."""
+    try:
+        return IngestCache()
+    except OSError:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_event_tracker(dataset_key: str) -> EventTracker:
+    """Incremental part/setup detector for one dataset, persisted under EVENT_STATE_DIR and shared by all sessions."""
+    return EventTracker(os.path.join(EVENT_STATE_DIR, dataset_key))
+
+@st.cache_resource(show_spinner=False)
+def get_signal_catalog(dataset_key: str) -> SignalCatalog:
+    """Per-signal/per-machine statistics of one dataset, kept next to its event state and shared by all sessions."""
+    return SignalCatalog(os.path.join(EVENT_STATE_DIR, dataset_key))
+
+@st.cache_resource(show_spinner=False)
+def get_rollup_pyramid(dataset_key: str) -> RollupPyramid:
+    """10 s/1 min/1 h/1 d rollups of one dataset's signals, kept next to its event state and shared by all sessions."""
+    return RollupPyramid(os.path.join(EVENT_STATE_DIR, dataset_key))
+
+@st.cache_resource(show_spinner=False)
+def get_warehouse(dataset_key: str) -> AnalyticsWarehouse:
+    """Persistent DuckDB database of one dataset (typed tables), kept next to its event state and shared by all sessions."""
+    return AnalyticsWarehouse(os.path.join(EVENT_STATE_DIR, dataset_key), MACHINE_COL, TIMESTAMP_COL)
+
+@st.cache_resource(show_spinner=False)
+def get_query_cache() -> QueryCache:
+    """SQL result cache shared by all sessions (entries are keyed to SQL, parameters and dataset version)."""
+    return QueryCache()
+
+@st.cache_resource(show_spinner=False)
+def get_display_cache() -> DisplayCache:
+    """Arrow tables for st.dataframe shared by all sessions (keyed to table, window and dataset version)."""
+    return DisplayCache()
+
+@st.cache_resource(show_spinner=False)
+def get_stage_cache() -> StageCache:
+    """Results of the expensive app stages shared by all sessions (keyed to dataset version, window and parameters)."""
+    return StageCache()
+
+@st.cache_resource(show_spinner=False)
+def get_refreshed() -> Dict[str, str]:
+    """Content id the states of each dataset were last refreshed with, shared by all sessions."""
+    return {}
+
+def dataset_key(sources: List) -> str:
+    """Stable id of the dataset's lineage: the names of its files (paths or uploads), whatever they hold.
+
+    A file that grows under the same name keeps its incremental state, which
+    checks on refresh that the rows it already processed are unchanged.
+    """
+    names = (src if isinstance(src, (str, os.PathLike)) else src.name for src in sources)
+    return hashlib.sha1("|".join(sorted(map(os.fspath, names))).encode("utf-8")).hexdigest()[:16]
+
+def content_key(sources: List) -> str:
+    """Id of the loaded content: the content hashes of the files (paths or uploads), whatever their names."""
+    return hashlib.sha1("|".join(sorted(content_hash(src) for src in sources)).encode("utf-8")).hexdigest()[:16]
+
 @st.cache_data(show_spinner=False)
-def load_files(files: List) -> pd.DataFrame:
+def load_files(files: List, sparse: bool = False):
+    """Read uploaded files into one frame with typed signal columns. Returns (data, coercion_report).
+
+    `data` is the prepared wide DataFrame, or SparseSignals when `sparse` is set.
+    """
     if not files:
-        return pd.DataFrame()
+        return pd.DataFrame(), pd.DataFrame(columns=COERCION_REPORT_COLUMNS)
     dfs = []
+    reports = []
     for f in files:
         fn = f.name.lower()
+        if not fn.endswith((".csv", ".parquet", ".json", ".jsonl")):
+            st.warning(f"Unsupported file: {fn}")
+            continue
         try:
-            if fn.endswith(".csv"):
-                # More robust CSV reading with error handling
-                try:
-                    # First try with C engine (faster) - auto-detect separator
-                    df = pd.read_csv(f, low_memory=False, encoding='utf-8', on_bad_lines='skip', sep=None, engine='python')
-                    if len(df.columns) == 1:  # If only one column, separator detection failed
-                        raise ValueError("Separator detection failed")
-                except Exception:
-                    # Fallback: try common separators
-                    f.seek(0)  # Reset file position
-                    for sep in [';', ',', '\t', '|']:
-                        try:
-                            df = pd.read_csv(f, encoding='utf-8', on_bad_lines='skip', sep=sep)
-                            if len(df.columns) > 1:  # Successfully parsed multiple columns
-                                break
-                            f.seek(0)  # Reset for next separator
-                        except Exception:
-                            f.seek(0)
-                            continue
-                    else:
-                        # Last resort: use first line to detect separator
-                        f.seek(0)
-                        first_line = f.readline()
-                        if ';' in first_line and first_line.count(';') > first_line.count(','):
-                            sep = ';'
-                        elif ',' in first_line:
-                            sep = ','
-                        elif '\t' in first_line:
-                            sep = '\t'
-                        else:
-                            sep = ','
-                        f.seek(0)
-                        df = pd.read_csv(f, encoding='utf-8', on_bad_lines='skip', sep=sep)
-            elif fn.endswith(".parquet"):
-                df = pd.read_parquet(f)
-            elif fn.endswith(".json") or fn.endswith(".jsonl"):
-                df = pd.read_json(f, lines=fn.endswith(".jsonl"))
-            else:
-                st.warning(f"Unsupported file: {fn}")
-                continue
+            # Typed Parquet from the ingest cache, or (CSV) dialect sniff + one C-engine parse
+            df, stats = read_table_cached(f, fn, get_ingest_cache(), TIMESTAMP_COL, MACHINE_COL)
             dfs.append(df)
+            reports.append(stats["coercion"])
             # Debug info
-            st.sidebar.info(f"✅ Loaded {fn}: {len(df)} rows, {len(df.columns)} columns")
+            st.sidebar.info(f"✅ Loaded {fn}: {describe_stats(stats)}")
         except Exception as e:
             st.error(f"Error reading file {fn}: {str(e)}")
             continue
     if not dfs:
-        return pd.DataFrame()
+        return pd.DataFrame(), pd.DataFrame(columns=COERCION_REPORT_COLUMNS)
     df = pd.concat(dfs, ignore_index=True)
-    return df
+    return with_storage(prepare_frame(df), sparse), pd.concat(reports, ignore_index=True)
 
-def coerce_timestamp(df: pd.DataFrame, col: str) -> pd.DataFrame:
-    out = df.copy()
-    if col in out.columns:
-        out[col] = pd.to_datetime(out[col], errors="coerce", utc=True)
+@st.cache_data(show_spinner=False)
+def stream_files_to_store(files: List):
+    """Streaming ingest: append uploads chunk by chunk to a Parquet store. Returns (store_dir, coercion_report)."""
+    sources = []
+    for f in files:
+        fn = f.name.lower()
+        if fn.endswith((".csv", ".jsonl", ".parquet")):
+            sources.append((f, fn))
+        else:
+            st.warning(f"Streaming ingest skips {fn} (use CSV, JSONL or Parquet)")
+    if not sources:
+        return None, pd.DataFrame(columns=COERCION_REPORT_COLUMNS)
+    store_dir, stats = stream_to_store(sources, timestamp_col=TIMESTAMP_COL, machine_col=MACHINE_COL)
+    for fs in stats["files"]:
+        st.sidebar.info(f"🌊 Streamed {fs['file']}: {fs['rows']} rows in {fs['chunks']} chunks, {fs['seconds']:.2f}s")
+    return store_dir, stats["coercion"]
+
+def store_events_sql(store_dir: str) -> str:
+    """SELECT over all part files of a telemetry store."""
+    return f"SELECT * FROM read_parquet('{store_glob(store_dir)}', union_by_name=true)"
+
+def store_connection() -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(database=":memory:")
+    con.execute("SET TimeZone='UTC'")
+    return con
+
+@st.cache_data(show_spinner=False)
+def store_overview(store_dir: str) -> Dict[str, Any]:
+    """Columns, row count, machines and time range of a store, computed inside DuckDB."""
+    con = store_connection()
+    columns = [r[0] for r in con.execute(f"DESCRIBE {store_events_sql(store_dir)}").fetchall()]
+    out = {"columns": columns}
+    if MACHINE_COL in columns and TIMESTAMP_COL in columns:
+        n_rows, t_min, t_max = con.execute(
+            f"SELECT COUNT(*), MIN({TIMESTAMP_COL}), MAX({TIMESTAMP_COL}) FROM ({store_events_sql(store_dir)})"
+        ).fetchone()
+        machines = con.execute(
+            f"SELECT DISTINCT CAST({MACHINE_COL} AS VARCHAR) FROM ({store_events_sql(store_dir)}) ORDER BY 1"
+        ).fetchall()
+        out.update(rows=n_rows, machines=[m[0] for m in machines], t_min=pd.Timestamp(t_min), t_max=pd.Timestamp(t_max))
     return out
 
-def iqr_bounds(s: pd.Series, k: float = 1.5):
-    q1 = s.quantile(0.25)
-    q3 = s.quantile(0.75)
-    iqr = q3 - q1
-    return q1 - k * iqr, q3 + k * iqr
-
-def assign_shift(ts: pd.Series, tz: str = DEFAULT_TZ) -> pd.Series:
-    """Map timestamps to shifts: 06–14, 14–22, 22–06 (Central European time)."""
-    if ts.dt.tz is None:
-        ts = ts.dt.tz_localize("UTC")
-    local = ts.dt.tz_convert(pytz.timezone(tz))
-    h = local.dt.hour
-    shift = pd.Series(index=ts.index, dtype="object")
-    shift[(h >= 6) & (h < 14)] = "06-14"
-    shift[(h >= 14) & (h < 22)] = "14-22"
-    shift[(h >= 22) | (h < 6)] = "22-06"
-    return shift.astype(str)
+def query_store_tail(store_dir: str, since) -> Iterator[pd.DataFrame]:
+    """Rows of the store newer than `since` (all rows if None) in [machine, time] order, in bounded batches
+    for the incremental state."""
+    con = store_connection()
+    where, params = "", []
+    if since is not None:
+        where, params = f"WHERE {TIMESTAMP_COL} > ?", [since.to_pydatetime()]
+    con.execute(f"SELECT * FROM ({store_events_sql(store_dir)}) {where} ORDER BY {MACHINE_COL}, {TIMESTAMP_COL}", params)
+    for batch in iter_store_batches(con, STORE_BATCH_ROWS, TIMESTAMP_COL, MACHINE_COL):
+        yield batch.assign(**{MACHINE_COL: as_machine_category(batch[MACHINE_COL])})
+
+def reset_edited_states(store_dir: str, *states) -> None:
+    """Reset the incremental states whose processed rows are no longer the first rows of the store (edited sources)."""
+    seens = [state.seen() for state in states]
+    watermarks = [s[1] for seen in seens for s in seen.values()]
+    if not watermarks:
+        return
+    con = store_connection()
+    con.execute(f"SELECT * FROM ({store_events_sql(store_dir)}) WHERE {TIMESTAMP_COL} <= ? "
+                f"ORDER BY {MACHINE_COL}, {TIMESTAMP_COL}", [pd.Timestamp(max(watermarks), tz="UTC").to_pydatetime()])
+    batches = (TelemetryFrame(batch.assign(**{MACHINE_COL: as_machine_category(batch[MACHINE_COL])}),
+                              MACHINE_COL, TIMESTAMP_COL, assume_sorted=True)
+               for batch in iter_store_batches(con, STORE_BATCH_ROWS, TIMESTAMP_COL, MACHINE_COL))
+    for state, changed in zip(states, history_changed(batches, seens)):
+        if changed:
+            state.reset()
+
+def store_since(machines: List, *states) -> Optional[pd.Timestamp]:
+    """Oldest watermark over incremental states (EventTracker, SignalCatalog, RollupPyramid, AnalyticsWarehouse);
+    None if any lacks a machine."""
+    watermarks = []
+    for state in states:
+        seen = state.seen()
+        if not set(map(str, machines)) <= set(seen):
+            return None
+        watermarks += [s[1] for s in seen.values()]
+    return pd.Timestamp(min(watermarks), tz="UTC") if watermarks else None
 
-# =============================
-# Event detection
-# =============================
-def detect_part_completed(df: pd.DataFrame) -> pd.DataFrame:
-    """Return rows [name, time, cycle_time_s] for completed units."""
-    tmp = df.copy()
-    # normalize types
-    if EXEC_PROG_COMPLETED in tmp.columns:
-        tmp[EXEC_PROG_COMPLETED] = tmp[EXEC_PROG_COMPLETED].astype(str).str.lower().isin(["1","true","t","yes","y"])
-    if EXEC_STRING in tmp.columns:
-        tmp[EXEC_STRING] = tmp[EXEC_STRING].astype(str)
-    if PGM_STRING in tmp.columns:
-        tmp[PGM_STRING] = tmp[PGM_STRING].astype(str)
-
-    tmp = tmp.sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
-
-    marks = []
-
-    # (1) Rising edge of program_completed
-    if EXEC_PROG_COMPLETED in tmp.columns:
-        tmp["_epc"] = tmp[EXEC_PROG_COMPLETED].fillna(False)
-        tmp["_epc_prev"] = tmp.groupby(MACHINE_COL)["_epc"].shift(fill_value=False)
-        rising_idx = tmp.index[(tmp["_epc"]) & (~tmp["_epc_prev"])].tolist()
-        for i in rising_idx:
-            marks.append((tmp.loc[i, MACHINE_COL], tmp.loc[i, TIMESTAMP_COL]))
-
-    # (2) Textual cues in exec string
-    if EXEC_STRING in tmp.columns:
-        cue = tmp[EXEC_STRING].str.upper().str.contains("COMPLETED|COMPLETE|END|FINISH", regex=True, na=False)
-        for i, row in tmp.loc[cue, [MACHINE_COL, TIMESTAMP_COL]].iterrows():
-            marks.append((row[MACHINE_COL], row[TIMESTAMP_COL]))
-
-    # (3) For CNC data: use changes in cycle time values as indicators
-    if not marks:
-        # Look for cycle time columns in CNC data
-        cycle_cols = [col for col in tmp.columns if 'cycleTime' in col or 'CycleTime' in col]
-        if cycle_cols:
-            # Use first cycle time column
-            cycle_col = cycle_cols[0]
-            tmp[cycle_col] = pd.to_numeric(tmp[cycle_col], errors='coerce')
-            # Detect significant changes in cycle time as completion events
-            for machine in tmp[MACHINE_COL].unique():
-                machine_data = tmp[tmp[MACHINE_COL] == machine].copy()
-                machine_data = machine_data.dropna(subset=[cycle_col])
-                if len(machine_data) > 1:
-                    # Find rows where cycle time changes significantly
-                    machine_data['cycle_diff'] = machine_data[cycle_col].diff().abs()
-                    if not machine_data['cycle_diff'].isna().all():
-                        threshold = machine_data['cycle_diff'].quantile(0.8)  # Top 20% of changes
-                        significant_changes = machine_data[machine_data['cycle_diff'] > threshold]
-                        for _, row in significant_changes.iterrows():
-                            marks.append((row[MACHINE_COL], row[TIMESTAMP_COL]))
-
-    # (4) Fallback: program change
-    if not marks and PGM_STRING in tmp.columns:
-        tmp["_pgm_change"] = tmp.groupby(MACHINE_COL)[PGM_STRING].transform(lambda s: s.ne(s.shift()))
-        idx = tmp.index[tmp["_pgm_change"]].tolist()
-        for i in idx:
-            marks.append((tmp.loc[i, MACHINE_COL], tmp.loc[i, TIMESTAMP_COL]))
-
-    # (5) Ultimate fallback: create artificial events based on time intervals
-    if not marks:
-        for machine in tmp[MACHINE_COL].unique():
-            machine_data = tmp[tmp[MACHINE_COL] == machine].copy()
-            if len(machine_data) > 10:  # Only if we have enough data
-                # Create events every ~100 rows (simulating regular production)
-                step = max(10, len(machine_data) // 20)  # At least 10, but roughly 20 events total
-                for i in range(step, len(machine_data), step):
-                    marks.append((machine, machine_data.iloc[i][TIMESTAMP_COL]))
-
-    if not marks:
-        return pd.DataFrame(columns=[MACHINE_COL, TIMESTAMP_COL, "cycle_time_s"])
-
-    parts = pd.DataFrame(marks, columns=[MACHINE_COL, TIMESTAMP_COL]).drop_duplicates().dropna()
-    parts = parts.sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
-    parts["cycle_time_s"] = parts.groupby(MACHINE_COL)[TIMESTAMP_COL].diff().dt.total_seconds()
-    parts = parts.dropna(subset=["cycle_time_s"])
-    if not parts.empty:
-        low, high = iqr_bounds(parts["cycle_time_s"])
-        parts = parts[(parts["cycle_time_s"] >= max(0, low)) & (parts["cycle_time_s"] <= high)]
-    return parts
-
-def detect_setup_intervals(df: pd.DataFrame) -> pd.DataFrame:
-    """Return [name, start, end, setup_s] either via explicit setup mode or long gaps around program changes."""
-    d = df.copy().sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
-
-    # explicit setup via MODE_STRING
-    out = []
-    explicit_done = False
-    if MODE_STRING in d.columns:
-        mode = d[MODE_STRING].astype(str).str.upper()
-        d["_is_setup"] = mode.str.contains("SETUP|RÜST|RUEST|RUEST", regex=True, na=False)
-        for mid, g in d.groupby(MACHINE_COL):
-            g = g[[TIMESTAMP_COL, "_is_setup"]].reset_index(drop=True)
-            block_start = None
-            for i, row in g.iterrows():
-                if row["_is_setup"] and block_start is None:
-                    block_start = row[TIMESTAMP_COL]
-                is_last = (i == len(g) - 1)
-                if (block_start is not None) and (not row["_is_setup"] or is_last):
-                    end_time = g.iloc[i][TIMESTAMP_COL]
-                    setup_s = (end_time - block_start).total_seconds()
-                    if setup_s > 0:
-                        out.append({MACHINE_COL: mid, "start": block_start, "end": end_time, "setup_s": setup_s})
-                    block_start = None
-        if out:
-            explicit_done = True
-
-    # heuristic via program changes and long gaps
-    if not explicit_done:
-        THRESHOLD_S = 5 * 60
-        if PGM_STRING in d.columns:
-            d["_pgm_change"] = d.groupby(MACHINE_COL)[PGM_STRING].transform(lambda s: s.ne(s.shift()))
-        else:
-            d["_pgm_change"] = False
-        for mid, g in d.groupby(MACHINE_COL):
-            g = g[[TIMESTAMP_COL, "_pgm_change"]].reset_index(drop=True)
-            for i in range(1, len(g)):
-                prev_t = g.loc[i-1, TIMESTAMP_COL]
-                curr_t = g.loc[i, TIMESTAMP_COL]
-                gap = (curr_t - prev_t).total_seconds()
-                is_change = bool(g.loc[i, "_pgm_change"])
-                if is_change and gap >= THRESHOLD_S:
-                    out.append({MACHINE_COL: mid, "start": prev_t, "end": curr_t, "setup_s": gap})
-
-    return pd.DataFrame(out, columns=[MACHINE_COL, "start", "end", "setup_s"]) if out else pd.DataFrame(columns=[MACHINE_COL, "start", "end", "setup_s"])
+def coerce_timestamp(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """Rewrite only `col` as datetime64[ns, UTC] (integer epochs s/ms/us/ns via a zero-copy view) and drop NaT rows."""
+    if col in df.columns:
+        df[col] = to_utc_datetime(df[col])
+        valid = df[col].notna()
+        if not valid.all():
+            df = df.loc[valid]
+    return df
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """One-time load step: UTC timestamps, categorical machine names, rows sorted by [machine, time].
+
+    Every rerun then indexes this order (TelemetryFrame) instead of re-sorting,
+    and the sidebar filters become binary searches on it.
+    """
+    if df.empty or TIMESTAMP_COL not in df.columns or MACHINE_COL not in df.columns:
+        return df
+    df = coerce_timestamp(df, TIMESTAMP_COL)
+    machine = as_machine_category(df[MACHINE_COL])
+    # stable sort on (category code, epoch ns): one gather of the frame, no string comparisons
+    order = np.lexsort((df[TIMESTAMP_COL].to_numpy(dtype="datetime64[ns]"), machine.cat.codes.to_numpy()))
+    df = df.take(order)
+    df.index = pd.RangeIndex(len(df))
+    df[MACHINE_COL] = machine.array.take(order)
+    return df
+
+def with_storage(data, sparse: bool):
+    """Convert a prepared dataset between wide DataFrame and sparse long storage (lossless both ways)."""
+    if sparse and isinstance(data, pd.DataFrame) and not data.empty:
+        return SparseSignals.from_frame(TelemetryFrame(data, MACHINE_COL, TIMESTAMP_COL, assume_sorted=True))
+    if not sparse and isinstance(data, SparseSignals):
+        return data.to_wide()
+    return data
 
 # =============================
 # Dynamic metrics discovery
 # =============================
-NUMERIC_SUFFIXES = ("_REAL", "_LREAL", "_BOOL", "_INT", "_FLOAT", "_DOUBLE")
 EXCLUDE_COLS = {MACHINE_COL, TIMESTAMP_COL}
 
-def numeric_dynamic_columns(df: pd.DataFrame, top_k: int = 5) -> List[str]:
-    """Pick top-k numeric columns that actually change over time (by change count)."""
-    candidates = []
-    for col in df.columns:
-        if col in EXCLUDE_COLS: 
-            continue
-        if col.endswith("_STRING"):
-            continue
-        # accept numeric dtype or boolean-like columns
-        if pd.api.types.is_numeric_dtype(df[col]) or col.endswith(NUMERIC_SUFFIXES):
-            candidates.append(col)
+def dynamic_scores(src, catalog_stats: Optional[pd.DataFrame]) -> Dict[str, int]:
+    """Change-count score per numeric candidate column of `src`.
+
+    Scores come from the signal catalog when it covers the window, otherwise
+    all candidates are scanned in one pass (telemetry.signal_stats).
+    """
+    # signal columns are typed at load time (see ingest.coerce_numeric_columns)
+    candidates = [c for c in src.signal_columns() if c not in EXCLUDE_COLS and not c.endswith("_STRING")]
+    if catalog_stats is not None:
+        stats = catalog_stats.reindex(candidates)
+        stats = stats.assign(changes=stats["changes"].fillna(0), distinct=stats["distinct"].fillna(0),
+                             is_bool=stats["is_bool"].fillna(False).astype(bool))
+    else:
+        stats = signal_stats(src, candidates)
+    # Score by number of changes between consecutive points per machine, plus a
+    # small bonus for higher variance; columns with a single value score 0
+    variance = stats["variance"].astype(float)
+    bonus = np.where(~stats["is_bool"] & (variance > 0), np.minimum(10, variance.fillna(0) // 1000), 0)
+    score = np.where(stats["distinct"] > 1, stats["changes"] + bonus, 0)
+    return dict(zip(candidates, score.astype(int).tolist()))
+
+def numeric_dynamic_columns(src, version: tuple, catalog_stats: Optional[pd.DataFrame] = None,
+                            top_k: int = 5, log: Optional[StageLog] = None) -> List[str]:
+    """Pick top-k numeric columns that actually change over time (by change count).
+
+    `src` is a TelemetryFrame (wide) or SparseSignals (long); the scores are a
+    stage keyed by `version` (filter window + dataset version), so reruns and
+    appended rows are told apart. `catalog_stats` (SignalCatalog.summary of the
+    selected machines) replaces the scan when the window spans those machines'
+    whole history.
+    """
+    scores = get_stage_cache().get("dynamic scores", version, lambda: dynamic_scores(src, catalog_stats), log)
+    candidates = list(scores)
     if not candidates:
         return []
+    ordered = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
 
-    # Score by number of changes > epsilon between consecutive points per machine, then sum
-    eps = 1e-9
-    scores = {}
-    for col in candidates:
-        g = df[[MACHINE_COL, TIMESTAMP_COL, col]].dropna().sort_values([MACHINE_COL, TIMESTAMP_COL])
-        if g.empty:
-            scores[col] = 0
-            continue
-        
-        # Check value range first - if all values are identical, score is 0
-        unique_values = g[col].nunique()
-        if unique_values <= 1:
-            scores[col] = 0
-            continue
-        
-        # coerce bool-like
-        if g[col].dtype == bool:
-            series = g[col].astype(int)
-            changes = (series.groupby(g[MACHINE_COL]).diff().fillna(0).abs() > 0).sum()
-        else:
-            series = pd.to_numeric(g[col], errors="coerce")
-            if series.isna().all():
-                scores[col] = 0
-                continue
-            
-            # Count actual changes between consecutive values
-            changes = (series.groupby(g[MACHINE_COL]).diff().abs() > eps).sum()
-            
-            # Bonus for higher variance (more diverse values)
-            variance_bonus = series.var() if not series.isna().all() else 0
-            if variance_bonus > 0:
-                changes += min(10, int(variance_bonus / 1000))  # Small bonus for variance
-        
-        scores[col] = int(changes)
-    
-    # Debug: show all scores in Streamlit (only when called from timeseries)
+    # Debug: all scores in one collapsed block (only when called from timeseries)
     if hasattr(st, '_is_timeseries_debug') and st._is_timeseries_debug:
-        st.write("**🔍 Dynamic Variables Analysis:**")
-        st.write(f"Found {len(candidates)} numeric candidates")
-        ordered_debug = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
-        
-        # Filter out constant variables for the actual selection
-        varying_variables = [col for col, score in ordered_debug if score > 0]
-        constant_variables = [col for col, score in ordered_debug if score == 0]
-        
-        # Show statistics
-        st.write(f"📊 **Summary:** {len(varying_variables)} varying, {len(constant_variables)} constant variables")
-        
-        # Show top variables with their scores - highlight ALL varying ones
-        st.write("**Top dynamic variables:**")
-        for i, (col, score) in enumerate(ordered_debug[:20]):  # Show top 20
-            # Mark as selected if it's varying (score > 0) AND within reasonable limit
-            is_varying = score > 0
-            status = "✅ VARYING" if is_varying else "❌ CONSTANT"
-            short_name = col.split('/')[-1] if '/' in col else col  # Show short name
-            
-            if score > 0:
-                st.text(f"{i+1:2d}. {short_name}: {score} changes {status}")
-            else:
-                st.text(f"{i+1:2d}. {short_name}: CONSTANT {status}")
-        
-        if len(ordered_debug) > 20:
-            remaining_varying = sum(1 for _, score in ordered_debug[20:] if score > 0)
-            remaining_constant = sum(1 for _, score in ordered_debug[20:] if score == 0)
-            st.text(f"... and {remaining_varying} more varying + {remaining_constant} constant variables")
-    
-    ordered = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
-    
+        varying = sum(1 for _, score in ordered if score > 0)
+        lines = [f"{i+1:2d}. {col.split('/')[-1]}: " + (f"{score} changes ✅ VARYING" if score > 0 else "CONSTANT ❌ CONSTANT")
+                 for i, (col, score) in enumerate(ordered[:20])]  # top 20, short names
+        if len(ordered) > 20:
+            remaining_varying = sum(1 for _, score in ordered[20:] if score > 0)
+            lines.append(f"... and {remaining_varying} more varying + {len(ordered) - 20 - remaining_varying} constant variables")
+        with st.expander(f"🔍 Dynamic Variables Analysis: {len(candidates)} numeric candidates, "
+                         f"{varying} varying, {len(candidates) - varying} constant"):
+            st.text("\n".join(lines))
+
     # Return ALL varying variables up to top_k limit, not just top_k regardless of variation
     varying_only = [c for c, score in ordered if score > 0]
     return varying_only[:top_k] if top_k > 0 else varying_only
 
-def resample_frame(df: pd.DataFrame, cols: List[str], rule: str):
-    """Resample selected numeric columns by mean with the given pandas rule (10s, 1min, 1H, 1D, 1W)."""
+def resample_frame(src, cols: List[str], rule: str, catalog_stats: Optional[pd.DataFrame] = None):
+    """Resample selected numeric columns by mean with the given pandas rule (10s, 1min, 1H, 1D, 1W).
+
+    Boolean-like columns (at most 10 distinct values) are resampled by mode; the
+    distinct counts come from `catalog_stats` (SignalCatalog.summary) when given.
+    """
     if not cols:
         return pd.DataFrame()
     
-    # Create a copy with only needed columns
-    d = df[[TIMESTAMP_COL] + [col for col in cols if col in df.columns]].copy()
-    
-    # Drop rows where ALL selected columns are NaN
-    d = d.dropna(subset=[col for col in cols if col in d.columns], how='all')
-    
-    # Ensure timestamp column is properly formatted
-    if not pd.api.types.is_datetime64_any_dtype(d[TIMESTAMP_COL]):
-        d[TIMESTAMP_COL] = pd.to_datetime(d[TIMESTAMP_COL], errors="coerce", utc=True)
-    
-    # Remove rows with invalid timestamps
-    d = d.dropna(subset=[TIMESTAMP_COL])
-    d = d.set_index(TIMESTAMP_COL).sort_index()
+    # Only the needed columns, in global time order, without rows where ALL of them are NaN
+    # (TelemetryFrame or SparseSignals; the sparse path never touches the empty cells)
+    d = src.signal_frame(cols)
+    d = d.set_index(TIMESTAMP_COL)
     
     # For raw data, return all points without aggregation
     if rule == "raw":
-        # Just return the data as-is, but ensure numeric types
-        for col in cols:
-            if col in d.columns:
-                d[col] = pd.to_numeric(d[col], errors='coerce')
+        # Just return the data as-is (columns are already numeric)
         return d
     
     # For aggregated data, use resampling
@@ -368,15 +324,24 @@ def resample_frame(df: pd.DataFrame, cols: List[str], rule: str):
     # For boolean-like variables, use mode instead of mean to preserve discrete values
     # For continuous variables, use mean
     result_data = {}
+    bins = None
     
     for col in cols:
         if col in d.columns:
-            series = pd.to_numeric(d[col], errors='coerce')
+            series = d[col]
             # Check if column has only a few distinct values (likely boolean/categorical)
-            unique_count = series.nunique()
+            if catalog_stats is not None and col in catalog_stats.index:
+                unique_count = catalog_stats.at[col, "distinct"]
+            else:
+                unique_count = series.nunique()
             if unique_count <= 10:  # Treat as categorical/boolean
-                # Use most frequent value in each interval
-                resampled = series.resample(r).agg(lambda x: x.mode().iloc[0] if len(x.mode()) > 0 else x.iloc[0] if len(x) > 0 else 0)
+                # Most frequent value in each interval (smallest on a tie, NaN for empty intervals like the
+                # rollups and the SQL path), counted for all intervals at once; bins are shared by all columns
+                if bins is None:
+                    labels = d.resample(r).size().index
+                    bins = d.groupby(pd.Grouper(freq=r)).ngroup().to_numpy()
+                resampled = pd.Series(bucket_mode(series.to_numpy(np.float64, na_value=np.nan), bins, len(labels)),
+                                      index=labels)
             else:
                 # Use mean for continuous variables
                 resampled = series.resample(r).mean()
@@ -386,11 +351,6 @@ def resample_frame(df: pd.DataFrame, cols: List[str], rule: str):
     # Combine all columns
     resampled = pd.DataFrame(result_data)
     
-    # Convert all numeric columns to float64 for consistency
-    for col in cols:
-        if col in resampled.columns:
-            resampled[col] = pd.to_numeric(resampled[col], errors='coerce')
-    
     return resampled
 
 # =============================
@@ -417,18 +377,35 @@ def parse_intent(q: str) -> Dict[str, Any]:
 st.title("🔧 Machine Analytics — Extended")
 st.caption("Fully offline. Presets + text questions. JSON + SQL + Charts.")
 
+# Stages of this script run (load, refresh, window, detection, ...); each fragment keeps its own log
+stage_cache = get_stage_cache()
+stage_log = StageLog("app")
+
 uploaded = st.sidebar.file_uploader("Upload CSV/Parquet/JSON files", type=["csv","parquet","json","jsonl"], accept_multiple_files=True)
 
+# Storage options come before the load buttons: a button's st.rerun() would otherwise
+# end the run before these widgets render and reset them
+streaming = st.sidebar.toggle(
+    "🌊 Streaming ingest (large files)", value=False,
+    help="Read uploads in bounded chunks into a Parquet store and query it with DuckDB instead of one in-memory DataFrame.",
+)
+sparse_storage = st.sidebar.toggle(
+    "🧩 Sparse signal storage", value=False, disabled=streaming,
+    help="Keep only the non-empty signal samples (machine, time, signal_id, value arrays) instead of the mostly empty wide frame.",
+)
+
 # Add option to load default CNC dataset
 if st.sidebar.button("📊 Load Default CNC Dataset"):
-    st.cache_data.clear()  # Clear any existing cache
     default_data_path = "/Users/svitlanakovalivska/Industrial_Signal_Processing_TimeSeriesAnalysis/data_and_eda/cnc_daten.csv"
     if os.path.exists(default_data_path):
         try:
             # Load the default dataset directly
-            df_default = pd.read_csv(default_data_path, encoding='utf-8', sep=';', on_bad_lines='skip')
-            st.session_state['default_dataset'] = df_default
-            st.sidebar.success(f"✅ Loaded default dataset: {len(df_default)} rows, {len(df_default.columns)} columns")
+            df_default, stats = read_table_cached(default_data_path, os.path.basename(default_data_path), get_ingest_cache(), TIMESTAMP_COL, MACHINE_COL)
+            st.session_state['default_dataset'] = prepare_frame(df_default)
+            st.session_state['default_coercion'] = stats["coercion"]
+            st.session_state['default_key'] = dataset_key([default_data_path])
+            st.session_state['default_content'] = content_key([default_data_path])
+            st.sidebar.success(f"✅ Loaded default dataset: {describe_stats(stats)}")
             st.rerun()
         except Exception as e:
             st.sidebar.error(f"❌ Error loading default dataset: {str(e)}")
@@ -444,9 +421,12 @@ if st.sidebar.button("📊 Load Default CNC Dataset"):
             if os.path.exists(alt_path):
                 st.sidebar.info(f"🔍 Found dataset at alternative path: {alt_path}")
                 try:
-                    df_default = pd.read_csv(alt_path, encoding='utf-8', sep=';', on_bad_lines='skip')
-                    st.session_state['default_dataset'] = df_default
-                    st.sidebar.success(f"✅ Loaded dataset: {len(df_default)} rows, {len(df_default.columns)} columns")
+                    df_default, stats = read_table_cached(alt_path, os.path.basename(alt_path), get_ingest_cache(), TIMESTAMP_COL, MACHINE_COL)
+                    st.session_state['default_dataset'] = prepare_frame(df_default)
+                    st.session_state['default_coercion'] = stats["coercion"]
+                    st.session_state['default_key'] = dataset_key([alt_path])
+                    st.session_state['default_content'] = content_key([alt_path])
+                    st.sidebar.success(f"✅ Loaded dataset: {describe_stats(stats)}")
                     st.rerun()
                     break
                 except Exception as e:
@@ -455,117 +435,236 @@ if st.sidebar.button("📊 Load Default CNC Dataset"):
 # Add cache clear button
 if st.sidebar.button("🔄 Clear Cache"):
     st.cache_data.clear()
-    if 'default_dataset' in st.session_state:
-        del st.session_state['default_dataset']
+    for key in ('default_dataset', 'default_coercion', 'default_key', 'default_content'):
+        if key in st.session_state:
+            del st.session_state[key]
     st.rerun()
 
 # Load data from either uploaded files or default dataset
-if 'default_dataset' in st.session_state and not uploaded:
-    df = st.session_state['default_dataset'].copy()
-    st.sidebar.info("📊 Using default CNC dataset")
+store_dir = None
+if streaming and uploaded:
+    with stage_log.timed("load"):
+        store_dir, coercion_report = stream_files_to_store(uploaded)
+    if store_dir is None:
+        st.stop()
+    overview = store_overview(store_dir)
+    columns = overview["columns"]
 else:
-    df = load_files(uploaded)
-if df.empty:
-    st.info("Please upload your files to start, or use the default CNC dataset.")
-    st.markdown("""
-    ### 📋 Expected Data Format
-    
-    Your data should contain these **required columns**:
-    - `name` - Machine identifier (e.g., 'CNC_1', 'Machine_A')
-    - `time` - Timestamp column (any standard datetime format)
-    
-    ### 📁 Supported File Types
-    - **CSV**: Comma-separated values
-    - **Parquet**: Columnar data format
-    - **JSON/JSONL**: JavaScript Object Notation
-    
-    ### 📊 Optional CNC Signal Columns
-    The app recognizes 90+ standard CNC/PLC fields including:
-    - `exec_program_completed_BOOL` - Program completion status
-    - `mode_STRING` - Operating mode (for setup detection)
-    - `pgm_STRING` - Program identifier
-    - Various `*_REAL`, `*_BOOL`, `*_STRING` process parameters
-    
-    ### 🚀 Quick Start
-    Click **"📊 Load Default CNC Dataset"** in the sidebar to try the app with sample CNC7 machine data!
-    """)
-    st.stop()
+    if 'default_dataset' in st.session_state and not uploaded:
+        # prepared (typed + sorted) once when the button was pressed; only one storage form is kept
+        with stage_log.timed("load"):
+            data = with_storage(st.session_state['default_dataset'], sparse_storage)
+        st.session_state['default_dataset'] = data
+        coercion_report = st.session_state.get('default_coercion', pd.DataFrame(columns=COERCION_REPORT_COLUMNS))
+        st.sidebar.info("📊 Using default CNC dataset")
+    else:
+        with stage_log.timed("load"):
+            data, coercion_report = load_files(uploaded, sparse_storage)
+    if data.empty:
+        st.info("Please upload your files to start, or use the default CNC dataset.")
+        st.markdown("""
+        ### 📋 Expected Data Format
+        
+        Your data should contain these **required columns**:
+        - `name` - Machine identifier (e.g., 'CNC_1', 'Machine_A')
+        - `time` - Timestamp column (any standard datetime format)
+        
+        ### 📁 Supported File Types
+        - **CSV**: Comma-separated values
+        - **Parquet**: Columnar data format
+        - **JSON/JSONL**: JavaScript Object Notation
+        
+        ### 📊 Optional CNC Signal Columns
+        The app recognizes 90+ standard CNC/PLC fields including:
+        - `exec_program_completed_BOOL` - Program completion status
+        - `mode_STRING` - Operating mode (for setup detection)
+        - `pgm_STRING` - Program identifier
+        - Various `*_REAL`, `*_BOOL`, `*_STRING` process parameters
+        
+        ### 🚀 Quick Start
+        Click **"📊 Load Default CNC Dataset"** in the sidebar to try the app with sample CNC7 machine data!
+        """)
+        st.stop()
+    columns = list(data.columns)
 
 # Parse/prepare
-if TIMESTAMP_COL not in df.columns:
+if TIMESTAMP_COL not in columns:
     st.error(f"❌ Required column '{TIMESTAMP_COL}' not found in uploaded files!")
-    st.info(f"Available columns: {list(df.columns)}")
+    st.info(f"Available columns: {columns}")
     st.info(f"Please ensure your data has a column named '{TIMESTAMP_COL}' containing timestamps.")
     st.stop()
 
-if MACHINE_COL not in df.columns:
+if MACHINE_COL not in columns:
     st.error(f"❌ Required column '{MACHINE_COL}' not found in uploaded files!")
-    st.info(f"Available columns: {list(df.columns)}")
+    st.info(f"Available columns: {columns}")
     st.info(f"Please ensure your data has a column named '{MACHINE_COL}' containing machine identifiers.")
     st.stop()
 
-df = coerce_timestamp(df, TIMESTAMP_COL).dropna(subset=[TIMESTAMP_COL])
-df = df.sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
+if store_dir is None:
+    # data comes out of prepare_frame already sorted: index it, don't sort it again
+    if isinstance(data, SparseSignals):
+        tf_all = data.keys
+    else:
+        tf_all = TelemetryFrame(data, MACHINE_COL, TIMESTAMP_COL, assume_sorted=True)
+    t_min, t_max = tf_all.time_range()
+    overview = {
+        "columns": columns,
+        "rows": len(data),
+        "machines": tf_all.machines,
+        "t_min": t_min,
+        "t_max": t_max,
+    }
 
 # Show basic data info after successful validation
-dataset_source = "📊 Default CNC Dataset" if 'default_dataset' in st.session_state and not uploaded else "📁 Uploaded Files"
+if store_dir is not None:
+    dataset_source = "🌊 Streamed Parquet store"
+elif 'default_dataset' in st.session_state and not uploaded:
+    dataset_source = "📊 Default CNC Dataset"
+else:
+    dataset_source = "📁 Uploaded Files"
 st.sidebar.markdown(f"""
 ### 📊 Data Overview
 **Source:** {dataset_source}
-- **Rows**: {len(df):,}
-- **Columns**: {len(df.columns)}
-- **Machines**: {df[MACHINE_COL].nunique()}
-- **Time range**: {df[TIMESTAMP_COL].min().strftime('%Y-%m-%d %H:%M')} to {df[TIMESTAMP_COL].max().strftime('%Y-%m-%d %H:%M')}
+- **Rows**: {overview['rows']:,}
+- **Columns**: {len(overview['columns'])}
+- **Machines**: {len(overview['machines'])}
+- **Time range**: {overview['t_min'].strftime('%Y-%m-%d %H:%M')} to {overview['t_max'].strftime('%Y-%m-%d %H:%M')}
 """)
 
-# Filters
-with st.sidebar:
+# Identifies the loaded dataset (its sources) for the per-dataset state below, and its current content
+data_id = dataset_key(uploaded) if uploaded else st.session_state['default_key']
+content_id = os.path.basename(store_dir)[:16] if store_dir is not None else \
+    content_key(uploaded) if uploaded else st.session_state['default_content']
+display_cache = get_display_cache()
+
+def show_table(name: str, df: pd.DataFrame, key: tuple = (), container=st, **kwargs):
+    """st.dataframe of `df` through the display cache: converted to Arrow once per `name`, content and `key`."""
+    container.dataframe(display_cache.table((name, data_id, content_id) + key, df), **kwargs)
+
+# Numeric coercion report (computed once at load time)
+if not coercion_report.empty:
+    with st.sidebar.expander("🧮 Numeric coercion report"):
+        st.write(f"**{int(coercion_report['coerced'].sum())}** values coerced, **{int(coercion_report['rejected'].sum())}** rejected")
+        touched = coercion_report[(coercion_report["coerced"] > 0) | (coercion_report["rejected"] > 0)]
+        show_table("coercion_report", touched if not touched.empty else coercion_report, container=st.sidebar,
+                   hide_index=True)
+
+# Filters: a fragment, so editing them reruns only the form; "Apply filters" stores them
+# and reruns the whole script once for the new window
+@st.fragment
+def filters_form(machines: List, date_min: date, date_max: date):
     st.subheader("Filters")
-    machines = sorted(df[MACHINE_COL].astype(str).unique().tolist()) if MACHINE_COL in df.columns else []
-    selected_machines = st.multiselect("Machines (name)", machines, default=machines)
-    date_min = df[TIMESTAMP_COL].min().date()
-    date_max = df[TIMESTAMP_COL].max().date()
-    date_range = st.date_input("Date range", value=(date_min, date_max), min_value=date_min, max_value=date_max)
+    applied = st.session_state["filters"]
+    selected = st.multiselect("Machines (name)", machines, default=applied["machines"])
+    dates = st.date_input("Date range", value=applied["dates"], min_value=date_min, max_value=date_max)
+    pending = (list(selected), tuple(dates)) != (list(applied["machines"]), tuple(applied["dates"]))
+    if st.button("Apply filters", type="primary" if pending else "secondary"):
+        if len(dates) != 2:
+            st.warning("Select a start and an end date.")
+        else:
+            st.session_state["filters"] = {"data_id": data_id, "machines": list(selected), "dates": tuple(dates)}
+            st.rerun()
+    if pending:
+        st.caption("Changed filters apply with the button.")
+
+date_min = overview["t_min"].date()
+date_max = overview["t_max"].date()
+applied = st.session_state.get("filters", {})
+if applied.get("data_id") != data_id or not date_min <= applied["dates"][0] <= applied["dates"][-1] <= date_max:
+    st.session_state["filters"] = {"data_id": data_id, "machines": list(overview["machines"]), "dates": (date_min, date_max)}
+with st.sidebar:
+    filters_form(list(overview["machines"]), date_min, date_max)
+selected_machines = st.session_state["filters"]["machines"]
+date_range = st.session_state["filters"]["dates"]
+
+# Event detection state, the signal catalog, the rollups and the DuckDB database are
+# kept per dataset lineage and only extended with rows newer than each machine's watermark;
+# they are refreshed when the content of the sources changed
+tracker = get_event_tracker(data_id)
+catalog = get_signal_catalog(data_id)
+rollups = get_rollup_pyramid(data_id)
+warehouse = get_warehouse(data_id)
+refreshed = get_refreshed()
+if refreshed.get(data_id) != content_id:
+    with stage_log.timed("refresh"):
+        if store_dir is not None:
+            # a store only ever gets tails: check once that it still starts with the rows the states hold
+            reset_edited_states(store_dir, tracker, catalog, rollups, warehouse)
+            since = store_since(overview["machines"], tracker, catalog, rollups, warehouse)
+            for batch in query_store_tail(store_dir, since):
+                tail = TelemetryFrame(batch, MACHINE_COL, TIMESTAMP_COL, assume_sorted=True)
+                tracker.refresh(tail, tail=True)
+                catalog.refresh(tail, tail=True)
+                rollups.refresh(tail, tail=True)
+                warehouse.refresh(tail, tail=True)
+        else:
+            tracker.refresh(data if isinstance(data, SparseSignals) else tf_all)
+            catalog.refresh(data if isinstance(data, SparseSignals) else tf_all)
+            rollups.refresh(data if isinstance(data, SparseSignals) else tf_all)
+            warehouse.refresh(data if isinstance(data, SparseSignals) else tf_all)
+        warehouse.sync_events(tracker)
+    refreshed[data_id] = content_id
+evict_state_dirs(data_id)  # keep .event_state within CNC_EVENT_STATE_MAX_MB, least recently used datasets go first
+
+# Session cursor on the dataset's DuckDB database: `events` and the table macros
+# `part_events(...)`/`setup_intervals(...)` cover the full typed tables; queries
+# take the selected machines and time range as parameters
+con = warehouse.cursor()
 
 # Apply filters
-mask = df[MACHINE_COL].astype(str).isin([str(x) for x in selected_machines])
 from_dt = pd.to_datetime(date_range[0]).tz_localize("UTC")
 to_dt = pd.to_datetime(date_range[1]).tz_localize("UTC") + timedelta(days=1)
-mask &= (df[TIMESTAMP_COL] >= from_dt) & (df[TIMESTAMP_COL] < to_dt)
-df_f = df.loc[mask].copy()
-
-# Derived tables for SQL
-parts = detect_part_completed(df_f)
-setups = detect_setup_intervals(df_f)
+with stage_log.timed("window"):
+    if store_dir is not None:
+        # streaming mode: the window stays in DuckDB; counts, columns and the preview are queries,
+        # charts fetch only their columns (EventsWindow)
+        signals = EventsWindow(con, selected_machines, from_dt, to_dt, MACHINE_COL, TIMESTAMP_COL)
+    elif isinstance(data, SparseSignals):
+        # sparse storage: window the arrays; only the preview rows are ever widened (SparseSignals.head)
+        signals = data.window(selected_machines, from_dt, to_dt)
+    else:
+        # binary search per selected machine; cost follows the window, not the full history
+        signals = tf_all.window(selected_machines, from_dt, to_dt)
+
+# Identifies the filtered data for the per-window caches below
+window_key = (data_id, type(signals).__name__, tuple(map(str, selected_machines)), from_dt.value, to_dt.value)
+data_version = (window_key, warehouse.version())  # key of everything shown from the current window
+signal_catalog = stage_cache.get("catalog summary", (data_id, window_key[2], data_version[1]),
+                                 lambda: catalog.summary(selected_machines), stage_log)
+# whole-history statistics stand in for the window only if it covers every row of the selected machines
+window_stats = signal_catalog if catalog.covers(selected_machines, from_dt, to_dt) else None
+if window_stats is None and isinstance(signals, EventsWindow):
+    # streaming: statistics of exactly this window from one pass over its batches, never a scan in pandas
+    window_stats = stage_cache.get("window catalog", data_version,
+                                   lambda: SignalCatalog.of_batches(signals.batches()).summary(), stage_log)
+
+# Derived tables for SQL, cut to the selected window
+parts = stage_cache.get("parts", data_version, lambda: tracker.part_events(
+    selected_machines, from_dt, to_dt, MACHINE_COL, TIMESTAMP_COL), stage_log)
+setups = stage_cache.get("setups", data_version, lambda: tracker.setup_intervals(
+    selected_machines, from_dt, to_dt, MACHINE_COL), stage_log)
 
 # Add debugging information
 st.sidebar.write("---")
 st.sidebar.subheader("🔍 Debug Info")
-st.sidebar.write(f"**Filtered data:** {len(df_f)} rows")
+st.sidebar.write(f"**Filtered data:** {len(signals)} rows")
 st.sidebar.write(f"**Parts detected:** {len(parts)} events")
 st.sidebar.write(f"**Setups detected:** {len(setups)} intervals")
+query_cache_info = st.sidebar.empty()  # filled at the end of the run, after this run's queries
+stage_info = st.sidebar.empty()
 
 # Show sample of actual data columns
-if not df_f.empty:
+if not signals.empty:
     st.sidebar.write("**Available columns:**")
-    st.sidebar.write(f"{len(df_f.columns)} total")
-    numeric_cols = df_f.select_dtypes(include=['number']).columns.tolist()
+    st.sidebar.write(f"{len(signals.columns)} total")
+    numeric_cols = signals.head(0).select_dtypes(include=['number']).columns.tolist()
     st.sidebar.write(f"**Numeric columns:** {len(numeric_cols)}")
     
 # Show parts/setups data preview if available
 if not parts.empty:
     st.sidebar.write("**Parts sample:**")
     try:
-        # Fix data types for Arrow compatibility
-        parts_display = parts.head(3).copy()
-        for col in parts_display.columns:
-            if parts_display[col].dtype == 'object':
-                parts_display[col] = parts_display[col].astype(str)
-            elif pd.api.types.is_datetime64_any_dtype(parts_display[col]):
-                parts_display[col] = parts_display[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-            elif pd.api.types.is_numeric_dtype(parts_display[col]):
-                parts_display[col] = pd.to_numeric(parts_display[col], errors='coerce').astype('float64')
-        st.sidebar.dataframe(parts_display)
+        show_table("parts_sample", parts.head(3), data_version, container=st.sidebar)
     except Exception as e:
         st.sidebar.text("Parts events detected but preview unavailable")
         st.sidebar.text(f"Sample: {len(parts)} events from {parts[TIMESTAMP_COL].min()} to {parts[TIMESTAMP_COL].max()}")
@@ -573,24 +672,17 @@ if not parts.empty:
 if not setups.empty:
     st.sidebar.write("**Setups sample:**")
     try:
-        # Fix data types for Arrow compatibility
-        setups_display = setups.head(3).copy()
-        for col in setups_display.columns:
-            if setups_display[col].dtype == 'object':
-                setups_display[col] = setups_display[col].astype(str)
-            elif pd.api.types.is_datetime64_any_dtype(setups_display[col]):
-                setups_display[col] = setups_display[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-            elif pd.api.types.is_numeric_dtype(setups_display[col]):
-                setups_display[col] = pd.to_numeric(setups_display[col], errors='coerce').astype('float64')
-        st.sidebar.dataframe(setups_display)
+        show_table("setups_sample", setups.head(3), data_version, container=st.sidebar)
     except Exception as e:
         st.sidebar.text("Setup intervals detected but preview unavailable")
         st.sidebar.text(f"Sample: {len(setups)} intervals")
 
-con = duckdb.connect(database=":memory:")
-con.register("events", df_f)
-con.register("part_events", parts)
-con.register("setup_intervals", setups)
+window_args = window_params(selected_machines, from_dt, to_dt)
+query_cache = get_query_cache()
+
+def run_sql(sql: str, params: Optional[list] = None) -> pd.DataFrame:
+    """con.execute(sql, params).df() through the shared result cache (same SQL + parameters + data version = hit)."""
+    return query_cache.fetch(con, sql, params, (data_id, data_version[1]))
 
 # Presets
 import os
@@ -614,65 +706,25 @@ except FileNotFoundError:
     ]
 
 preset_names = [p["name"] for p in presets]
-preset = st.selectbox("Preset question", preset_names, index=0 if preset_names else None)
-agg_rule = None
-selected_columns_for_preset2 = []
-
-# Dynamic controls for timeseries presets
-if preset and "Zeitreihe" in preset:
-    st.sidebar.subheader("Aggregation")
-    agg_rule = st.sidebar.selectbox("Rule", ["raw","10s","1m","1h","1d","1w"], index=1)  # Default to 10s instead of 1m
-    
-    # Show aggregation info
-    if agg_rule == "raw":
-        st.sidebar.info("📊 Raw data: All data points")
-    elif agg_rule == "10s":
-        st.sidebar.info("📊 10-second intervals: Best for dynamic variables")
-    elif agg_rule == "1m":
-        st.sidebar.warning("⚠️ 1-minute intervals: May smooth out rapid changes")
-    else:
-        st.sidebar.warning("⚠️ Large intervals: Will lose fast dynamics")
-        
-    if "Top-5" in preset or "Alle dynamischen" in preset:
-        pass
-    else:
-        # second preset: user-selected metrics up to 10
-        st.sidebar.write("**📊 Analyzing all variables...**")
-        # Enable debug temporarily to get scores
-        st._is_timeseries_debug = True  # Enable debug to show analysis
-        dyn_cols = numeric_dynamic_columns(df_f, top_k=0)  # Get ALL varying variables, no limit
-        st._is_timeseries_debug = False  # Disable for UI selection
-        st.sidebar.write(f"Found {len(dyn_cols)} dynamic variables")
-        
-        # Show ALL dynamic variables in sidebar
-        st.sidebar.write(f"**All {len(dyn_cols)} dynamic variables:**")
-        for i, col in enumerate(dyn_cols):
-            st.sidebar.text(f"{i+1}. {col.split('/')[-1]}")  # Show just the last part
-        
-        # Default to ALL dynamic variables (up to 10)
-        default_selection = dyn_cols[:min(10, len(dyn_cols))]
-        selected_columns_for_preset2 = st.sidebar.multiselect("Select up to 10 metrics", dyn_cols, default=default_selection)
-        if len(selected_columns_for_preset2) > 10:
-            st.sidebar.warning("Please select no more than 10 metrics.")
-            selected_columns_for_preset2 = selected_columns_for_preset2[:10]
-
-run_preset = st.button("Run preset")
-
-question = st.text_input("Or ask a question in free text", "")
-intent = parse_intent(question) if question else None
+STAGE_HISTORY = 12  # reruns listed under "Stages per rerun"
 
-left, right = st.columns([1,2])
-with left:
-    st.subheader("Structured request (JSON)")
-    st.json(intent or {"preset": preset})
+def record_stages(log: StageLog):
+    """Append a run's stages to the session's rerun history."""
+    history = st.session_state.setdefault("stage_runs", [])
+    history.append((time.strftime("%H:%M:%S", time.localtime(log.started)), log.scope, log.summary()))
+    del history[:-STAGE_HISTORY]
 
-    st.subheader("SQL used")
-    sql_placeholder = st.empty()
+def show_stages(log: StageLog):
+    """Record a fragment's stages and show them below it (fragment reruns cannot update the sidebar)."""
+    record_stages(log)
+    st.caption(f"⏱️ Stages ({log.scope}): {log.summary()}")
 
-with right:
-    st.subheader("Result & Chart")
+# Visible range of the raw time series view (preset section); the whole window by default
+visible_from, visible_to = from_dt, to_dt
 
-def show_sql(sql: str):
+def show_sql(sql: str, params: Optional[list] = None):
+    if params is not None:
+        sql = f"{sql.rstrip()};\n-- parameters: machines={params[0]}, from={from_dt}, to={to_dt}"
     sql_placeholder.code(sql, language="sql")
 
 def timeseries_chart(cols: List[str], rule: str):
@@ -688,12 +740,41 @@ def timeseries_chart(cols: List[str], rule: str):
     st.write(f"**🔍 Input Debug:**")
     st.write(f"- Selected columns: {cols}")
     st.write(f"- Aggregation rule: {rule}")
-    st.write(f"- Source data shape: {df_f.shape}")
+    st.write(f"- Source data shape: {(len(signals), len(signals.columns))}")
     
-    data = resample_frame(df_f, cols, rule or "1m")
+    # Aggregated rules are a lookup in the rollups (window bounds are midnight, i.e. on every
+    # bucket edge), otherwise a time_bucket query in DuckDB; raw data and columns without
+    # catalog statistics go through resample_frame
+    rule = rule or "1m"
+    sql = "-- N/A: pandas resample used for dynamic timeseries (no SQL)"
+    if rule in RESAMPLE_INTERVALS and all(c in signal_catalog.index for c in cols):
+        mode_cols = [c for c in cols if signal_catalog.at[c, "distinct"] <= 10]
+        mode_levels = {c: signal_catalog.at[c, "levels"] for c in mode_cols}  # exact below the catalog's cap
+        sql = resample_sql(cols, rule, mode_levels, MACHINE_COL, TIMESTAMP_COL)
+        params = window_args
+        sql_shown = f"{sql};\n-- parameters: machines={params[0]}, from={from_dt}, to={to_dt}"
+        data = rollups.lookup(cols, rule, selected_machines, from_dt, to_dt, mode_cols)
+        if data is None:
+            data = run_sql(sql, params).set_index("bucket")
+        else:
+            sql_shown = "-- Answered from the pre-aggregated rollups (rollups.py); same result as:\n" + sql_shown
+        sql = sql_shown
+        data = data.rename_axis(TIMESTAMP_COL)
+    elif rule == "raw":
+        # Only the visible range, then min/max per pixel column: spikes stay, the browser gets ~2x the chart width
+        visible_src = signals if (visible_from, visible_to) == (from_dt, to_dt) else \
+            signals.window(selected_machines, visible_from, visible_to)
+        data = resample_frame(visible_src, cols, rule, signal_catalog)
+        raw_points = len(data)
+        data = downsample_frame(data, DOWNSAMPLE_WIDTH)
+        if len(data) < raw_points:
+            st.info(f"📉 {raw_points:,} raw points from {visible_from} to {visible_to} drawn as {len(data):,} "
+                    f"(min/max per pixel column). Narrow the visible range above for full resolution.")
+    else:
+        data = resample_frame(signals, cols, rule, signal_catalog)
     if data.empty:
         st.warning("No data available for the selected metrics/date range.")
-        show_sql("-- N/A: pandas resample used for dynamic timeseries (no SQL)")
+        show_sql(sql)
         return
     
     try:
@@ -719,28 +800,12 @@ def timeseries_chart(cols: List[str], rule: str):
         # Create interactive Plotly chart
         st.write("**📈 Interactive Time Series Chart:**")
         
-        # Reset index to work with Plotly
+        # Reset index to work with Plotly; the time axis goes out as epoch milliseconds (display.plot_time)
         chart_data = data.reset_index()
+        x_time = plot_time(data.index)
         
-        # Fix datetime column for Plotly compatibility - convert to string
-        chart_data[TIMESTAMP_COL] = chart_data[TIMESTAMP_COL].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Ensure all numeric columns are properly typed
-        for col in cols:
-            if col in chart_data.columns:
-                chart_data[col] = pd.to_numeric(chart_data[col], errors='coerce').astype('float64')
-        
-        # Analyze value ranges to decide on scaling strategy
-        ranges = {}
-        for col in cols:
-            if col in chart_data.columns:
-                values = chart_data[col].dropna()
-                if not values.empty:
-                    ranges[col] = {
-                        'min': values.min(),
-                        'max': values.max(),
-                        'range': values.max() - values.min()
-                    }
+        # Value ranges for the scaling strategy: the catalog when it covers the window, else the plotted values
+        ranges = value_ranges(chart_data, cols, window_stats)
         
         # Check if we need multiple y-axes (ranges differ by more than 100x)
         # Also filter out variables with zero range (constant values)
@@ -785,13 +850,9 @@ def timeseries_chart(cols: List[str], rule: str):
         st.write(f"**📊 Will display {len(varying_cols)} varying variables**")
         st.write(f"**Multi-axis needed:** {needs_multi_axis} (range ratio: {max_range/min_range:.1f})")
         
-        # Create multi-axis chart to show all variables
-        fig = go.Figure()
-        colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
-        
         # Smart axis assignment based on value ranges
         axis_assignment = {}
-        y_axes = ['y', 'y2', 'y3', 'y4']
+        y_axes = list(Y_AXES)
         
         # Sort variables by range size to distribute across axes
         range_sorted = sorted(varying_ranges.items(), key=lambda x: x[1]['range'], reverse=True)
@@ -807,95 +868,16 @@ def timeseries_chart(cols: List[str], rule: str):
                 range_info = varying_ranges[col]
                 st.text(f"• {col.split('/')[-1]}: {axis_assignment[col]} (range: {range_info['range']:.2f})")
         
-        # Add all traces
-        for i, col in enumerate(varying_cols):
-            if col in chart_data.columns and col in axis_assignment:
-                display_name = col.split('/')[-1] if '/' in col else col
-                color = colors[i % len(colors)]
-                y_axis = axis_assignment[col]
-                
-                # Clean data
-                y_values = pd.to_numeric(chart_data[col], errors='coerce')
-                
-                # Add trace
-                fig.add_trace(go.Scatter(
-                    x=chart_data[TIMESTAMP_COL],
-                    y=y_values,
-                    mode='lines',
-                    name=f"{display_name} [{y_axis}]",
-                    line=dict(width=2, color=color),
-                    yaxis=y_axis if y_axis != 'y' else None,
-                    connectgaps=False
-                ))
-        
-        # Setup layout with all y-axes
-        layout = {
-            'title': f"CNC Time Series - All {len(varying_cols)} Variables (Multi-Axis)",
-            'xaxis': {'title': "Time"},
-            'height': 600,
-            'showlegend': True,
-            'legend': {'x': 1.05, 'y': 1}
-        }
-        
-        # Add y-axis configurations for all used axes
-        used_axes = set(axis_assignment.values())
-        
-        # Primary axis (left)
-        if 'y' in used_axes:
-            layout['yaxis'] = {'title': 'Primary', 'side': 'left'}
-        
-        # Secondary axis (right)  
-        if 'y2' in used_axes:
-            layout['yaxis2'] = {'title': 'Secondary', 'side': 'right', 'overlaying': 'y'}
-        
-        # Tertiary axis (left, shifted)
-        if 'y3' in used_axes:
-            layout['yaxis3'] = {'title': 'Tertiary', 'side': 'left', 'overlaying': 'y', 'position': 0.05}
-        
-        # Quaternary axis (right, shifted)
-        if 'y4' in used_axes:
-            layout['yaxis4'] = {'title': 'Quaternary', 'side': 'right', 'overlaying': 'y', 'position': 0.95}
-        
-        fig.update_layout(**layout)
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Normalized chart for trend comparison
-        st.write("**📈 Normalized View (0-1 scale) - Trend Comparison:**")
-        
-        fig_norm = go.Figure()
-        
-        for i, col in enumerate(varying_cols):
-            if col in chart_data.columns:
-                values = pd.to_numeric(chart_data[col], errors='coerce')
-                
-                # Normalize to 0-1 scale
-                if not values.isna().all() and values.max() != values.min():
-                    normalized = (values - values.min()) / (values.max() - values.min())
-                else:
-                    normalized = pd.Series([0.5] * len(values))  # Constant at 0.5 if no variation
-                
-                display_name = col.split('/')[-1] if '/' in col else col
-                color = colors[i % len(colors)]
-                
-                fig_norm.add_trace(go.Scatter(
-                    x=chart_data[TIMESTAMP_COL],
-                    y=normalized,
-                    mode='lines',
-                    name=display_name,
-                    line=dict(width=2, color=color),
-                    connectgaps=False
-                ))
-        
-        fig_norm.update_layout(
-            title="All Variables Normalized (0-1 Scale) - Compare Trends",
-            xaxis_title="Time",
-            yaxis_title="Normalized Value (0=min, 1=max)",
-            height=400,
-            showlegend=True,
-            legend={'x': 1.05, 'y': 1}
+        # One figure for the multi-axis and the normalized (0-1) view, toggled in the browser;
+        # WebGL traces above SCATTERGL_MIN_POINTS plotted points
+        fig = timeseries_figure(
+            chart_data, x_time, {c: axis_assignment[c] for c in varying_cols if c in chart_data.columns}, varying_ranges,
+            title=f"CNC Time Series - All {len(varying_cols)} Variables (Multi-Axis)",
+            normalized_title="All Variables Normalized (0-1 Scale) - Compare Trends",
         )
-        
-        st.plotly_chart(fig_norm, use_container_width=True)
+        st.caption("📈 Switch between raw values and the normalized view (0-1 scale, trend comparison) above the chart"
+                   + (" · WebGL rendering" if isinstance(fig.data[0], go.Scattergl) else ""))
+        st.plotly_chart(fig, use_container_width=True)
         
         # Summary info
         st.write("**📊 Summary:**")
@@ -919,7 +901,7 @@ def timeseries_chart(cols: List[str], rule: str):
                 r = varying_ranges[col]
                 st.text(f"• {col.split('/')[-1]}: {r['min']:.2f} to {r['max']:.2f} (range: {r['range']:.2f})")
         
-        show_sql("-- N/A: pandas resample used for dynamic timeseries (no SQL)")
+        show_sql(sql)
         
     except Exception as e:
         st.error(f"Error creating chart: {str(e)}")
@@ -928,15 +910,67 @@ def timeseries_chart(cols: List[str], rule: str):
         st.write(f"- Columns: {len(data.columns)}")
         if hasattr(data.index, 'min') and hasattr(data.index, 'max'):
             st.write(f"- Time range: {data.index.min()} to {data.index.max()}")
-        show_sql("-- N/A: pandas resample used for dynamic timeseries (no SQL)")
+        show_sql(sql)
+
+def shift_kpis_chart():
+    """Pieces, average cycle time and setup minutes per shift (and per day and shift) from SHIFT_KPI_SQL."""
+    if parts.empty and setups.empty:
+        st.warning("Not enough data for shift KPIs.")
+        show_sql("-- No data in part_events/setup_intervals")
+        return
+    show_sql(f"-- Shifts {', '.join(SHIFT_NAMES)} in {SHIFT_TZ} local time (shift_calendar, UTC start/end){SHIFT_KPI_SQL}",
+             window_args)
+    kpis = run_sql(SHIFT_KPI_SQL, window_args)
+    totals = kpis[kpis["day"].isna()].set_index("shift")[["pieces", "avg_ct_s", "setup_min"]]
+    res = totals.reindex(SHIFT_NAMES).fillna(0.0)
 
-if run_preset and preset:
+    # Integer piece counts for display
+    try:
+        show_table("shift_kpis", res.astype({"pieces": "int64"}), data_version)
+    except Exception as e:
+        st.warning(f"Cannot display table due to data type issues: {str(e)}")
+        st.write("**Shift KPIs Results:**")
+        for shift_name, row in res.iterrows():
+            st.write(f"**{shift_name}:** Pieces: {int(row['pieces'])}, Avg Cycle: {row['avg_ct_s']:.1f}s, Setup: {row['setup_min']:.1f}min")
+
+    daily = kpis[kpis["day"].notna()]
+    if daily["day"].nunique() > 1:
+        with st.expander(f"Per day and shift ({daily['day'].nunique()} days)"):
+            show_table("shift_kpis_daily", daily.assign(day=daily["day"].dt.date, pieces=daily["pieces"].astype("int64"))
+                       [["day", "shift", "pieces", "avg_ct_s", "setup_min"]],
+                       data_version, hide_index=True)
+
+    # Create Plotly bar chart for shift pieces
+    try:
+        fig = go.Figure()
+        y_data = [int(x) for x in res["pieces"].values]
+        fig.add_trace(go.Bar(
+            x=list(res.index),
+            y=y_data,
+            name='Pieces per Shift',
+            marker_color='blue',
+            text=y_data,
+            textposition='auto'
+        ))
+        fig.update_layout(
+            title="Production by Shift",
+            xaxis_title="Shift",
+            yaxis_title="Pieces Produced",
+            height=400
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"Chart display error: {str(e)}")
+        st.info("Shift KPI data available but chart cannot be displayed")
+
+def answer_preset(preset: str, agg_rule: Optional[str], selected_columns_for_preset2: List[str], log: StageLog):
+    """Result of a preset question for the current window."""
     # Handle presets
     if "Zeitreihe: Alle dynamischen" in preset:
         # Enable debug mode
         st._is_timeseries_debug = True
         # Show ALL varying variables automatically - no limit
-        all_varying = numeric_dynamic_columns(df_f, top_k=0)  # 0 means no limit - all varying variables
+        all_varying = numeric_dynamic_columns(signals, data_version, window_stats, top_k=0, log=log)  # 0 means no limit - all varying variables
         st.caption(f"Found {len(all_varying)} dynamic variables - showing ALL with changes")
         timeseries_chart(all_varying, agg_rule or "1m")
 
@@ -944,7 +978,7 @@ if run_preset and preset:
         # Enable debug mode for top 5 preset
         st._is_timeseries_debug = True
         # Show top 5 dynamic variables
-        top5_vars = numeric_dynamic_columns(df_f, top_k=5)  # Limit to top 5
+        top5_vars = numeric_dynamic_columns(signals, data_version, window_stats, top_k=5, log=log)  # Limit to top 5
         st.caption(f"Found {len(top5_vars)} top dynamic variables")
         timeseries_chart(top5_vars, agg_rule or "10s")
 
@@ -953,7 +987,7 @@ if run_preset and preset:
         st._is_timeseries_debug = True
         # First show analysis of all variables
         st.write("**🔍 Available Dynamic Variables Analysis:**")
-        all_dynamic = numeric_dynamic_columns(df_f, top_k=0)  # Show ALL varying variables
+        all_dynamic = numeric_dynamic_columns(signals, data_version, window_stats, top_k=0, log=log)  # Show ALL varying variables
         
         cols = selected_columns_for_preset2[:10]
         st.caption(f"Selected metrics ({len(cols)}): {', '.join(cols) if cols else 'none'}")
@@ -964,13 +998,12 @@ if run_preset and preset:
             st.warning("No part completion events detected.")
             show_sql("-- No data in part_events")
         else:
-            sql = f"""
+            sql = """
             SELECT AVG(cycle_time_s) AS avg_cycle_time_s
-            FROM part_events
-            WHERE time >= TIMESTAMP '{from_dt}' AND time < TIMESTAMP '{to_dt}'
+            FROM part_events(?::VARCHAR[], ?, ?)
             """
-            show_sql(sql)
-            res = con.execute(sql).df()
+            show_sql(sql, window_args)
+            res = run_sql(sql, window_args)
             if not res.empty:
                 st.metric("Average Cycle Time", f"{res['avg_cycle_time_s'].iloc[0]:.2f} s")
             # time trend (rolling mean)
@@ -978,12 +1011,10 @@ if run_preset and preset:
                 try:
                     s = parts.set_index(TIMESTAMP_COL)["cycle_time_s"].rolling(20, min_periods=1).mean()
                     # Create Plotly chart
-                    chart_data = s.reset_index()
-                    
                     fig = go.Figure()
                     fig.add_trace(go.Scatter(
-                        x=chart_data[TIMESTAMP_COL],
-                        y=chart_data["cycle_time_s"],
+                        x=plot_time(s.index),
+                        y=s.to_numpy(),
                         mode='lines',
                         name='Cycle Time (20-point rolling mean)',
                         line=dict(width=2, color='blue')
@@ -992,6 +1023,7 @@ if run_preset and preset:
                     fig.update_layout(
                         title="Cycle Time Trend",
                         xaxis_title="Time",
+                        xaxis_type="date",
                         yaxis_title="Cycle Time (seconds)",
                         height=400
                     )
@@ -1003,7 +1035,10 @@ if run_preset and preset:
     elif "Gesamte Rüstzeit (Maschine 1)" in preset:
         st.write("**🔍 Setup Analysis Debug:**")
         st.write(f"- Setup intervals found: {len(setups)}")
-        st.write(f"- Available machines: {df_f[MACHINE_COL].unique().tolist()}")
+        # the window's rows are read in DuckDB, like the preset queries (all storage modes)
+        in_window = f"{MACHINE_COL} IN (SELECT UNNEST(?::VARCHAR[])) AND {TIMESTAMP_COL} >= ? AND {TIMESTAMP_COL} < ?"
+        machines_found = run_sql(f"SELECT DISTINCT {MACHINE_COL} FROM events WHERE {in_window} ORDER BY 1", window_args)
+        st.write(f"- Available machines: {machines_found[MACHINE_COL].tolist()}")
         st.write(f"- Date range: {from_dt} to {to_dt}")
         
         if setups.empty:
@@ -1012,45 +1047,48 @@ if run_preset and preset:
             
             # Try to show why no setups were detected
             st.write("**🔍 Debug: Why no setups detected?**")
-            if MODE_STRING in df_f.columns:
-                mode_values = df_f[MODE_STRING].dropna().unique()
-                st.write(f"- Mode values found: {mode_values[:10]}")
-                setup_patterns = df_f[MODE_STRING].astype(str).str.upper().str.contains("SETUP|RÜST|RUEST", regex=True, na=False).sum()
-                st.write(f"- Rows with setup patterns: {setup_patterns}")
+            if MODE_STRING in signals.columns:
+                mode_values = run_sql(f"SELECT DISTINCT {MODE_STRING} FROM events WHERE {in_window} "
+                                      f"AND {MODE_STRING} IS NOT NULL ORDER BY 1 LIMIT 10", window_args)
+                st.write(f"- Mode values found: {mode_values[MODE_STRING].tolist()}")
+                setup_patterns = run_sql(f"SELECT COUNT(*) AS n FROM events WHERE {in_window} "
+                                         f"AND regexp_matches(upper(CAST({MODE_STRING} AS VARCHAR)), 'SETUP|RÜST|RUEST')", window_args)
+                st.write(f"- Rows with setup patterns: {int(setup_patterns['n'].iloc[0])}")
             else:
                 st.write(f"- {MODE_STRING} column not found in data")
                 
-            if PGM_STRING in df_f.columns:
-                pgm_changes = df_f.groupby(MACHINE_COL)[PGM_STRING].transform(lambda s: s.ne(s.shift())).sum()
-                st.write(f"- Program changes detected: {pgm_changes}")
+            if PGM_STRING in signals.columns:
+                # a missing value on either side counts as a change, as in the setup gap heuristic
+                pgm_changes = run_sql(f"""SELECT COUNT(*) FILTER (WHERE pgm IS NULL OR prev IS NULL OR pgm <> prev) AS n
+                    FROM (SELECT CAST({PGM_STRING} AS VARCHAR) AS pgm,
+                                 LAG(CAST({PGM_STRING} AS VARCHAR)) OVER (PARTITION BY {MACHINE_COL} ORDER BY {TIMESTAMP_COL}) AS prev
+                          FROM events WHERE {in_window})""", window_args)
+                st.write(f"- Program changes detected: {int(pgm_changes['n'].iloc[0])}")
             else:
                 st.write(f"- {PGM_STRING} column not found in data")
         else:
-            sql = f"""
+            sql = """
             SELECT SUM(setup_s)/60.0 AS total_setup_min
-            FROM setup_intervals
-            WHERE start >= TIMESTAMP '{from_dt}' AND start < TIMESTAMP '{to_dt}'
-              AND name = '1'
+            FROM setup_intervals(?::VARCHAR[], ?, ?)
+            WHERE name = '1'
             """
-            show_sql(sql)
-            res = con.execute(sql).df()
+            show_sql(sql, window_args)
+            res = run_sql(sql, window_args)
             if not res.empty and not res['total_setup_min'].iloc[0] == 0:
                 st.metric("Total Setup Time (M1)", f"{res['total_setup_min'].iloc[0]:.1f} min")
             else:
                 st.warning("No setup intervals found for Machine 1 in the selected date range.")
                 st.write("**Available setup data:**")
-                st.dataframe(setups.head())
+                show_table("setups_head", setups.head(), data_version)
             
             if not setups.empty:
                 try:
                     s = setups.set_index("start")["setup_s"]
                     # Create Plotly bar chart
-                    chart_data = s.reset_index()
-                    
                     fig = go.Figure()
                     fig.add_trace(go.Bar(
-                        x=chart_data["start"],
-                        y=chart_data["setup_s"] / 60,  # Convert to minutes
+                        x=plot_time(s.index),
+                        y=s.to_numpy() / 60,  # Convert to minutes
                         name='Setup Time',
                         marker_color='orange'
                     ))
@@ -1058,6 +1096,7 @@ if run_preset and preset:
                     fig.update_layout(
                         title="Setup Time Distribution",
                         xaxis_title="Time",
+                        xaxis_type="date",
                         yaxis_title="Setup Time (minutes)",
                         height=400
                     )
@@ -1071,15 +1110,14 @@ if run_preset and preset:
             st.warning("No production events found.")
             show_sql("-- No data in part_events")
         else:
-            sql = f"""
+            sql = """
             SELECT name, COUNT(*) AS pieces
-            FROM part_events
-            WHERE time >= TIMESTAMP '{from_dt}' AND time < TIMESTAMP '{to_dt}'
+            FROM part_events(?::VARCHAR[], ?, ?)
             GROUP BY name
             ORDER BY pieces DESC
             """
-            show_sql(sql)
-            res = con.execute(sql).df()
+            show_sql(sql, window_args)
+            res = run_sql(sql, window_args)
             
             # Create Plotly bar chart
             if not res.empty:
@@ -1101,115 +1139,21 @@ if run_preset and preset:
                 st.plotly_chart(fig, use_container_width=True)
 
     elif "KPIs pro Schicht" in preset:
-        if parts.empty and setups.empty:
-            st.warning("Not enough data for shift KPIs.")
-            show_sql("-- Uses computed tables part_events/setup_intervals in Python for shift mapping.")
-        else:
-            # Show SQL that explains the logic
-            show_sql("""
--- KPI Calculation Logic (performed in Python/Pandas):
--- 1. Assign shifts based on Central European timezone:
---    06-14: Morning shift (6 AM - 2 PM)
---    14-22: Afternoon shift (2 PM - 10 PM) 
---    22-06: Night shift (10 PM - 6 AM)
--- 
--- 2. Calculate metrics per shift:
---    pieces: COUNT of part completion events
---    avg_ct_s: AVERAGE cycle time in seconds
---    setup_min: SUM of setup time in minutes
---
--- Equivalent SQL would be:
--- SELECT 
---   shift,
---   COUNT(*) as pieces,
---   AVG(cycle_time_s) as avg_ct_s,
---   SUM(setup_s)/60.0 as setup_min
--- FROM (
---   SELECT *,
---     CASE 
---       WHEN EXTRACT(HOUR FROM time AT TIME ZONE 'Europe/Central') BETWEEN 6 AND 13 THEN '06-14'
---       WHEN EXTRACT(HOUR FROM time AT TIME ZONE 'Europe/Central') BETWEEN 14 AND 21 THEN '14-22'
---       ELSE '22-06'
---     END as shift
---   FROM part_events
--- ) 
--- GROUP BY shift
--- ORDER BY shift;
-            """)
-            
-            p = parts.copy()
-            p["shift"] = assign_shift(p[TIMESTAMP_COL])
-            k1 = p.groupby("shift")["cycle_time_s"].mean().rename("avg_ct_s")
-            k2 = p.groupby("shift").size().rename("pieces")
-            if not setups.empty:
-                s = setups.copy()
-                s["shift"] = assign_shift(s["start"])
-                k3 = (s.groupby("shift")["setup_s"].sum()/60.0).rename("setup_min")
-            else:
-                k3 = pd.Series(dtype=float, name="setup_min")
-            res = pd.concat([k2, k1, k3], axis=1)
-            res = res.fillna(0.0).reindex(["06-14","14-22","22-06"])
-            
-            # Fix data types for Arrow compatibility - ensure integers for piece counts
-            try:
-                res_display = res.copy()
-                # Convert pieces to integer, others to float
-                res_display["pieces"] = res_display["pieces"].astype('int64')
-                res_display["avg_ct_s"] = pd.to_numeric(res_display["avg_ct_s"], errors='coerce').astype('float64')
-                res_display["setup_min"] = pd.to_numeric(res_display["setup_min"], errors='coerce').astype('float64')
-                st.dataframe(res_display)
-            except Exception as e:
-                st.warning(f"Cannot display table due to data type issues: {str(e)}")
-                # Show data as text instead
-                st.write("**Shift KPIs Results:**")
-                for shift_name in ["06-14", "14-22", "22-06"]:
-                    if shift_name in res.index:
-                        row = res.loc[shift_name]
-                        st.write(f"**{shift_name}:** Pieces: {int(row['pieces'])}, Avg Cycle: {row['avg_ct_s']:.1f}s, Setup: {row['setup_min']:.1f}min")
-            
-            # Create Plotly bar chart for shift pieces
-            if not res.empty:
-                try:
-                    fig = go.Figure()
-                    # Convert data to simple arrays to avoid Arrow issues
-                    x_data = list(res.index)
-                    y_data = [int(x) for x in res["pieces"].values]  # Convert to int
-                    
-                    fig.add_trace(go.Bar(
-                        x=x_data,
-                        y=y_data,
-                        name='Pieces per Shift',
-                        marker_color='blue',
-                        text=y_data,
-                        textposition='auto'
-                    ))
-                    
-                    fig.update_layout(
-                        title="Production by Shift",
-                        xaxis_title="Shift",
-                        yaxis_title="Pieces Produced",
-                        height=400
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
-                except Exception as e:
-                    st.error(f"Chart display error: {str(e)}")
-                    st.info("Shift KPI data available but chart cannot be displayed")
+        shift_kpis_chart()
 
-# Free text handling
-if intent and intent.get("intent"):
+def answer_question(intent: Dict[str, Any]):
+    """Result of a free-text question (parse_intent) for the current window."""
     if intent["intent"] == "avg_cycle_time":
         if parts.empty:
             st.warning("No part completion events detected.")
             show_sql("-- No data in part_events")
         else:
-            sql = f"""
+            sql = """
             SELECT AVG(cycle_time_s) AS avg_cycle_time_s
-            FROM part_events
-            WHERE time >= TIMESTAMP '{from_dt}' AND time < TIMESTAMP '{to_dt}'
+            FROM part_events(?::VARCHAR[], ?, ?)
             """
-            show_sql(sql)
-            res = con.execute(sql).df()
+            show_sql(sql, window_args)
+            res = run_sql(sql, window_args)
             st.metric("Average Cycle Time", f"{res['avg_cycle_time_s'].iloc[0]:.2f} s")
             if not parts.empty:
                 try:
@@ -1218,7 +1162,7 @@ if intent and intent.get("intent"):
                     # Create Plotly line chart for cycle time trend
                     fig = go.Figure()
                     fig.add_trace(go.Scatter(
-                        x=s.index,
+                        x=plot_time(s.index),
                         y=s.values,
                         mode='lines',
                         name='Rolling Average Cycle Time',
@@ -1228,6 +1172,7 @@ if intent and intent.get("intent"):
                     fig.update_layout(
                         title="Cycle Time Rolling Average (20 points)",
                         xaxis_title="Time",
+                        xaxis_type="date",
                         yaxis_title="Cycle Time (s)",
                         height=400
                     )
@@ -1241,13 +1186,12 @@ if intent and intent.get("intent"):
             st.warning("No setup intervals detected.")
             show_sql("-- No data in setup_intervals")
         else:
-            sql = f"""
+            sql = """
             SELECT SUM(setup_s)/60.0 AS total_setup_min
-            FROM setup_intervals
-            WHERE start >= TIMESTAMP '{from_dt}' AND start < TIMESTAMP '{to_dt}'
+            FROM setup_intervals(?::VARCHAR[], ?, ?)
             """
-            show_sql(sql)
-            res = con.execute(sql).df()
+            show_sql(sql, window_args)
+            res = run_sql(sql, window_args)
             st.metric("Total Setup Time", f"{res['total_setup_min'].iloc[0]:.1f} min")
             if not setups.empty:
                 try:
@@ -1256,7 +1200,7 @@ if intent and intent.get("intent"):
                     # Create Plotly bar chart for setup times
                     fig = go.Figure()
                     fig.add_trace(go.Bar(
-                        x=s.index.strftime('%Y-%m-%d %H:%M:%S'),
+                        x=plot_time(s.index),
                         y=s.values,
                         name='Setup Time (seconds)',
                         marker_color='orange'
@@ -1265,6 +1209,7 @@ if intent and intent.get("intent"):
                     fig.update_layout(
                         title="Setup Times",
                         xaxis_title="Time",
+                        xaxis_type="date",
                         yaxis_title="Setup Time (s)",
                         height=400,
                         xaxis_tickangle=-45
@@ -1279,15 +1224,14 @@ if intent and intent.get("intent"):
             st.warning("No production events found.")
             show_sql("-- No data in part_events")
         else:
-            sql = f"""
+            sql = """
             SELECT name, COUNT(*) AS pieces
-            FROM part_events
-            WHERE time >= TIMESTAMP '{from_dt}' AND time < TIMESTAMP '{to_dt}'
+            FROM part_events(?::VARCHAR[], ?, ?)
             GROUP BY name
             ORDER BY pieces DESC
             """
-            show_sql(sql)
-            res = con.execute(sql).df()
+            show_sql(sql, window_args)
+            res = run_sql(sql, window_args)
             
             # Create Plotly bar chart
             if not res.empty:
@@ -1309,153 +1253,142 @@ if intent and intent.get("intent"):
                 st.plotly_chart(fig, use_container_width=True)
 
     elif intent["intent"] == "shift_kpis":
-        if parts.empty and setups.empty:
-            st.warning("Not enough data for shift KPIs.")
-            show_sql("-- Uses computed tables part_events/setup_intervals in Python for shift mapping.")
-        else:
-            p = parts.copy()
-            p["shift"] = assign_shift(p[TIMESTAMP_COL])
-            k1 = p.groupby("shift")["cycle_time_s"].mean().rename("avg_ct_s")
-            k2 = p.groupby("shift").size().rename("pieces")
-            if not setups.empty:
-                s = setups.copy()
-                s["shift"] = assign_shift(s["start"])
-                k3 = (s.groupby("shift")["setup_s"].sum()/60.0).rename("setup_min")
-            else:
-                k3 = pd.Series(dtype=float, name="setup_min")
-    elif intent["intent"] == "shift_kpis":
-        if parts.empty and setups.empty:
-            st.warning("Not enough data for shift KPIs.")
-            show_sql("-- Uses computed tables part_events/setup_intervals in Python for shift mapping.")
-        else:
-            # Show SQL that explains the logic
-            show_sql("""
--- KPI Calculation Logic (performed in Python/Pandas):
--- 1. Assign shifts based on Central European timezone:
---    06-14: Morning shift (6 AM - 2 PM)
---    14-22: Afternoon shift (2 PM - 10 PM) 
---    22-06: Night shift (10 PM - 6 AM)
--- 
--- 2. Calculate metrics per shift:
---    pieces: COUNT of part completion events
---    avg_ct_s: AVERAGE cycle time in seconds
---    setup_min: SUM of setup time in minutes
---
--- Equivalent SQL would be:
--- SELECT 
---   shift,
---   COUNT(*) as pieces,
---   AVG(cycle_time_s) as avg_ct_s,
---   SUM(setup_s)/60.0 as setup_min
--- FROM (
---   SELECT *,
---     CASE 
---       WHEN EXTRACT(HOUR FROM time AT TIME ZONE 'Europe/Central') BETWEEN 6 AND 13 THEN '06-14'
---       WHEN EXTRACT(HOUR FROM time AT TIME ZONE 'Europe/Central') BETWEEN 14 AND 21 THEN '14-22'
---       ELSE '22-06'
---     END as shift
---   FROM part_events
--- ) 
--- GROUP BY shift
--- ORDER BY shift;
-            """)
-            
-            p = parts.copy()
-            p["shift"] = assign_shift(p[TIMESTAMP_COL])
-            k1 = p.groupby("shift")["cycle_time_s"].mean().rename("avg_ct_s")
-            k2 = p.groupby("shift").size().rename("pieces")
-            if not setups.empty:
-                s = setups.copy()
-                s["shift"] = assign_shift(s["start"])
-                k3 = (s.groupby("shift")["setup_s"].sum()/60.0).rename("setup_min")
+        shift_kpis_chart()
+
+# The sections below are fragments: a widget inside one reruns only that section
+# against the window, detection results and caches of the last full run
+@st.fragment
+def preset_section():
+    """Preset question, its aggregation controls and its result."""
+    global sql_placeholder, visible_from, visible_to
+    log = StageLog("preset")
+    preset = st.selectbox("Preset question", preset_names, index=0 if preset_names else None)
+    agg_rule = None
+    visible_from, visible_to = from_dt, to_dt
+    selected_columns_for_preset2 = []
+
+    # Dynamic controls for timeseries presets
+    if preset and "Zeitreihe" in preset:
+        with st.container(border=True):
+            st.markdown("**Aggregation**")
+            agg_rule = st.selectbox("Rule", ["raw","10s","1m","1h","1d","1w"], index=1)  # Default to 10s instead of 1m
+
+            # Show aggregation info
+            if agg_rule == "raw":
+                st.info(f"📊 Raw data: min/max per pixel column ({DOWNSAMPLE_WIDTH} columns), all points once the visible range is small enough")
+                # Plotly zoom does not reach the script, so the visible range is re-queried from this slider
+                window_lo, window_hi = from_dt.tz_localize(None).to_pydatetime(), to_dt.tz_localize(None).to_pydatetime()
+                visible = st.slider("Visible range (UTC)", min_value=window_lo, max_value=window_hi,
+                                    value=(window_lo, window_hi), step=timedelta(minutes=1), format="YYYY-MM-DD HH:mm")
+                visible_from, visible_to = pd.Timestamp(visible[0], tz="UTC"), pd.Timestamp(visible[1], tz="UTC")
+            elif agg_rule == "10s":
+                st.info("📊 10-second intervals: Best for dynamic variables")
+            elif agg_rule == "1m":
+                st.warning("⚠️ 1-minute intervals: May smooth out rapid changes")
             else:
-                k3 = pd.Series(dtype=float, name="setup_min")
-            res = pd.concat([k2, k1, k3], axis=1)
-            res = res.fillna(0.0).reindex(["06-14","14-22","22-06"])
-            
-            # Fix data types for Arrow compatibility - ensure integers for piece counts
-            try:
-                res_display = res.copy()
-                # Convert pieces to integer, others to float
-                res_display["pieces"] = res_display["pieces"].astype('int64')
-                res_display["avg_ct_s"] = pd.to_numeric(res_display["avg_ct_s"], errors='coerce').astype('float64')
-                res_display["setup_min"] = pd.to_numeric(res_display["setup_min"], errors='coerce').astype('float64')
-                st.dataframe(res_display)
-            except Exception as e:
-                st.warning(f"Cannot display table due to data type issues: {str(e)}")
-                # Show data as text instead
-                st.write("**Shift KPIs Results:**")
-                for shift_name in ["06-14", "14-22", "22-06"]:
-                    if shift_name in res.index:
-                        row = res.loc[shift_name]
-                        st.write(f"**{shift_name}:** Pieces: {int(row['pieces'])}, Avg Cycle: {row['avg_ct_s']:.1f}s, Setup: {row['setup_min']:.1f}min")
-            
-            # Create Plotly bar chart for shift pieces
-            if not res.empty:
-                try:
-                    fig = go.Figure()
-                    # Convert data to simple arrays to avoid Arrow issues
-                    x_data = list(res.index)
-                    y_data = [int(x) for x in res["pieces"].values]  # Convert to int
-                    
-                    fig.add_trace(go.Bar(
-                        x=x_data,
-                        y=y_data,
-                        name='Pieces per Shift',
-                        marker_color='blue',
-                        text=y_data,
-                        textposition='auto'
-                    ))
-                    
-                    fig.update_layout(
-                        title="Production by Shift",
-                        xaxis_title="Shift",
-                        yaxis_title="Pieces Produced",
-                        height=400
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
-                except Exception as e:
-                    st.error(f"Chart display error: {str(e)}")
-                    st.info("Shift KPI data available but chart cannot be displayed")
-
-# Footer
-with st.expander("Raw telemetry preview"):
-    try:
-        # Fix data types for display
-        display_df = df_f.head(100).copy()
-        # Ensure all columns are properly typed for Arrow compatibility
-        for col in display_df.columns:
-            if col == MACHINE_COL:
-                # Machine names should be strings
-                display_df[col] = display_df[col].astype(str)
-            elif col == TIMESTAMP_COL:
-                # Convert datetime to string for display
-                display_df[col] = display_df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-            elif display_df[col].dtype == 'object':
-                # Try to convert to numeric first, then fallback to string
-                numeric_series = pd.to_numeric(display_df[col], errors='coerce')
-                if not numeric_series.isna().all():
-                    display_df[col] = numeric_series.astype('float64')
-                else:
-                    display_df[col] = display_df[col].astype(str)
-            elif pd.api.types.is_numeric_dtype(display_df[col]):
-                # Convert all numeric types to float64 to avoid Arrow issues
-                display_df[col] = pd.to_numeric(display_df[col], errors='coerce').astype('float64')
-            elif pd.api.types.is_datetime64_any_dtype(display_df[col]):
-                # Convert datetime to string
-                display_df[col] = display_df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-        st.dataframe(display_df)
-    except Exception as e:
-        st.error(f"Error displaying data preview: {str(e)}")
-        st.info("Data loaded successfully but cannot be displayed due to formatting issues.")
-        # Show basic info instead
-        st.write(f"**Data Shape:** {df_f.shape}")
-        st.write(f"**Columns:** {', '.join(df_f.columns[:10])}{'...' if len(df_f.columns) > 10 else ''}")
-        
-        # Show data types info
-        st.write("**Column Types:**")
-        for i, col in enumerate(df_f.columns[:10]):
-            st.text(f"{col}: {df_f[col].dtype}")
-        if len(df_f.columns) > 10:
-            st.text("...")
+                st.warning("⚠️ Large intervals: Will lose fast dynamics")
+
+            if "Top-5" not in preset and "Alle dynamischen" not in preset:
+                # third preset: user-selected metrics up to 10
+                st._is_timeseries_debug = True  # Enable debug to show analysis
+                dyn_cols = numeric_dynamic_columns(signals, data_version, window_stats, top_k=0, log=log)  # ALL varying variables
+                st._is_timeseries_debug = False  # Disable for UI selection
+                st.write(f"**All {len(dyn_cols)} dynamic variables:**")
+                st.text("\n".join(f"{i+1}. {col.split('/')[-1]}" for i, col in enumerate(dyn_cols)))  # last part only
+
+                # Default to ALL dynamic variables (up to 10)
+                default_selection = dyn_cols[:min(10, len(dyn_cols))]
+                selected_columns_for_preset2 = st.multiselect("Select up to 10 metrics", dyn_cols, default=default_selection)
+                if len(selected_columns_for_preset2) > 10:
+                    st.warning("Please select no more than 10 metrics.")
+                    selected_columns_for_preset2 = selected_columns_for_preset2[:10]
+
+    # The last run preset stays shown (and follows its controls) until another one is run
+    if st.button("Run preset"):
+        st.session_state["preset_shown"] = preset
+
+    left, right = st.columns([1,2])
+    with left:
+        st.subheader("Structured request (JSON)")
+        st.json({"preset": preset})
+
+        st.subheader("SQL used")
+        sql_placeholder = st.empty()
+
+    with right:
+        st.subheader("Result & Chart")
+
+    if preset and st.session_state.get("preset_shown") == preset:
+        with log.timed("preset answer"):
+            answer_preset(preset, agg_rule, selected_columns_for_preset2, log)
+    show_stages(log)
+
+@st.fragment
+def question_section():
+    """Free-text question and its result."""
+    global sql_placeholder
+    log = StageLog("question")
+    question = st.text_input("Or ask a question in free text", "")
+    intent = parse_intent(question) if question else None
+    if intent:
+        left, right = st.columns([1,2])
+        with left:
+            st.subheader("Structured request (JSON)")
+            st.json(intent)
+
+            st.subheader("SQL used")
+            sql_placeholder = st.empty()
+
+        with right:
+            st.subheader("Result & Chart")
+
+        if intent.get("intent"):
+            with log.timed("question answer"):
+                answer_question(intent)
+        show_stages(log)
+
+@st.fragment
+def raw_preview():
+    """First rows of the filtered window."""
+    log = StageLog("raw preview")
+    with st.expander("Raw telemetry preview"):
+        rows = st.number_input("Rows", min_value=10, max_value=1000, value=100, step=50)
+        try:
+            # Native dtypes (datetime64, numbers, machine category); only mixed text columns become strings
+            with log.timed("raw preview"):
+                show_table("raw_preview", signals.head(rows), data_version + (rows,))
+        except Exception as e:
+            st.error(f"Error displaying data preview: {str(e)}")
+            st.info("Data loaded successfully but cannot be displayed due to formatting issues.")
+            # Show basic info instead
+            columns = signals.columns
+            st.write(f"**Data Shape:** {(len(signals), len(columns))}")
+            st.write(f"**Columns:** {', '.join(columns[:10])}{'...' if len(columns) > 10 else ''}")
+
+            # Show data types info
+            st.write("**Column Types:**")
+            dtypes = signals.head(0).dtypes
+            for i, col in enumerate(columns[:10]):
+                st.text(f"{col}: {dtypes[col]}")
+            if len(columns) > 10:
+                st.text("...")
+        show_stages(log)
+
+record_stages(stage_log)
+preset_section()
+question_section()
+raw_preview()
+
+cache_stats = query_cache.stats()
+table_stats = display_cache.stats()
+query_cache_info.write(
+    f"**Query cache:** {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['entries']} results ({cache_stats['bytes'] / 2**20:.1f} MiB, {cache_stats['evictions']} evicted)  \n"
+    f"**Display tables:** {table_stats['hits']} hits / {table_stats['misses']} misses, "
+    f"{table_stats['entries']} tables, {table_stats['schemas']} schemas ({table_stats['bytes'] / 2**20:.1f} MiB)"
+)
+stage_stats = stage_cache.stats()
+with stage_info.container():
+    with st.expander(f"⏱️ Stages per rerun ({stage_stats['hits']} cached / {stage_stats['misses']} computed)"):
+        st.caption("Newest first. Fragment reruns show their stages below the section and are listed here from the next full run.")
+        st.markdown("\n".join(f"- `{at}` **{scope}**: {summary}" for at, scope, summary in reversed(st.session_state["stage_runs"])))
@@ -0,0 +1,219 @@
+"""Signal statistics catalog for a loaded dataset.
+
+One row per (signal, machine): dtype, sample count, change count, distinct
+values (the values themselves while there are few), mean/variance, min/max
+and first/last sample. It is built once when a dataset is loaded, persisted
+with the dataset's derived state and extended with appended rows only, so the
+app can look up column properties (varying or constant, boolean-like, value
+range) instead of scanning the data on every rerun.
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from telemetry import CHECKSUM_MOD, SparseSignals, signal_stats
+
+CATALOG_VERSION = 2
+LEVELS_CAP = 16  # distinct values kept per signal; more than that is "continuous"
+CHANGE_EPS = 1e-9
+
+STAT_COLUMNS = ["dtype", "samples", "changes", "distinct", "levels", "mean", "variance", "min", "max",
+                "first_ns", "last_ns", "first_value", "last_value", "is_bool"]
+
+
+def _m2(stats: pd.DataFrame) -> np.ndarray:
+    """Sum of squared deviations from the mean (variance * (n - 1); 0 for a single sample)."""
+    return np.nan_to_num(stats["variance"].to_numpy(float) * (stats["samples"].to_numpy(float) - 1))
+
+
+def _union_levels(levels) -> Optional[tuple]:
+    merged = set()
+    for lv in levels:
+        if lv is None:
+            return None
+        merged.update(lv)
+        if len(merged) > LEVELS_CAP:
+            return None
+    return tuple(sorted(merged))
+
+
+class SignalCatalog:
+    """Per-signal, per-machine statistics, updated incrementally on append.
+
+    Like events.EventTracker it remembers rows processed and the last
+    timestamp per machine, and refresh() only scans rows appended since then.
+    Counts, moments (Chan's parallel variance), extrema and first/last samples
+    merge exactly, and a change across the append boundary is counted from the
+    stored last value. `distinct` is exact while a signal has at most
+    LEVELS_CAP values (they are kept in `levels`) and an estimate beyond that.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._lock = threading.RLock()  # one catalog is shared by all sessions
+        self.reset()
+        if directory:
+            self._load()
+
+    @classmethod
+    def of_batches(cls, batches: Iterable) -> "SignalCatalog":
+        """In-memory catalog of one selection given as consecutive [machine, time] batches (one held at a time)."""
+        catalog = cls()
+        for batch in batches:
+            catalog.refresh(batch, tail=True)
+        return catalog
+
+    def reset(self) -> None:
+        self.machines: Dict[str, Dict[str, int]] = {}
+        self.table = pd.DataFrame(
+            columns=STAT_COLUMNS, index=pd.MultiIndex.from_tuples([], names=["column", "machine"])
+        )
+
+    # -- persistence -------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        try:
+            with open(self._path("catalog.json"), encoding="utf-8") as fh:
+                state = json.load(fh)
+            if state.get("version") != CATALOG_VERSION:
+                return
+            table = pd.read_parquet(self._path("catalog.parquet"))
+        except (OSError, ValueError):
+            return  # no (or unreadable) catalog: build it from scratch
+        table["levels"] = [None if lv is None else tuple(json.loads(lv)) for lv in table["levels"]]
+        self.machines = state["machines"]
+        self.table = table.set_index(["column", "machine"])
+
+    def save(self) -> None:
+        """Write the table and the per-machine watermarks atomically (tmp file + rename)."""
+        if not self.directory:
+            return
+        table = self.table.reset_index()
+        table["levels"] = [None if lv is None else json.dumps(list(lv)) for lv in table["levels"]]
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(f"catalog.parquet.{uuid.uuid4().hex}.tmp")
+            table.to_parquet(tmp, index=False)
+            os.replace(tmp, self._path("catalog.parquet"))
+            tmp = self._path(f"catalog.json.{uuid.uuid4().hex}.tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"version": CATALOG_VERSION, "machines": self.machines}, fh)
+            os.replace(tmp, self._path("catalog.json"))
+        except OSError:
+            pass  # read-only location: keep the catalog in memory only
+
+    # -- refresh -----------------------------------------------------------
+
+    def seen(self) -> Dict[str, Tuple[int, int, int]]:
+        return {name: (m["rows"], m["last_ns"], m["checksum"]) for name, m in self.machines.items()}
+
+    def refresh(self, src, tail: bool = False) -> int:
+        """Bring the catalog up to date with `src` (TelemetryFrame or SparseSignals) and persist it.
+
+        Same contract as EventTracker.refresh: `src` is the full data, or with
+        `tail` only its newest rows. Returns the number of rows scanned.
+        """
+        with self._lock:
+            ranges = src.appended_ranges(self.seen(), tail)
+            if ranges is None:
+                self.reset()
+                ranges = src.appended_ranges({})
+            if not ranges:
+                return 0
+            new = src.take_ranges(ranges)
+            self.update(new)
+            self.save()
+            return len(new)
+
+    def update(self, new) -> None:
+        """Merge the statistics of `new` (only rows after each machine's watermark) into the table."""
+        cols = new.signal_columns()
+        b = signal_stats(new, cols, eps=CHANGE_EPS, by_machine=True, levels_cap=LEVELS_CAP)
+        b = b[b["samples"] > 0]
+        b.insert(0, "dtype", [str(new.signal_dtype(c)) for c in b.index.get_level_values("column")])
+        a = self.table
+        both = a.index.intersection(b.index)
+        parts = [a.drop(both), b.drop(both)]
+        if len(both):
+            parts.append(self._merge(a.loc[both], b.loc[both]))
+        parts = [p for p in parts if len(p)]
+        if parts:
+            self.table = pd.concat(parts).sort_index()[STAT_COLUMNS]
+
+        ts = new.time_ns()
+        keys = new.keys if isinstance(new, SparseSignals) else new
+        checksums = new.checksums()
+        for name, (start, end) in keys.offsets.items():
+            m = self.machines.setdefault(str(name), {"rows": 0, "first_ns": int(ts[start]), "last_ns": 0, "checksum": 0})
+            m["rows"] += end - start
+            m["last_ns"] = int(ts[end - 1])
+            m["checksum"] = (m["checksum"] + checksums[str(name)]) % CHECKSUM_MOD
+
+    @staticmethod
+    def _merge(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+        """Combine (column, machine) rows of the stored table `a` with the stats of the appended rows `b`."""
+        na, nb = a["samples"].to_numpy(float), b["samples"].to_numpy(float)
+        n = na + nb
+        delta = b["mean"].to_numpy(float) - a["mean"].to_numpy(float)
+        m2 = _m2(a) + _m2(b) + delta * delta * na * nb / n
+        boundary = np.abs(b["first_value"].to_numpy(float) - a["last_value"].to_numpy(float)) > CHANGE_EPS
+        out = b.copy()
+        out["samples"] = n.astype(np.int64)
+        out["changes"] = a["changes"].to_numpy() + b["changes"].to_numpy() + boundary
+        out["mean"] = a["mean"].to_numpy(float) + delta * nb / n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["variance"] = np.where(n > 1, m2 / (n - 1), np.nan)
+        out["min"] = np.fmin(a["min"].to_numpy(float), b["min"].to_numpy(float))
+        out["max"] = np.fmax(a["max"].to_numpy(float), b["max"].to_numpy(float))
+        out["first_ns"] = a["first_ns"].to_numpy()
+        out["first_value"] = a["first_value"].to_numpy()
+        out["levels"] = [_union_levels(pair) for pair in zip(a["levels"], b["levels"])]
+        estimate = np.maximum(a["distinct"].to_numpy(), b["distinct"].to_numpy())
+        out["distinct"] = [len(lv) if lv is not None else max(int(d), LEVELS_CAP + 1)
+                           for lv, d in zip(out["levels"], estimate)]
+        return out
+
+    # -- lookups -----------------------------------------------------------
+
+    def covers(self, machines, from_dt, to_dt) -> bool:
+        """True if [from_dt, to_dt) holds every row of the given machines (so whole-machine stats apply)."""
+        lo, hi = pd.Timestamp(from_dt).value, pd.Timestamp(to_dt).value
+        with self._lock:
+            for name in map(str, machines):
+                m = self.machines.get(name)
+                if m is None or m["first_ns"] < lo or m["last_ns"] >= hi:
+                    return False
+        return True
+
+    def summary(self, machines=None) -> pd.DataFrame:
+        """Per-signal statistics over the given machines (all by default), indexed by column."""
+        with self._lock:
+            t = self.table
+        if machines is not None:
+            t = t[t.index.get_level_values("machine").isin([str(m) for m in machines])]
+        if t.empty:
+            return pd.DataFrame(columns=[c for c in STAT_COLUMNS if c not in ("first_value", "last_value")])
+        t = t.assign(_m2=_m2(t), _sum=t["mean"].to_numpy(float) * t["samples"].to_numpy(float))
+        g = t.groupby(level="column", sort=False)
+        out = g.agg(dtype=("dtype", "first"), samples=("samples", "sum"), changes=("changes", "sum"),
+                    min=("min", "min"), max=("max", "max"), first_ns=("first_ns", "min"),
+                    last_ns=("last_ns", "max"), is_bool=("is_bool", "any"), _sum=("_sum", "sum"),
+                    _distinct=("distinct", "max"))
+        out["mean"] = out["_sum"] / out["samples"]
+        # variance across machines: within-machine M2 plus the spread of the machine means
+        spread = t["samples"].to_numpy(float) * (t["mean"].to_numpy(float) - out["mean"].reindex(t.index.get_level_values("column")).to_numpy()) ** 2
+        m2 = (t["_m2"] + spread).groupby(level="column", sort=False).sum()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["variance"] = np.where(out["samples"] > 1, m2 / (out["samples"] - 1), np.nan)
+        out["levels"] = g["levels"].agg(_union_levels)
+        out["distinct"] = [len(lv) if lv is not None else max(int(d), LEVELS_CAP + 1)
+                           for lv, d in zip(out["levels"], out["_distinct"])]
+        return out[[c for c in STAT_COLUMNS if c not in ("first_value", "last_value")]]
@@ -0,0 +1,230 @@
+"""Display adapters between the analytics frames and the browser.
+
+Charts and tables get native values: time axes go to Plotly as epoch
+milliseconds on a date axis (numbers serialize as a typed numeric array,
+where datetime64 and strings are formatted per element), and tables keep
+their datetime64/numeric/bool/category columns for st.dataframe's Arrow
+conversion. Only the columns Arrow cannot type are turned into strings,
+in one place instead of a copy-and-cast loop at every call site.
+
+DisplayCache hands st.dataframe ready Arrow tables: each table is converted
+once per key (dataset version + window), and the schema (which columns need
+strings, Arrow types) is inferred once per column layout and reused.
+
+timeseries_figure builds the time series chart as a single figure: every
+signal is shipped once, the raw/normalized toggle runs in the browser and
+large series are drawn with WebGL (Scattergl) instead of SVG paths.
+value_ranges gives the per-signal ranges its axes are split and scaled by.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pyarrow as pa
+
+ARROW_OBJECT_TYPES = {"string", "empty", "boolean", "integer", "floating", "decimal", "bytes", "date", "datetime"}
+DISPLAY_CACHE_MAX_BYTES = int(os.environ.get("CNC_DISPLAY_CACHE_MAX_MB", "64")) * 1024 * 1024
+# plotted points (all traces) above which time series switch from SVG to WebGL
+SCATTERGL_MIN_POINTS = int(os.environ.get("CNC_SCATTERGL_MIN_POINTS", "10000"))
+TRACE_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+# value axes of the raw view; signals are spread over them by range
+Y_AXES = {
+    'y': {'title': 'Primary', 'side': 'left'},
+    'y2': {'title': 'Secondary', 'side': 'right', 'overlaying': 'y'},
+    'y3': {'title': 'Tertiary', 'side': 'left', 'overlaying': 'y', 'position': 0.05},
+    'y4': {'title': 'Quaternary', 'side': 'right', 'overlaying': 'y', 'position': 0.95},
+}
+NORMALIZED_AXIS = 'y5'  # the visible 0-1 scale of the normalized view; per-signal axes follow from y6
+
+
+def plot_time(ts) -> np.ndarray:
+    """Epoch milliseconds (int64) of a DatetimeIndex or datetime Series, for an x axis with type="date".
+
+    Plotly shows numbers on a date axis as UTC time, which is what the
+    tz-aware UTC timestamps of the app hold.
+    """
+    ts = pd.DatetimeIndex(ts)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.as_unit("ns").asi8 // 1_000_000
+
+
+def arrow_fix_columns(df: pd.DataFrame) -> List[Any]:
+    """Object columns of `df` whose values Arrow cannot type as one column (mixed values)."""
+    return [col for col in df.columns if df[col].dtype == object
+            and pd.api.types.infer_dtype(df[col], skipna=True) not in ARROW_OBJECT_TYPES]
+
+
+def arrow_safe(df: pd.DataFrame, fix: Optional[List[Any]] = None) -> pd.DataFrame:
+    """`df` with only the object columns Arrow cannot type (mixed values) as strings; other columns stay native.
+
+    `fix` skips the inference with a known column list. Returns `df` itself
+    when nothing needs converting.
+    """
+    fix = arrow_fix_columns(df) if fix is None else fix
+    if not fix:
+        return df
+    out = df.copy()
+    for col in fix:
+        out[col] = out[col].where(out[col].isna(), out[col].astype(str))
+    return out
+
+
+class DisplayCache:
+    """LRU cache of display-ready Arrow tables for st.dataframe, bounded by their size and shared by all sessions.
+
+    Keys come from the caller and must change with the shown data (dataset
+    version + window). Tables are immutable, so hits are returned as is.
+    """
+
+    def __init__(self, max_bytes: int = DISPLAY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, pa.Table]" = OrderedDict()
+        self._schemas: Dict[Tuple, Tuple[List[Any], pa.Schema]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def layout(df: pd.DataFrame) -> Tuple:
+        """Column names and dtypes (index included) that a cached schema applies to."""
+        return (tuple(map(str, df.columns)), tuple(map(str, df.dtypes)), df.index.name, str(df.index.dtype),
+                isinstance(df.index, pd.RangeIndex))
+
+    def schema(self, df: pd.DataFrame) -> Tuple[List[Any], pa.Schema]:
+        """(columns to stringify, Arrow schema) of `df`'s layout, inferred on first sight."""
+        layout = self.layout(df)
+        with self._lock:
+            plan = self._schemas.get(layout)
+        if plan is None:
+            fix = arrow_fix_columns(df)
+            plan = (fix, pa.Schema.from_pandas(arrow_safe(df, fix), preserve_index=not layout[-1]))
+            with self._lock:
+                self._schemas[layout] = plan
+        return plan
+
+    def table(self, key: Hashable, df: pd.DataFrame) -> pa.Table:
+        """`df` as an Arrow table, converted only the first time `key` is seen."""
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+        fix, schema = self.schema(df)
+        preserve_index = not isinstance(df.index, pd.RangeIndex)
+        try:
+            table = pa.Table.from_pandas(arrow_safe(df, fix), schema=schema, preserve_index=preserve_index)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # same layout, other values (e.g. a text column that is mixed in this window): infer again
+            fix = arrow_fix_columns(df)
+            table = pa.Table.from_pandas(arrow_safe(df, fix), preserve_index=preserve_index)
+            with self._lock:
+                self._schemas[self.layout(df)] = (fix, table.schema)
+        if table.nbytes <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = table
+                    self.bytes += table.nbytes
+                while self.bytes > self.max_bytes:
+                    _, dropped = self._entries.popitem(last=False)
+                    self.bytes -= dropped.nbytes
+                    self.evictions += 1
+        return table
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "schemas": len(self._schemas), "bytes": self.bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def scatter_type(n_points: int, threshold: int = SCATTERGL_MIN_POINTS):
+    """go.Scattergl (WebGL canvas) above `threshold` plotted points, else go.Scatter (one SVG path per trace)."""
+    return go.Scattergl if n_points > threshold else go.Scatter
+
+
+def value_ranges(data: pd.DataFrame, cols: List[str], stats: Optional[pd.DataFrame] = None) -> Dict[str, Dict[str, float]]:
+    """{col: {min, max, range}} for the columns of `data` with values, as the axis split and normalization use them.
+
+    `stats` (catalog statistics indexed by signal) is only valid when it
+    describes exactly the plotted window; without it, or for a signal it
+    does not know, the range is the one of the plotted values.
+    """
+    ranges = {}
+    for col in cols:
+        if col not in data.columns or not data[col].notna().any():
+            continue
+        if stats is not None and col in stats.index:
+            lo, hi = float(stats.at[col, "min"]), float(stats.at[col, "max"])
+        else:
+            lo, hi = float(data[col].min()), float(data[col].max())
+        ranges[col] = {'min': lo, 'max': hi, 'range': hi - lo}
+    return ranges
+
+
+def _axis_key(axis: str) -> str:
+    return "yaxis" + axis[1:]
+
+
+def timeseries_figure(data: pd.DataFrame, x, axis_assignment: Dict[str, str], ranges: Dict[str, Dict[str, float]],
+                      title: str, normalized_title: str, threshold: int = SCATTERGL_MIN_POINTS) -> go.Figure:
+    """One figure with the raw multi-axis view and the 0-1 normalized view, switched by buttons in the browser.
+
+    Each signal is a single trace on its value axis (`axis_assignment`, keys
+    of Y_AXES). The normalized view does not ship rescaled copies: it moves
+    every trace to an own hidden axis spanning the signal's [min, max] from
+    `ranges`, which draws it exactly as (value - min) / range on the visible
+    0-1 axis. A signal without range sits at 0.5 as before.
+    """
+    cols = [c for c in axis_assignment if c in data.columns]
+    trace = scatter_type(int(data[cols].notna().to_numpy().sum()), threshold)
+    fig = go.Figure()
+    raw_axes, norm_axes, raw_names, names = [], [], [], []
+    layout = {
+        'title': title,
+        'xaxis': {'title': "Time", 'type': "date"},
+        'height': 600,
+        'showlegend': True,
+        'legend': {'x': 1.05, 'y': 1},
+        _axis_key(NORMALIZED_AXIS): {'title': 'Normalized Value (0=min, 1=max)', 'side': 'left', 'overlaying': 'y',
+                                     'range': [-0.05, 1.05], 'visible': False},
+    }
+    for i, col in enumerate(cols):
+        axis, name = axis_assignment[col], col.split('/')[-1]
+        lo, span = ranges[col]['min'], ranges[col]['range']
+        if span <= 0:
+            lo, span = lo - 1.0, 2.0  # constant signal: centered like the former 0.5 fill
+        norm_axis = f"y{int(NORMALIZED_AXIS[1:]) + 1 + i}"
+        layout[_axis_key(norm_axis)] = {'overlaying': 'y', 'visible': False,
+                                       'range': [lo - 0.05 * span, lo + 1.05 * span]}
+        layout.setdefault(_axis_key(axis), dict(Y_AXES[axis]))
+        raw_axes.append(axis)
+        norm_axes.append(norm_axis)
+        raw_names.append(f"{name} [{axis}]")
+        names.append(name)
+        fig.add_trace(trace(x=x, y=data[col].to_numpy(), mode='lines', name=raw_names[-1], yaxis=axis,
+                            line=dict(width=2, color=TRACE_COLORS[i % len(TRACE_COLORS)]), connectgaps=False))
+    used = [_axis_key(a) for a in dict.fromkeys(raw_axes)]
+    if _axis_key('y') not in layout:
+        layout[_axis_key('y')] = dict(Y_AXES['y'])  # the base axis every other one overlays
+        used.append(_axis_key('y'))
+    show_raw = {**{f"{k}.visible": True for k in used}, f"{_axis_key(NORMALIZED_AXIS)}.visible": False}
+    show_norm = {**{f"{k}.visible": False for k in used}, f"{_axis_key(NORMALIZED_AXIS)}.visible": True}
+    layout['updatemenus'] = [{
+        'type': 'buttons', 'direction': 'right', 'x': 0, 'y': 1.12, 'xanchor': 'left', 'yanchor': 'bottom',
+        'buttons': [
+            {'label': 'Raw values (multi-axis)', 'method': 'update',
+             'args': [{'yaxis': raw_axes, 'name': raw_names}, {**show_raw, 'title.text': title}]},
+            {'label': 'Normalized (0-1)', 'method': 'update',
+             'args': [{'yaxis': norm_axes, 'name': names}, {**show_norm, 'title.text': normalized_title}]},
+        ],
+    }]
+    fig.update_layout(**layout)
+    return fig
@@ -0,0 +1,673 @@
+"""Event detection on sorted CNC telemetry (part completions, setup intervals).
+
+Detectors take a TelemetryFrame (rows sorted by [machine, time] with a
+per-machine offsets index) and work on whole columns at once: per-machine
+"previous row" comparisons become shifts that are masked at machine
+boundaries, so the cost is linear in rows and independent of the number of
+machines. They live outside app.py so benchmarks can import them without
+starting Streamlit.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from telemetry import CHECKSUM_MOD, SparseSignals, TelemetryFrame
+
+# Helpful optional fields
+EXEC_STRING = "exec_STRING"
+EXEC_PROG_COMPLETED = "exec_program_completed_BOOL"
+EXEC_ACTIVE = "exec_active_BOOL"
+EXEC_STOPPED = "exec_stopped_BOOL"
+EXEC_READY = "exec_ready_BOOL"
+PGM_STRING = "pgm_STRING"
+MODE_STRING = "mode_STRING"
+
+COMPLETION_CUES = "COMPLETED|COMPLETE|END|FINISH"
+SETUP_MODES = "SETUP|RÜST|RUEST"
+SETUP_GAP_S = 5 * 60
+TRUE_WORDS = ["1", "true", "t", "yes", "y"]
+
+
+def iqr_bounds(s: pd.Series, k: float = 1.5):
+    q1 = s.quantile(0.25)
+    q3 = s.quantile(0.75)
+    iqr = q3 - q1
+    return q1 - k * iqr, q3 + k * iqr
+
+
+def _label_codes(s: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """Integer codes + distinct labels of a text column (-1 for missing), so string work runs per label."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories
+    codes, uniques = pd.factorize(s)
+    return codes, pd.Index(uniques)
+
+
+def _label_matches(s: pd.Series, pattern: str) -> np.ndarray:
+    """Case-insensitive regex match of every row, evaluated once per distinct label."""
+    codes, labels = _label_codes(s)
+    hit = labels.astype(str).str.upper().str.contains(pattern, regex=True, na=False)
+    return np.append(np.asarray(hit, dtype=bool), False)[codes]  # code -1 (missing) -> False
+
+
+def _program_changes(tf: TelemetryFrame, missing_changes: bool = False) -> np.ndarray:
+    """True where pgm_STRING differs from the machine's previous row (and on each machine's first row).
+
+    With `missing_changes` every missing value is a change too, as in
+    Series.ne(Series.shift()) where NaN never equals NaN (the setup
+    heuristic); otherwise a run of missing values is one label, as with the
+    part detector's astype(str).
+    """
+    codes, _ = _label_codes(tf.df[PGM_STRING])
+    change = codes != tf.shift_within(codes, fill=-2)
+    return change | (codes == -1) if missing_changes else change
+
+
+def _cycle_time_jumps(tf: TelemetryFrame, cycle_col: str) -> np.ndarray:
+    """Positions where the cycle-time value jumps by more than the machine's 80th percentile jump.
+
+    Jumps are taken between consecutive non-null samples of the same machine.
+    """
+    series = tf.df[cycle_col]
+    keep = np.flatnonzero(series.notna().to_numpy())
+    if len(keep) < 2:
+        return keep[:0]
+    values = series.to_numpy(dtype=float, na_value=np.nan)[keep]
+    codes = tf.codes[keep]
+    jump = np.empty(len(keep))
+    jump[0] = np.nan
+    jump[1:] = np.abs(np.diff(values))
+    # samples of a machine are contiguous: one quantile per segment, skipping the
+    # segment's first sample (its jump would cross the machine boundary)
+    bounds = np.searchsorted(codes, np.arange(len(tf.starts) + 1))
+    threshold = np.full(len(keep), np.inf)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi - lo > 1:
+            jump[lo] = np.nan
+            threshold[lo:hi] = np.quantile(jump[lo + 1:hi], 0.8)
+    return keep[jump > threshold]
+
+
+def _every_nth_row(tf: TelemetryFrame) -> np.ndarray:
+    """Artificial marks: about 20 evenly spaced rows per machine with more than 10 rows."""
+    sizes = tf.ends - tf.starts
+    pos: List[np.ndarray] = []
+    for start, size in zip(tf.starts, sizes):
+        if size > 10:
+            step = max(10, size // 20)
+            pos.append(np.arange(start + step, start + size, step))
+    return np.concatenate(pos) if pos else np.empty(0, dtype=np.int64)
+
+
+def detect_part_completed(tf: TelemetryFrame) -> pd.DataFrame:
+    """Return rows [name, time, cycle_time_s] for completed units.
+
+    Marks come from the first of these sources that yields any:
+    rising edges of exec_program_completed_BOOL together with completion cues
+    in exec_STRING, then cycle-time jumps, then program changes, and finally
+    evenly spaced rows. Consecutive marks of a machine give the cycle time,
+    and IQR outliers are dropped.
+    """
+    df = tf.df
+    machine_col, timestamp_col = tf.machine_col, tf.timestamp_col
+    empty = pd.DataFrame(columns=[machine_col, timestamp_col, "cycle_time_s"])
+    if tf.empty:
+        return empty
+
+    marks = np.zeros(len(df), dtype=bool)
+
+    # (1) Rising edge of program_completed
+    if EXEC_PROG_COMPLETED in df.columns:
+        epc = df[EXEC_PROG_COMPLETED]
+        if pd.api.types.is_numeric_dtype(epc):
+            epc = epc.fillna(0) > 0
+        else:
+            epc = epc.astype(str).str.lower().isin(TRUE_WORDS)
+        epc = epc.to_numpy(dtype=bool)
+        marks |= epc & ~tf.shift_within(epc, fill=False)
+
+    # (2) Textual cues in exec string
+    if EXEC_STRING in df.columns:
+        marks |= _label_matches(df[EXEC_STRING], COMPLETION_CUES)
+
+    pos = np.flatnonzero(marks)
+
+    # (3) For CNC data: use changes in cycle time values as indicators
+    if not len(pos):
+        cycle_cols = [col for col in df.columns if 'cycleTime' in col or 'CycleTime' in col]
+        if cycle_cols:
+            pos = _cycle_time_jumps(tf, cycle_cols[0])
+
+    # (4) Fallback: program change
+    if not len(pos) and PGM_STRING in df.columns:
+        pos = np.flatnonzero(_program_changes(tf))
+
+    # (5) Ultimate fallback: create artificial events based on time intervals
+    if not len(pos):
+        pos = _every_nth_row(tf)
+
+    if not len(pos):
+        return empty
+
+    # positions ascend, so marks are already in [machine, time] order; drop repeated timestamps
+    codes = tf.codes[pos]
+    ts = tf.time_ns()[pos]
+    first = np.ones(len(pos), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (ts[1:] != ts[:-1])
+    pos, codes, ts = pos[first], codes[first], ts[first]
+
+    # cycle time = gap to the machine's previous mark (the first mark of each machine has none)
+    cycle = np.full(len(pos), np.nan)
+    same_machine = codes[1:] == codes[:-1]
+    cycle[1:] = np.where(same_machine, np.diff(ts) / 1e9, np.nan)
+    has_prev = ~np.isnan(cycle)
+
+    parts = pd.DataFrame({
+        machine_col: df[machine_col].take(pos[has_prev]).array,
+        timestamp_col: df[timestamp_col].take(pos[has_prev]).array,
+        "cycle_time_s": cycle[has_prev],
+    })
+    if not parts.empty:
+        low, high = iqr_bounds(parts["cycle_time_s"])
+        parts = parts[(parts["cycle_time_s"] >= max(0, low)) & (parts["cycle_time_s"] <= high)]
+    return parts
+
+
+def _runs(flags: np.ndarray, tf: TelemetryFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Run-length encode True runs that do not cross machine boundaries: (start, stop) positions, stop exclusive."""
+    edge = np.diff(flags.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+    # a new machine starts a new run: split at the boundaries
+    boundary = tf.starts[1:]
+    split = flags[boundary] & flags[boundary - 1]
+    starts = np.sort(np.concatenate((np.flatnonzero(edge == 1), boundary[split])))
+    stops = np.sort(np.concatenate((np.flatnonzero(edge == -1), boundary[split])))
+    return starts, stops
+
+
+def detect_setup_intervals(tf: TelemetryFrame) -> pd.DataFrame:
+    """Return [name, start, end, setup_s] either via explicit setup mode or long gaps around program changes.
+
+    Explicit: each run of SETUP/RÜST rows in mode_STRING is an interval from its
+    first row to the first row after it (or to the machine's last row).
+    Heuristic: a program change that follows a gap of at least 5 minutes.
+    """
+    df = tf.df
+    machine_col, timestamp_col = tf.machine_col, tf.timestamp_col
+    columns = [machine_col, "start", "end", "setup_s"]
+    if tf.empty:
+        return pd.DataFrame(columns=columns)
+    ts = tf.time_ns()
+    times = df[timestamp_col]
+    names = df[machine_col]
+
+    def intervals(first: np.ndarray, last: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({
+            machine_col: names.take(first).array,
+            "start": times.take(first).array,
+            "end": times.take(last).array,
+            "setup_s": (ts[last] - ts[first]) / 1e9,
+        }, columns=columns)
+
+    # explicit setup via MODE_STRING
+    if MODE_STRING in df.columns:
+        is_setup = _label_matches(df[MODE_STRING], SETUP_MODES)
+        first, stop = _runs(is_setup, tf)
+        # the interval ends on the first non-setup row, or on the machine's last row
+        machine_end = tf.ends[tf.codes[first]]
+        last = np.where(stop < machine_end, stop, machine_end - 1)
+        keep = ts[last] > ts[first]
+        if keep.any():
+            return intervals(first[keep], last[keep])
+
+    # heuristic via program changes and long gaps
+    gap_ok = np.zeros(len(df), dtype=bool)
+    if PGM_STRING in df.columns:
+        gap = np.diff(ts, prepend=ts[0])
+        gap_ok = _program_changes(tf, missing_changes=True) & ~tf.first_rows() & (gap >= SETUP_GAP_S * 1_000_000_000)
+    curr = np.flatnonzero(gap_ok)
+    if not len(curr):
+        return pd.DataFrame(columns=columns)
+    return intervals(curr - 1, curr)
+
+
+# =============================
+# Incremental detection
+# =============================
+EVENT_STATE_DIR = os.environ.get(
+    "CNC_EVENT_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".event_state")
+)
+EVENT_STATE_VERSION = 2
+EVENT_STATE_MAX_BYTES = int(os.environ.get("CNC_EVENT_STATE_MAX_MB", "4096")) * 1024 * 1024
+
+# part mark sources, in the order detect_part_completed falls back through them
+SOURCE_EXEC, SOURCE_CYCLE, SOURCE_PGM, SOURCE_NTH = 0, 1, 2, 3
+PART_SOURCES = (SOURCE_EXEC, SOURCE_CYCLE, SOURCE_PGM, SOURCE_NTH)
+SETUP_EXPLICIT, SETUP_GAP = 0, 1
+
+MARK_COLUMNS = ["machine", "time_ns", "source"]
+SETUP_COLUMNS = ["machine", "start_ns", "end_ns", "kind"]
+
+
+def state_dirs(root: str = EVENT_STATE_DIR) -> List[Tuple[str, int, float]]:
+    """(path, size, mtime) of the per-dataset directories under `root`, least recently used first."""
+    out = []
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return out
+    for name in names:
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        size = 0
+        for base, _, files in os.walk(path):
+            for fn in files:
+                try:
+                    size += os.path.getsize(os.path.join(base, fn))
+                except FileNotFoundError:
+                    pass  # replaced by a concurrent save
+        try:
+            out.append((path, size, os.path.getmtime(path)))
+        except FileNotFoundError:
+            continue  # evicted by another worker
+    return sorted(out, key=lambda e: e[2])
+
+
+def evict_state_dirs(keep: str, root: str = EVENT_STATE_DIR, max_bytes: int = EVENT_STATE_MAX_BYTES) -> int:
+    """Mark the dataset `keep` as used and drop least recently used dataset directories beyond max_bytes.
+
+    A directory holds everything kept per dataset (event state, signal
+    catalog, rollups, the warehouse database); `keep` is never removed.
+    """
+    active = os.path.join(root, keep)
+    try:
+        os.utime(active)  # LRU bookkeeping
+    except FileNotFoundError:
+        pass
+    entries = state_dirs(root)
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) == os.path.abspath(active):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def _seeded_prev(tf: TelemetryFrame, values: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    """Previous value per machine, where each machine's first row gets its seed (state of the last refresh)."""
+    prev = np.empty_like(values)
+    if len(values):
+        prev[1:] = values[:-1]
+        prev[tf.starts] = seeds
+    return prev
+
+
+def _first_per_run(codes: np.ndarray, ts: np.ndarray, seed_ts: np.ndarray) -> np.ndarray:
+    """Drop marks whose (machine, time) repeats the machine's previous mark (seeded with the stored last mark)."""
+    keep = np.ones(len(ts), dtype=bool)
+    if len(ts):
+        keep[1:] = (codes[1:] != codes[:-1]) | (ts[1:] != ts[:-1])
+        first = np.ones(len(ts), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        keep[first] = ts[first] != seed_ts[codes[first]]
+    return keep
+
+
+class EventTracker:
+    """Incremental part/setup detection over append-only telemetry.
+
+    Per machine it keeps the state the detectors need to continue where the
+    last refresh stopped: rows seen and last timestamp (the watermark), last
+    program-completed flag and program label, the open setup block, the last
+    cycle-time sample with its frozen jump threshold, and the last mark per
+    source. A refresh only runs over rows after each machine's watermark and
+    appends raw marks/intervals; part_events() and setup_intervals() pick the
+    mark source, cycle times and IQR bounds at read time, in O(events).
+
+    For rising edges, text cues, program changes and setup blocks/gaps the
+    result equals a full detect_part_completed/detect_setup_intervals run over
+    the whole history. The cycle-time jump threshold and the artificial step
+    of the last-resort fallback are fixed from each machine's first refresh.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._lock = threading.RLock()  # one tracker is shared by all sessions
+        self.reset()
+        if directory:
+            self._load()
+
+    def reset(self) -> None:
+        self.machines: Dict[str, Dict[str, Any]] = {}
+        self._marks: List[pd.DataFrame] = []
+        self._setups: List[pd.DataFrame] = []
+
+    # -- persistence -------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        try:
+            with open(self._path("state.json"), encoding="utf-8") as fh:
+                state = json.load(fh)
+            if state.get("version") != EVENT_STATE_VERSION:
+                return
+            marks = pd.read_parquet(self._path("marks.parquet"))
+            setups = pd.read_parquet(self._path("setups.parquet"))
+        except (OSError, ValueError):
+            return  # no (or unreadable) state: start from scratch
+        self.machines = state["machines"]
+        self._marks = [marks]
+        self._setups = [setups]
+
+    def save(self) -> None:
+        """Write state and event tables atomically (tmp file + rename) next to each other."""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for name, frame in (("marks.parquet", self.marks), ("setups.parquet", self.setups)):
+                tmp = self._path(f"{name}.{uuid.uuid4().hex}.tmp")
+                frame.to_parquet(tmp, index=False)
+                os.replace(tmp, self._path(name))
+            tmp = self._path(f"state.json.{uuid.uuid4().hex}.tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"version": EVENT_STATE_VERSION, "machines": self.machines}, fh)
+            os.replace(tmp, self._path("state.json"))
+        except OSError:
+            pass  # read-only location: keep the state in memory only
+
+    @property
+    def marks(self) -> pd.DataFrame:
+        if len(self._marks) != 1:
+            self._marks = [pd.concat(self._marks, ignore_index=True) if self._marks
+                           else pd.DataFrame({c: pd.Series(dtype=t) for c, t in zip(MARK_COLUMNS, ("object", "int64", "int8"))})]
+        return self._marks[0]
+
+    @property
+    def setups(self) -> pd.DataFrame:
+        if len(self._setups) != 1:
+            self._setups = [pd.concat(self._setups, ignore_index=True) if self._setups
+                            else pd.DataFrame({c: pd.Series(dtype=t) for c, t in zip(SETUP_COLUMNS, ("object", "int64", "int64", "int8"))})]
+        return self._setups[0]
+
+    # -- refresh -----------------------------------------------------------
+
+    def seen(self) -> Dict[str, Tuple[int, int, int]]:
+        """(rows processed, last timestamp, checksum) per machine, see TelemetryFrame.appended_ranges."""
+        return {name: (s["rows"], s["last_ns"], s["checksum"]) for name, s in self.machines.items()}
+
+    def update(self, new: TelemetryFrame) -> int:
+        """Detect events in `new` (only rows after each machine's watermark) and advance the state."""
+        if new.empty:
+            return 0
+        df = new.df
+        names = [str(m) for m in new.machines]
+        states = [self.machines.setdefault(n, {
+            "rows": 0, "last_ns": None, "checksum": 0, "epc": False, "pgm": None, "pgm_seen": False, "setup_open": None,
+            "cycle_last": None, "cycle_threshold": None, "nth_step": None, "mark_ns": {},
+        }) for n in names]
+        codes = new.codes
+        ts = new.time_ns()
+        last = new.ends - 1
+        marks, setups = [], []
+
+        def add_marks(pos: np.ndarray, source: int) -> None:
+            seed = np.array([s["mark_ns"].get(str(source), -1) for s in states], dtype=np.int64)
+            pos = pos[_first_per_run(codes[pos], ts[pos], seed)]
+            if len(pos):
+                marks.append(pd.DataFrame({"machine": np.asarray(names, dtype=object)[codes[pos]],
+                                           "time_ns": ts[pos], "source": np.int8(source)}))
+                last_mark = np.full(len(states), -1, dtype=np.int64)
+                last_mark[codes[pos]] = ts[pos]  # later positions win: the last mark per machine
+                for i in np.unique(codes[pos]):
+                    states[i]["mark_ns"][str(source)] = int(last_mark[i])
+
+        # (1)+(2) rising edge of program_completed, textual cues
+        mark = np.zeros(len(df), dtype=bool)
+        if EXEC_PROG_COMPLETED in df.columns:
+            epc = df[EXEC_PROG_COMPLETED]
+            epc = (epc.fillna(0) > 0) if pd.api.types.is_numeric_dtype(epc) else epc.astype(str).str.lower().isin(TRUE_WORDS)
+            epc = epc.to_numpy(dtype=bool)
+            mark |= epc & ~_seeded_prev(new, epc, np.array([s["epc"] for s in states], dtype=bool))
+            for i, s in enumerate(states):
+                s["epc"] = bool(epc[last[i]])
+        if EXEC_STRING in df.columns:
+            mark |= _label_matches(df[EXEC_STRING], COMPLETION_CUES)
+        add_marks(np.flatnonzero(mark), SOURCE_EXEC)
+
+        # (3) cycle-time jumps above the machine's (frozen) 80th percentile jump
+        cycle_cols = [col for col in df.columns if 'cycleTime' in col or 'CycleTime' in col]
+        if cycle_cols:
+            series = df[cycle_cols[0]]
+            keep = np.flatnonzero(series.notna().to_numpy())
+            values = series.to_numpy(dtype=float, na_value=np.nan)[keep]
+            kcodes = codes[keep]
+            bounds = np.searchsorted(kcodes, np.arange(len(states) + 1))
+            jumps = []
+            for i, s in enumerate(states):
+                lo, hi = bounds[i], bounds[i + 1]
+                if hi == lo:
+                    continue
+                v = values[lo:hi]
+                prev = s["cycle_last"]
+                jump = np.abs(np.diff(v, prepend=np.nan if prev is None else prev))
+                if s["cycle_threshold"] is None and (~np.isnan(jump)).any():
+                    s["cycle_threshold"] = float(np.nanquantile(jump, 0.8))
+                if s["cycle_threshold"] is not None:
+                    jumps.append(keep[lo:hi][jump > s["cycle_threshold"]])
+                s["cycle_last"] = float(v[-1])
+            if jumps:
+                add_marks(np.concatenate(jumps), SOURCE_CYCLE)
+
+        # (4) program changes; a change (or a missing program) after a long pause is a setup gap
+        if PGM_STRING in df.columns:
+            pgm_codes, labels = _label_codes(df[PGM_STRING])
+            label_of = np.append(np.asarray(labels.astype(str), dtype=object), None)  # code -1 -> None
+            change = pgm_codes != new.shift_within(pgm_codes, fill=-2)
+            first_label = label_of[pgm_codes[new.starts]]
+            for i, s in enumerate(states):
+                if s["pgm_seen"]:
+                    change[new.starts[i]] = first_label[i] != s["pgm"]
+            add_marks(np.flatnonzero(change), SOURCE_PGM)
+            prev_ts = _seeded_prev(new, ts, np.array([s["last_ns"] if s["last_ns"] is not None else ts[0] for s in states], dtype=np.int64))
+            seen = np.array([s["last_ns"] is not None for s in states], dtype=bool)
+            continued = ~new.first_rows() | seen[codes]
+            gap = (change | (pgm_codes == -1)) & continued & (ts - prev_ts >= SETUP_GAP_S * 1_000_000_000)
+            curr = np.flatnonzero(gap)
+            if len(curr):
+                setups.append(pd.DataFrame({"machine": np.asarray(names, dtype=object)[codes[curr]],
+                                            "start_ns": prev_ts[curr], "end_ns": ts[curr], "kind": np.int8(SETUP_GAP)}))
+            for i, s in enumerate(states):
+                s["pgm"] = label_of[pgm_codes[last[i]]]
+                s["pgm_seen"] = True
+
+        # (5) artificial marks every `step` rows of a machine
+        nth = []
+        for i, s in enumerate(states):
+            start, end = new.starts[i], new.ends[i]
+            if s["nth_step"] is None:
+                s["nth_step"] = max(10, int(end - start) // 20)
+            step = s["nth_step"]
+            first = s["rows"] + (-s["rows"]) % step or step  # first machine-local row index that is a multiple of step
+            nth.append(start + np.arange(first, s["rows"] + end - start, step) - s["rows"])
+        add_marks(np.concatenate(nth), SOURCE_NTH)
+
+        # explicit setup blocks, continuing a block left open by the last refresh
+        if MODE_STRING in df.columns:
+            is_setup = _label_matches(df[MODE_STRING], SETUP_MODES)
+            first, stop = _runs(is_setup, new)
+            run_code = codes[first]
+            start_ns = ts[first]
+            carried = []
+            for i, s in enumerate(states):
+                if s["setup_open"] is None:
+                    continue
+                row = new.starts[i]
+                if is_setup[row]:
+                    start_ns[np.flatnonzero(first == row)] = s["setup_open"]  # the run keeps its old start
+                else:
+                    carried.append((i, s["setup_open"], int(ts[row])))  # closed by this first row
+                s["setup_open"] = None
+            closed = stop < new.ends[run_code]
+            setups.append(pd.DataFrame({"machine": [names[i] for i, _, _ in carried],
+                                        "start_ns": np.array([a for _, a, _ in carried], dtype=np.int64),
+                                        "end_ns": np.array([b for _, _, b in carried], dtype=np.int64),
+                                        "kind": np.int8(SETUP_EXPLICIT)}))
+            setups.append(pd.DataFrame({"machine": np.asarray(names, dtype=object)[run_code[closed]],
+                                        "start_ns": start_ns[closed], "end_ns": ts[stop[closed]],
+                                        "kind": np.int8(SETUP_EXPLICIT)}))
+            for code, t0 in zip(run_code[~closed], start_ns[~closed]):
+                states[code]["setup_open"] = int(t0)
+
+        for i, s in enumerate(states):
+            s["rows"] += int(new.ends[i] - new.starts[i])
+            s["last_ns"] = int(ts[last[i]])
+        self._marks.extend(marks)
+        self._setups.extend(f for f in setups if len(f))
+        return len(df)
+
+    def refresh(self, src, tail: bool = False) -> int:
+        """Bring the state up to date with `src` (TelemetryFrame or SparseSignals) and persist it.
+
+        `src` is the full data, or with `tail` only its newest rows (e.g. a
+        store query for rows after watermark()). Only rows after each
+        machine's watermark are detected; if the rows before it changed, the
+        state is rebuilt from scratch. Returns the number of rows processed.
+        """
+        keys = src.keys if isinstance(src, SparseSignals) else src
+        with self._lock:
+            ranges = src.appended_ranges(self.seen(), tail)
+            if ranges is None:
+                self.reset()
+                ranges = src.appended_ranges({})
+            if not ranges:
+                return 0
+            new = src.take_ranges(ranges)
+            checksums = new.checksums()  # over all columns, before the detector inputs are picked
+            if isinstance(new, SparseSignals):
+                # sparse storage: only the detector inputs go back to wide columns
+                cols = [c for c in new.signals
+                        if c == EXEC_PROG_COMPLETED or 'cycleTime' in c or 'CycleTime' in c]
+                new = TelemetryFrame(new.to_wide(cols), keys.machine_col, keys.timestamp_col, assume_sorted=True)
+            n = self.update(new)
+            for name, checksum in checksums.items():
+                s = self.machines[name]
+                s["checksum"] = (s["checksum"] + checksum) % CHECKSUM_MOD
+            self.save()
+            return n
+
+    # -- read side ---------------------------------------------------------
+
+    def part_events(self, machines=None, from_dt=None, to_dt=None, machine_col: str = "name",
+                    timestamp_col: str = "time", drop_outliers: bool = True) -> pd.DataFrame:
+        """[name, time, cycle_time_s] like detect_part_completed, cut to a machine/time window.
+
+        The mark source is chosen among the marks inside the window, so a
+        selection without completion flags falls back like a full run over it.
+        As in that run, the first mark of a machine in the window has no cycle
+        time and is not a part: its previous mark lies before the window. The
+        marks themselves come from the whole history, so for the fallback
+        sources they can differ from a run over the window rows: edges and
+        program changes continue across the window start, and the cycle-time
+        jump threshold and the every-nth-row step are those of the first
+        refresh. The IQR outlier cut runs over the window; without
+        `drop_outliers` every cycle is returned.
+        """
+        machine, ts, cycle, source = self._source_cycles()
+        inside = self._in_window(machine, ts, machines, from_dt, to_dt)
+        chosen = next((s for s in PART_SOURCES if (source[inside] == s).any()), None)
+        if chosen is None:
+            return pd.DataFrame(columns=[machine_col, timestamp_col, "cycle_time_s"])
+        keep = inside & (source == chosen) & ~np.isnan(cycle)
+        keep[1:] &= inside[:-1]  # marks are ordered by [source, machine, time]: the previous one is the same run's
+        parts = pd.DataFrame({
+            machine_col: machine[keep],
+            timestamp_col: pd.to_datetime(ts[keep], utc=True),
+            "cycle_time_s": cycle[keep],
+        })
+        if drop_outliers and not parts.empty:
+            low, high = iqr_bounds(parts["cycle_time_s"])
+            parts = parts[(parts["cycle_time_s"] >= max(0, low)) & (parts["cycle_time_s"] <= high)]
+        return parts
+
+    def part_marks(self, machine_col: str = "name", timestamp_col: str = "time") -> pd.DataFrame:
+        """[name, time, cycle_time_s, source] of every mark source over the whole history.
+
+        The first mark of a machine and source has no cycle time (NaN). The
+        warehouse keeps all sources so its part_events(...) can choose one per
+        window like part_events().
+        """
+        machine, ts, cycle, source = self._source_cycles()
+        return pd.DataFrame({
+            machine_col: machine,
+            timestamp_col: pd.to_datetime(ts, utc=True),
+            "cycle_time_s": cycle,
+            "source": source,
+        })
+
+    def _source_cycles(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(machine, time_ns, cycle_s, source) of all marks ordered by [source, machine, time]."""
+        with self._lock:
+            marks = self.marks
+        order = np.lexsort((marks["time_ns"].to_numpy(), marks["machine"].to_numpy(), marks["source"].to_numpy()))
+        machine = marks["machine"].to_numpy()[order]
+        ts = marks["time_ns"].to_numpy()[order]
+        source = marks["source"].to_numpy()[order]
+        cycle = np.full(len(ts), np.nan)
+        if len(ts):
+            same = (machine[1:] == machine[:-1]) & (source[1:] == source[:-1])
+            cycle[1:] = np.where(same, np.diff(ts) / 1e9, np.nan)
+        return machine, ts, cycle, source
+
+    def setup_intervals(self, machines=None, from_dt=None, to_dt=None, machine_col: str = "name") -> pd.DataFrame:
+        """[name, start, end, setup_s] like detect_setup_intervals, cut to a machine/time window."""
+        with self._lock:
+            s = self.setups
+            open_blocks = [(name, st["setup_open"], st["last_ns"]) for name, st in self.machines.items()
+                           if st["setup_open"] is not None]
+        explicit = s[s["kind"] == SETUP_EXPLICIT]
+        if open_blocks:
+            # a block still open at the end of the data ends on the machine's last row (as in a full run)
+            explicit = pd.concat([explicit, pd.DataFrame(
+                {"machine": [b[0] for b in open_blocks], "start_ns": [b[1] for b in open_blocks],
+                 "end_ns": [b[2] for b in open_blocks], "kind": np.int8(SETUP_EXPLICIT)})], ignore_index=True)
+        explicit = explicit[explicit["end_ns"] > explicit["start_ns"]]
+        chosen = explicit if not explicit.empty else s[s["kind"] == SETUP_GAP]
+        order = np.lexsort((chosen["start_ns"].to_numpy(), chosen["machine"].to_numpy()))
+        machine = chosen["machine"].to_numpy()[order]
+        start = chosen["start_ns"].to_numpy()[order]
+        end = chosen["end_ns"].to_numpy()[order]
+        keep = self._in_window(machine, start, machines, from_dt, to_dt)
+        columns = [machine_col, "start", "end", "setup_s"]
+        if not keep.any():
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame({
+            machine_col: machine[keep],
+            "start": pd.to_datetime(start[keep], utc=True),
+            "end": pd.to_datetime(end[keep], utc=True),
+            "setup_s": (end[keep] - start[keep]) / 1e9,
+        }, columns=columns)
+
+    @staticmethod
+    def _in_window(machine: np.ndarray, ts: np.ndarray, machines, from_dt, to_dt) -> np.ndarray:
+        keep = np.ones(len(ts), dtype=bool)
+        if machines is not None:
+            keep &= np.isin(machine, [str(m) for m in machines])
+        if from_dt is not None:
+            keep &= ts >= pd.Timestamp(from_dt).value
+        if to_dt is not None:
+            keep &= ts < pd.Timestamp(to_dt).value
+        return keep
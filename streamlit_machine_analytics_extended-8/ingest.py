@@ -0,0 +1,679 @@
+"""Ingest helpers for the CNC analytics app.
+
+File parsing lives here (instead of in app.py) so it can be reused outside of
+the Streamlit script, e.g. from the command line:
+
+    python ingest.py prewarm /path/to/exports
+    python ingest.py stream /path/to/exports
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# =============================
+# CSV dialect sniffing
+# =============================
+SNIFF_BYTES = 64 * 1024  # bounded header sample, never the whole file
+SNIFF_MAX_LINES = 200
+CANDIDATE_SEPARATORS = [";", ",", "\t", "|"]
+CANDIDATE_ENCODINGS = ["utf-8", "cp1252", "latin-1"]
+
+_COMMA_DECIMAL = re.compile(r"^[+-]?\d+,\d+$")
+_POINT_DECIMAL = re.compile(r"^[+-]?\d*\.\d+(?:[eE][+-]?\d+)?$")
+_INTEGER = re.compile(r"^[+-]?\d+$")
+
+
+def _read_sample(src, n_bytes: int = SNIFF_BYTES) -> bytes:
+    """Read the first `n_bytes` of a path or binary file-like object and rewind it."""
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as fh:
+            return fh.read(n_bytes)
+    pos = src.tell()
+    sample = src.read(n_bytes)
+    src.seek(pos)
+    if isinstance(sample, str):
+        sample = sample.encode("utf-8")
+    return sample
+
+
+def _decode_sample(sample: bytes) -> Tuple[str, str]:
+    """Return (encoding, text) for the sample, trimmed to complete lines."""
+    encoding = "utf-8"
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding, sample = "utf-8-sig", sample[3:]
+    # drop a trailing partial line so multi-byte characters are never cut in half
+    cut = sample.rfind(b"\n")
+    if cut > 0:
+        sample = sample[:cut]
+    for enc in ([encoding] if encoding == "utf-8-sig" else CANDIDATE_ENCODINGS):
+        try:
+            return enc, sample.decode("utf-8" if enc == "utf-8-sig" else enc)
+        except UnicodeDecodeError:
+            continue
+    return "latin-1", sample.decode("latin-1")
+
+
+def _timestamp_unit(values: List[str]) -> str:
+    """Guess the unit of a timestamp column from sample values: s/ms/us/ns or 'text'."""
+    values = [v.strip() for v in values if v and v.strip()]
+    if not values:
+        return "unknown"
+    if not all(_INTEGER.match(v) for v in values):
+        return "text"
+    digits = max(len(v.lstrip("+-")) for v in values)
+    if digits >= 18:
+        return "ns"
+    if digits >= 15:
+        return "us"
+    if digits >= 12:
+        return "ms"
+    return "s"
+
+
+def sniff_csv_dialect(sample: bytes, timestamp_col: str = "time") -> Dict[str, Any]:
+    """Detect separator, decimal character, encoding and timestamp unit from a header sample."""
+    encoding, text = _decode_sample(sample)
+    lines = [ln for ln in text.splitlines() if ln.strip()][:SNIFF_MAX_LINES]
+    if not lines:
+        return {"sep": ",", "decimal": ".", "encoding": encoding, "timestamp_unit": "unknown"}
+
+    # Separator: the candidate that splits the header into most fields and
+    # yields the same field count on (almost) every sampled row.
+    best_sep, best_score = ",", (-1.0, 0)
+    for sep in CANDIDATE_SEPARATORS:
+        rows = list(csv.reader(lines, delimiter=sep))
+        n_fields = len(rows[0])
+        if n_fields < 2:
+            continue
+        consistency = sum(1 for r in rows if len(r) == n_fields) / len(rows)
+        score = (consistency, n_fields)
+        if score > best_score:
+            best_sep, best_score = sep, score
+
+    rows = list(csv.reader(lines, delimiter=best_sep))
+    header, body = rows[0], rows[1:]
+
+    # Decimal character: only meaningful when the separator is not a comma.
+    decimal = "."
+    if best_sep != ",":
+        comma = point = 0
+        for r in body:
+            for v in r:
+                if _COMMA_DECIMAL.match(v):
+                    comma += 1
+                elif _POINT_DECIMAL.match(v):
+                    point += 1
+        if comma and point:
+            decimal = "mixed"
+        elif comma:
+            decimal = ","
+
+    ts_unit = "unknown"
+    if timestamp_col in header:
+        i = header.index(timestamp_col)
+        ts_unit = _timestamp_unit([r[i] for r in body if len(r) > i])
+
+    return {"sep": best_sep, "decimal": decimal, "encoding": encoding, "timestamp_unit": ts_unit}
+
+
+# =============================
+# Numeric coercion
+# =============================
+TEXT_SUFFIX = "_STRING"
+MAX_REJECTED_SHARE = 0.5  # above this share of unparsable values the column stays text
+BOOL_WORDS = {"true": 1.0, "t": 1.0, "yes": 1.0, "y": 1.0, "false": 0.0, "f": 0.0, "no": 0.0, "n": 0.0}
+COERCION_REPORT_COLUMNS = ["column", "dtype", "values", "coerced", "rejected"]
+
+
+def _narrow_float(values: pd.Series) -> pd.Series:
+    """float64 -> float32 when every value survives the round trip unchanged."""
+    arr = values.to_numpy(dtype=np.float64, copy=False)
+    arr32 = arr.astype(np.float32)
+    if np.array_equal(arr32.astype(np.float64), arr, equal_nan=True):
+        return pd.Series(arr32, index=values.index, name=values.name)
+    return values.astype(np.float64, copy=False)
+
+
+def _parse_decimal_text(s: pd.Series):
+    """Fast path for text columns where every value is a number with a '.' or ',' decimal.
+
+    Returns (float64 Series, number of decimal commas) or (None, 0) if any
+    value does not parse, in which case the caller falls back to pandas.
+    """
+    try:
+        arr = pa.array(s, from_pandas=True, type=pa.string())
+        n_comma = pc.sum(pc.match_substring(arr, ",")).as_py() or 0
+        floats = pc.replace_substring(arr, ",", ".").cast(pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None, 0
+    return pd.Series(floats.to_numpy(zero_copy_only=False), index=s.index, name=s.name), int(n_comma)
+
+
+def coerce_numeric_columns(df: pd.DataFrame, exclude, numeric=()) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Turn signal columns into float32/float64 once, accepting decimal commas and points.
+
+    Returns the converted frame and a per-column report with the number of
+    present values, values that needed rewriting (decimal comma, true/false
+    text) and values that could not be parsed and became NaN. Columns in
+    `numeric` become numbers even if most of their values do not parse.
+    """
+    out = {}
+    report = []
+    for col in df.columns:
+        s = df[col]
+        if col in exclude or str(col).endswith(TEXT_SUFFIX) or pd.api.types.is_bool_dtype(s):
+            out[col] = s
+            continue
+        if pd.api.types.is_numeric_dtype(s):
+            out[col] = _narrow_float(s)
+            report.append({"column": col, "dtype": str(out[col].dtype), "values": int(s.notna().sum()), "coerced": 0, "rejected": 0})
+            continue
+        fast, n_comma = _parse_decimal_text(s)
+        if fast is not None:
+            out[col] = _narrow_float(fast)
+            report.append({"column": col, "dtype": str(out[col].dtype), "values": int(s.notna().sum()), "coerced": n_comma, "rejected": 0})
+            continue
+        present = s.notna()
+        num = pd.to_numeric(s, errors="coerce")
+        retry = num.isna() & present
+        coerced = 0
+        if retry.any():
+            # only the values the fast path could not parse go through string ops
+            text = s[retry].astype(str).str.strip()
+            present[text.index[text.eq("")]] = False
+            fixed = pd.to_numeric(text.str.replace(",", ".", regex=False), errors="coerce")
+            fixed = fixed.fillna(text.str.lower().map(BOOL_WORDS))
+            coerced = int(fixed.notna().sum())
+            num = num.astype(np.float64)
+            num[retry] = fixed
+        n_present = int(present.sum())
+        rejected = int((num.isna() & present).sum())
+        if n_present and rejected > MAX_REJECTED_SHARE * n_present and col not in numeric:
+            # genuine text column, leave untouched
+            out[col] = s
+            report.append({"column": col, "dtype": "text", "values": n_present, "coerced": 0, "rejected": 0})
+            continue
+        out[col] = _narrow_float(num)
+        report.append({"column": col, "dtype": str(out[col].dtype), "values": n_present, "coerced": coerced, "rejected": rejected})
+    return pd.DataFrame(out, index=df.index), pd.DataFrame(report, columns=COERCION_REPORT_COLUMNS)
+
+
+# =============================
+# Timestamps
+# =============================
+EPOCH_NS_PER_UNIT = {"s": 1_000_000_000, "ms": 1_000_000, "us": 1_000, "ns": 1}
+_UTC_NS = pd.DatetimeTZDtype("ns", "UTC")
+
+
+def epoch_unit(values: np.ndarray) -> Optional[str]:
+    """Guess the unit (s/ms/us/ns) of epoch numbers from their magnitude; same cut-offs as the CSV sniffer."""
+    finite = values[np.isfinite(values)] if values.dtype.kind == "f" else values
+    if finite.size == 0:
+        return None
+    mx = np.abs(finite).max()
+    if mx >= 1e17:
+        return "ns"
+    if mx >= 1e14:
+        return "us"
+    if mx >= 1e11:
+        return "ms"
+    return "s"
+
+
+def _utc_view(ns: np.ndarray) -> pd.arrays.DatetimeArray:
+    """Wrap int64 epoch nanoseconds as datetime64[ns, UTC] without copying the buffer."""
+    m8 = ns.view("M8[ns]")
+    try:
+        return pd.arrays.DatetimeArray._simple_new(m8, dtype=_UTC_NS)
+    except (AttributeError, TypeError):  # private constructor moved: fall back to a copy
+        return pd.array(m8).tz_localize("UTC")
+
+
+def to_utc_datetime(s: pd.Series, unit: Optional[str] = None) -> pd.Series:
+    """Convert a timestamp column to datetime64[ns, UTC].
+
+    Integer epochs (unit given or detected from magnitude) are converted
+    arithmetically; epoch nanoseconds become a zero-copy view of the input.
+    Everything else goes through pd.to_datetime.
+    """
+    if isinstance(s.dtype, pd.DatetimeTZDtype):
+        return s if str(s.dt.tz) == "UTC" else s.dt.tz_convert("UTC")
+    if pd.api.types.is_datetime64_dtype(s):
+        return s.dt.tz_localize("UTC")
+    if s.dtype.kind in "iuf":
+        values = s.to_numpy()
+        unit = unit or epoch_unit(values)
+        if unit is not None:
+            if values.dtype.kind == "f":
+                # integer and fractional part separately, so large epochs keep their precision
+                nan = np.isnan(values)
+                whole = np.floor(np.where(nan, 0.0, values))
+                frac = np.where(nan, 0.0, values) - whole
+                factor = EPOCH_NS_PER_UNIT[unit]
+                ns = whole.astype(np.int64) * factor + np.rint(frac * factor).astype(np.int64)
+                ns[nan] = np.iinfo(np.int64).min  # NaT
+            elif unit == "ns":
+                ns = values.astype(np.int64, copy=False)
+            else:
+                ns = values.astype(np.int64, copy=False) * EPOCH_NS_PER_UNIT[unit]
+            return pd.Series(_utc_view(ns), index=s.index, name=s.name, copy=False)
+    return pd.to_datetime(s, errors="coerce", utc=True)
+
+
+# =============================
+# Single-pass readers
+# =============================
+def read_csv_single_pass(src, timestamp_col: str = "time") -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Sniff the dialect from a bounded sample, then parse the file exactly once with the C engine."""
+    t0 = time.perf_counter()
+    dialect = sniff_csv_dialect(_read_sample(src), timestamp_col)
+    t1 = time.perf_counter()
+    # "mixed" decimal columns are parsed as text here and normalised afterwards
+    decimal = "," if dialect["decimal"] == "," else "."
+    df = pd.read_csv(
+        src,
+        sep=dialect["sep"],
+        decimal=decimal,
+        encoding=dialect["encoding"],
+        engine="c",
+        low_memory=False,
+        on_bad_lines="skip",
+    )
+    t2 = time.perf_counter()
+    stats = dict(dialect, sniff_s=t1 - t0, parse_s=t2 - t1)
+    return df, stats
+
+
+def read_table(src, name: str, timestamp_col: str = "time", machine_col: str = "name") -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Read one CSV/Parquet/JSON(L) file with typed signal columns.
+
+    Returns the frame and per-file stats (parse timings, dialect and the
+    numeric coercion report under "coercion").
+    """
+    fn = name.lower()
+    if fn.endswith(".csv"):
+        df, stats = read_csv_single_pass(src, timestamp_col)
+    else:
+        t0 = time.perf_counter()
+        if fn.endswith(".parquet"):
+            df = pd.read_parquet(src)
+        elif fn.endswith(".json") or fn.endswith(".jsonl"):
+            df = pd.read_json(src, lines=fn.endswith(".jsonl"))
+        else:
+            raise ValueError(f"Unsupported file: {fn}")
+        stats = {"sniff_s": 0.0, "parse_s": time.perf_counter() - t0}
+    t0 = time.perf_counter()
+    df, report = coerce_numeric_columns(df, exclude={timestamp_col, machine_col})
+    report.insert(0, "file", name)
+    stats.update(file=name, rows=len(df), columns=len(df.columns), coerce_s=time.perf_counter() - t0, coercion=report)
+    return df, stats
+
+
+def describe_stats(stats: Dict[str, Any]) -> str:
+    """One-line summary of parse stats for the sidebar."""
+    elapsed = stats["sniff_s"] + stats["parse_s"] + stats.get("coerce_s", 0.0)
+    if stats.get("cache") == "hit":
+        return (f"{stats['rows']} rows, {stats['columns']} columns from ingest cache in {stats['load_s']:.2f}s"
+                f" (text parse took {elapsed:.2f}s)")
+    text = f"{stats['rows']} rows, {stats['columns']} columns in {elapsed:.2f}s"
+    if "sep" in stats:
+        sep = "\\t" if stats["sep"] == "\t" else stats["sep"]
+        text += f" (sep '{sep}', decimal '{stats['decimal']}', {stats['encoding']}, time: {stats['timestamp_unit']})"
+    return text
+
+
+# =============================
+# Parquet ingest cache
+# =============================
+CACHE_DIR = os.environ.get("CNC_INGEST_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("CNC_INGEST_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CACHE_VERSION = "1"  # bump whenever parsing/coercion changes the typed output
+CACHE_META_KEY = b"cnc_ingest_stats"
+SUPPORTED_SUFFIXES = (".csv", ".parquet", ".json", ".jsonl")
+_HASH_BLOCK = 1 << 20
+
+
+def content_hash(src) -> str:
+    """Hash of the raw file content (path or binary file-like), independent of the file name."""
+    h = hashlib.blake2b(CACHE_VERSION.encode(), digest_size=16)
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as fh:
+            for block in iter(lambda: fh.read(_HASH_BLOCK), b""):
+                h.update(block)
+    else:
+        pos = src.tell()
+        src.seek(0)
+        for block in iter(lambda: src.read(_HASH_BLOCK), b""):
+            h.update(block.encode("utf-8") if isinstance(block, str) else block)
+        src.seek(pos)
+    return h.hexdigest()
+
+
+class IngestCache:
+    """On-disk cache of typed, zstd-compressed Parquet files keyed by content hash.
+
+    Entries are written atomically (temp file + rename), so several Streamlit
+    workers can share one directory. Reading an entry touches its mtime, and
+    the least recently used entries are evicted once the directory grows
+    beyond `max_bytes`.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        path = self.path_for(key)
+        try:
+            table = pq.read_table(path, memory_map=True)
+            os.utime(path)  # LRU bookkeeping
+        except (FileNotFoundError, pa.ArrowInvalid, OSError):
+            return None
+        try:
+            meta = json.loads(table.schema.metadata[CACHE_META_KEY])
+            meta["coercion"] = pd.DataFrame(meta["coercion"], columns=["file"] + COERCION_REPORT_COLUMNS)
+        except (TypeError, KeyError, json.JSONDecodeError):
+            # foreign or truncated file without our metadata: a miss, and out of the way of put()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return table.to_pandas(), meta
+
+    def put(self, key: str, df: pd.DataFrame, stats: Dict[str, Any]) -> bool:
+        """Store a typed frame. Returns False if the frame cannot be written as Parquet."""
+        meta = dict(stats, coercion=stats["coercion"].to_dict(orient="records"))
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return False  # e.g. text columns holding mixed Python types
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), CACHE_META_KEY: json.dumps(meta).encode()})
+        tmp = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, self.path_for(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False  # read-only or full cache directory: serve uncached
+        self.evict()
+        return True
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """(path, size, mtime) of all cache entries, least recently used first."""
+        out = []
+        for fn in os.listdir(self.directory):
+            if fn.endswith(".parquet"):
+                path = os.path.join(self.directory, fn)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another worker
+                out.append((path, info.st_size, info.st_mtime))
+        return sorted(out, key=lambda e: e[2])
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits into max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def read_table_cached(src, name: str, cache: Optional[IngestCache], timestamp_col: str = "time",
+                      machine_col: str = "name") -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """read_table() behind the content-hash ingest cache. stats["cache"] is "hit", "miss" or "off"."""
+    if cache is None:
+        df, stats = read_table(src, name, timestamp_col, machine_col)
+        stats["cache"] = "off"
+        return df, stats
+    t0 = time.perf_counter()
+    key = content_hash(src)
+    hit = cache.get(key)
+    if hit is not None:
+        df, stats = hit
+        stats.update(file=name, cache="hit", load_s=time.perf_counter() - t0)
+        stats["coercion"]["file"] = name
+        return df, stats
+    df, stats = read_table(src, name, timestamp_col, machine_col)
+    stats["cache"] = "miss" if cache.put(key, df, stats) else "off"
+    return df, stats
+
+
+# =============================
+# Streaming ingest (larger than RAM)
+# =============================
+STORE_DIR = os.environ.get("CNC_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".telemetry_store"))
+STREAM_CHUNK_ROWS = int(os.environ.get("CNC_STREAM_CHUNK_ROWS", "200000"))
+STORE_BATCH_ROWS = int(os.environ.get("CNC_STORE_BATCH_ROWS", "500000"))  # rows per batch read back from a store
+STORE_DONE_MARKER = "_complete.json"
+STORE_VERSION = "2"  # bump whenever the part file schema changes
+
+
+def _store_kind(s: pd.Series) -> str:
+    """Store type of a typed column: "time", "bool", "float" or "text"."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return "time"
+    if pd.api.types.is_bool_dtype(s):
+        return "bool"
+    return "float" if pd.api.types.is_numeric_dtype(s) else "text"
+
+
+def _as_kind(s: pd.Series, kind: str) -> pd.Series:
+    """`s` cast to a fixed store type (floats always float64, so no chunk has to be narrowed)."""
+    if kind == "time":
+        return s
+    if kind == "text":
+        return s.astype("string")
+    if kind == "bool" and not pd.api.types.is_bool_dtype(s):
+        num = pd.to_numeric(s, errors="coerce")
+        return pd.Series(pd.arrays.BooleanArray(num.fillna(0).to_numpy() != 0, num.isna().to_numpy()), index=s.index, name=s.name)
+    if kind == "bool":
+        return s
+    return pd.to_numeric(s, errors="coerce").astype(np.float64)
+
+
+def iter_chunks(src, name: str, chunk_rows: int = STREAM_CHUNK_ROWS, timestamp_col: str = "time",
+                machine_col: str = "name", schema: Optional[Dict[str, str]] = None) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Yield (typed chunk, coercion report) with at most `chunk_rows` rows each.
+
+    The timestamp column is converted to UTC datetimes per chunk, so chunks
+    can be appended to a columnar store without holding the whole file.
+    Every column keeps the store type of the first chunk with values in it
+    (recorded in `schema`, which callers can share across files): a column
+    that is numeric there is parsed as numbers in every later chunk, a text
+    column stays text, so all part files have the same schema.
+    """
+    schema = {} if schema is None else schema
+    fn = name.lower()
+    ts_unit = None
+    if fn.endswith(".csv"):
+        dialect = sniff_csv_dialect(_read_sample(src), timestamp_col)
+        ts_unit = dialect["timestamp_unit"] if dialect["timestamp_unit"] in ("s", "ms", "us", "ns") else None
+        reader = pd.read_csv(src, sep=dialect["sep"], decimal="," if dialect["decimal"] == "," else ".",
+                             encoding=dialect["encoding"], engine="c", low_memory=False, on_bad_lines="skip",
+                             chunksize=chunk_rows)
+    elif fn.endswith(".jsonl"):
+        reader = pd.read_json(src, lines=True, chunksize=chunk_rows)
+    elif fn.endswith(".parquet"):
+        reader = (b.to_pandas() for b in pq.ParquetFile(src).iter_batches(batch_size=chunk_rows))
+    else:
+        raise ValueError(f"Streaming ingest supports CSV, JSONL and Parquet, not {fn}")
+    for chunk in reader:
+        text = {col for col, kind in schema.items() if kind == "text"}
+        numeric = {col for col, kind in schema.items() if kind in ("float", "bool")}
+        chunk, report = coerce_numeric_columns(chunk, exclude={timestamp_col, machine_col} | text, numeric=numeric)
+        if timestamp_col in chunk.columns:
+            chunk[timestamp_col] = to_utc_datetime(chunk[timestamp_col], ts_unit)
+        for col in chunk.columns:
+            kind = schema.get(col)
+            if kind is None:
+                kind = "text" if col == machine_col else _store_kind(chunk[col])
+                if chunk[col].notna().any() or kind == "time":
+                    schema[col] = kind  # fixed by the first chunk that has values
+            chunk[col] = _as_kind(chunk[col], kind)
+        yield chunk, report
+
+
+def _merge_reports(reports: List[pd.DataFrame]) -> pd.DataFrame:
+    """Sum per-chunk coercion reports into one row per (file, column)."""
+    if not reports:
+        return pd.DataFrame(columns=["file"] + COERCION_REPORT_COLUMNS)
+    allr = pd.concat(reports, ignore_index=True)
+    return (allr.groupby(["file", "column"], sort=False)
+            .agg(dtype=("dtype", "last"), values=("values", "sum"), coerced=("coerced", "sum"), rejected=("rejected", "sum"))
+            .reset_index())
+
+
+def stream_to_store(sources: List[Tuple[Any, str]], store_root: str = STORE_DIR, chunk_rows: int = STREAM_CHUNK_ROWS,
+                    timestamp_col: str = "time", machine_col: str = "name") -> Tuple[str, Dict[str, Any]]:
+    """Append (src, name) sources chunk by chunk to a partitioned Parquet store.
+
+    The store is a directory of part files under `store_root`, named after
+    the content hashes of the sources; a finished store is reused as is.
+    Peak memory is bounded by `chunk_rows`, not by the size of the inputs.
+    Returns (store directory, stats with per-file timings and coercion report).
+    """
+    h = hashlib.blake2b(f"{CACHE_VERSION}:{STORE_VERSION}:{chunk_rows}".encode(), digest_size=16)
+    for src, _ in sources:
+        h.update(content_hash(src).encode())
+    store = os.path.join(store_root, h.hexdigest())
+    marker = os.path.join(store, STORE_DONE_MARKER)
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as fh:
+            stats = json.load(fh)
+        stats["coercion"] = pd.DataFrame(stats["coercion"], columns=["file"] + COERCION_REPORT_COLUMNS)
+        stats["reused"] = True
+        return store, stats
+
+    os.makedirs(store, exist_ok=True)
+    files, reports, schema = [], [], {}
+    for i, (src, name) in enumerate(sources):
+        t0 = time.perf_counter()
+        rows = chunks = 0
+        for j, (chunk, report) in enumerate(iter_chunks(src, name, chunk_rows, timestamp_col, machine_col, schema)):
+            report.insert(0, "file", name)
+            reports.append(report)
+            pq.write_table(pa.Table.from_pandas(chunk, preserve_index=False),
+                           os.path.join(store, f"part-{i:04d}-{j:05d}.parquet"), compression="zstd")
+            rows += len(chunk)
+            chunks += 1
+        files.append({"file": name, "rows": rows, "chunks": chunks, "seconds": time.perf_counter() - t0})
+    stats = {"files": files, "rows": sum(f["rows"] for f in files), "chunk_rows": chunk_rows,
+             "coercion": _merge_reports(reports)}
+    with open(marker, "w", encoding="utf-8") as fh:
+        json.dump(dict(stats, coercion=stats["coercion"].to_dict(orient="records")), fh)
+    stats["reused"] = False
+    return store, stats
+
+
+def store_glob(store: str) -> str:
+    """read_parquet() pattern for all part files of a store."""
+    return os.path.join(store, "*.parquet")
+
+
+def iter_store_batches(result, batch_rows: int = STORE_BATCH_ROWS, timestamp_col: str = "time",
+                       machine_col: str = "name") -> Iterator[pd.DataFrame]:
+    """DataFrames of about `batch_rows` rows from a DuckDB result ordered by [machine, time].
+
+    Rows sharing the (machine, time) key that ends a batch are held back for
+    the next one, so a consumer taking only the rows after each machine's
+    last timestamp (the incremental states with `tail`) sees every row once.
+    """
+    vectors = max(1, batch_rows // 2048)  # DuckDB hands out vectors of 2048 rows
+    held = None
+    while True:
+        chunk = result.fetch_df_chunk(vectors)
+        if chunk.empty:
+            break
+        if held is not None:
+            chunk = pd.concat([held, chunk], ignore_index=True)
+        machine, ts = chunk[machine_col].to_numpy(), chunk[timestamp_col].values  # tz-aware -> datetime64[ns]
+        other = np.flatnonzero((machine != machine[-1]) | (ts != ts[-1]))
+        cut = int(other[-1]) + 1 if len(other) else 0
+        held = chunk.iloc[cut:]
+        if cut:
+            yield chunk.iloc[:cut]
+    if held is not None and len(held):
+        yield held
+
+
+# =============================
+# Command line
+# =============================
+def find_exports(directory: str) -> List[str]:
+    """All CSV/Parquet/JSON(L) files below `directory`, in a stable order."""
+    files = []
+    for root, _, names in os.walk(directory):
+        files += [os.path.join(root, fn) for fn in sorted(names) if fn.lower().endswith(SUPPORTED_SUFFIXES)]
+    return sorted(files)
+
+
+def prewarm(directory: str, cache: IngestCache) -> None:
+    """Ingest every supported export below `directory` into the cache."""
+    files = find_exports(directory)
+    if not files:
+        print(f"⚠️ No CSV/Parquet/JSON files found in {directory}")
+        return
+    for path in files:
+        try:
+            t0 = time.perf_counter()
+            _, stats = read_table_cached(path, os.path.basename(path), cache)
+            print(f"✅ {path}: {stats['cache']}, {stats['rows']} rows in {time.perf_counter() - t0:.2f}s")
+        except Exception as e:
+            print(f"❌ {path}: {e}")
+    entries = cache.entries()
+    print(f"📦 Cache {cache.directory}: {len(entries)} entries, {sum(e[1] for e in entries) / 1e6:.1f} MB")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="CNC analytics ingest tools")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="ingest cache directory")
+    parser.add_argument("--max-mb", type=int, default=CACHE_MAX_BYTES // (1024 * 1024), help="cache size limit in MB")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_warm = sub.add_parser("prewarm", help="convert all exports in a directory into the Parquet ingest cache")
+    p_warm.add_argument("directory")
+    p_stream = sub.add_parser("stream", help="append all exports in a directory to a chunked Parquet store")
+    p_stream.add_argument("directory")
+    p_stream.add_argument("--store-dir", default=STORE_DIR, help="root directory of telemetry stores")
+    p_stream.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS, help="rows per chunk")
+    args = parser.parse_args(argv)
+
+    if args.command == "prewarm":
+        prewarm(args.directory, IngestCache(args.cache_dir, args.max_mb * 1024 * 1024))
+    elif args.command == "stream":
+        files = [f for f in find_exports(args.directory) if not f.lower().endswith(".json")]
+        store, stats = stream_to_store([(f, os.path.basename(f)) for f in files], args.store_dir, args.chunk_rows)
+        for f in stats["files"]:
+            print(f"✅ {f['file']}: {f['rows']} rows in {f['chunks']} chunks, {f['seconds']:.2f}s")
+        print(f"📦 Store {store}: {stats['rows']} rows{' (reused)' if stats['reused'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
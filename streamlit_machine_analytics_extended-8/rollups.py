@@ -0,0 +1,355 @@
+"""Multi-resolution rollups of the signal columns (10 s, 1 min, 1 h, 1 d).
+
+Every level holds per (machine, signal, bucket) partial aggregates:
+count, sum, min, max and the last sample (timestamp, value), plus exact value
+counts for low-cardinality signals, from which the bucket mode is taken. The
+10 s level is aggregated from the samples, each coarser level from the one
+below it, and all of them merge across machines, so the time series view
+answers a rule change with a filter + group over buckets instead of
+resampling raw samples. Weekly buckets are combined from the daily level of
+the window.
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from telemetry import CHECKSUM_MOD, SparseSignals, mode_from_counts
+
+ROLLUP_VERSION = 2
+NS = 1_000_000_000
+# rule -> bucket width in seconds, finest first; each level divides the next
+ROLLUP_LEVELS = {"10s": 10, "1m": 60, "1h": 3600, "1d": 86400}
+MODE_MAX_VALUES = 16  # signals with more distinct values get no value counts
+
+LEVEL_COLUMNS = ["machine", "signal", "bucket", "count", "sum", "min", "max", "last_ns", "last"]
+MODE_COLUMNS = ["machine", "signal", "bucket", "value", "n"]
+
+
+def _empty(columns: List[str]) -> pd.DataFrame:
+    dtypes = {"machine": np.int64, "signal": np.int64, "bucket": np.int64, "count": np.int64, "n": np.int64,
+              "last_ns": np.int64}
+    return pd.DataFrame({c: pd.Series(dtype=dtypes.get(c, np.float64)) for c in columns})
+
+
+def _segments(*keys: np.ndarray) -> np.ndarray:
+    """Start positions of runs of equal keys (arrays already grouped by those keys)."""
+    n = len(keys[0])
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    change = np.zeros(n, dtype=bool)
+    change[0] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    return np.flatnonzero(change)
+
+
+def _reduce(level: pd.DataFrame, width_ns: int, grouped: bool = False) -> pd.DataFrame:
+    """Aggregate partial rows into buckets of `width_ns`.
+
+    Rows may come in any order unless `grouped`: then each (machine, signal)
+    is one contiguous run in time order, and the sort is skipped.
+    """
+    if level.empty:
+        return level
+    bucket = level["bucket"].to_numpy() // width_ns * width_ns
+    machine, signal = level["machine"].to_numpy(), level["signal"].to_numpy()
+    last_ns = level["last_ns"].to_numpy()
+    if grouped:
+        order = np.arange(len(level))
+    else:
+        # sort by key, latest sample last inside each bucket
+        order = np.lexsort((last_ns, bucket, signal, machine))
+    machine, signal, bucket, last_ns = machine[order], signal[order], bucket[order], last_ns[order]
+    starts = _segments(machine, signal, bucket)
+    ends = np.append(starts[1:], len(order)) - 1
+    return pd.DataFrame({
+        "machine": machine[starts],
+        "signal": signal[starts],
+        "bucket": bucket[starts],
+        "count": np.add.reduceat(level["count"].to_numpy()[order], starts),
+        "sum": np.add.reduceat(level["sum"].to_numpy()[order], starts),
+        "min": np.minimum.reduceat(level["min"].to_numpy()[order], starts),
+        "max": np.maximum.reduceat(level["max"].to_numpy()[order], starts),
+        "last_ns": last_ns[ends],
+        "last": level["last"].to_numpy()[order][ends],
+    })
+
+
+def _reduce_modes(modes: pd.DataFrame, width_ns: int) -> pd.DataFrame:
+    """Sum value counts into buckets of `width_ns`."""
+    if modes.empty:
+        return modes
+    bucket = modes["bucket"].to_numpy() // width_ns * width_ns
+    machine, signal, value = modes["machine"].to_numpy(), modes["signal"].to_numpy(), modes["value"].to_numpy()
+    order = np.lexsort((value, bucket, signal, machine))
+    machine, signal, bucket, value = machine[order], signal[order], bucket[order], value[order]
+    starts = _segments(machine, signal, bucket, value)
+    return pd.DataFrame({
+        "machine": machine[starts],
+        "signal": signal[starts],
+        "bucket": bucket[starts],
+        "value": value[starts],
+        "n": np.add.reduceat(modes["n"].to_numpy()[order], starts),
+    })
+
+
+class RollupPyramid:
+    """Per-dataset rollup levels, built once and extended with appended rows.
+
+    Uses the same per-machine watermark as EventTracker/SignalCatalog: refresh()
+    aggregates only rows after it, then re-aggregates just the buckets that
+    contain the old watermark (they may receive more samples) on every level.
+    Machines and signals are stored as ids into `machine_names`/`signal_names`.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._lock = threading.RLock()  # one pyramid is shared by all sessions
+        self.reset()
+        if directory:
+            self._load()
+
+    def reset(self) -> None:
+        self.machines: Dict[str, Dict[str, int]] = {}
+        self.machine_names: List[str] = []
+        self.signal_names: List[str] = []
+        self.mode_values: Dict[str, Optional[List[float]]] = {}  # None once a signal has too many values
+        self.levels = {rule: _empty(LEVEL_COLUMNS) for rule in ROLLUP_LEVELS}
+        self.modes = {rule: _empty(MODE_COLUMNS) for rule in ROLLUP_LEVELS}
+
+    # -- persistence -------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        try:
+            with open(self._path("rollups.json"), encoding="utf-8") as fh:
+                state = json.load(fh)
+            if state.get("version") != ROLLUP_VERSION:
+                return
+            levels = {rule: pd.read_parquet(self._path(f"rollup_{rule}.parquet")) for rule in ROLLUP_LEVELS}
+            modes = {rule: pd.read_parquet(self._path(f"rollup_{rule}_modes.parquet")) for rule in ROLLUP_LEVELS}
+        except (OSError, ValueError):
+            return  # no (or unreadable) rollups: build them from scratch
+        self.machines, self.mode_values = state["machines"], state["mode_values"]
+        self.machine_names, self.signal_names = state["machine_names"], state["signal_names"]
+        self.levels, self.modes = levels, modes
+
+    def save(self) -> None:
+        """Write all levels, then the watermarks, each atomically (tmp file + rename)."""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for rule in ROLLUP_LEVELS:
+                for name, frame in ((f"rollup_{rule}.parquet", self.levels[rule]),
+                                    (f"rollup_{rule}_modes.parquet", self.modes[rule])):
+                    tmp = self._path(f"{name}.{uuid.uuid4().hex}.tmp")
+                    frame.to_parquet(tmp, index=False)
+                    os.replace(tmp, self._path(name))
+            tmp = self._path(f"rollups.json.{uuid.uuid4().hex}.tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"version": ROLLUP_VERSION, "machines": self.machines, "mode_values": self.mode_values,
+                           "machine_names": self.machine_names, "signal_names": self.signal_names}, fh)
+            os.replace(tmp, self._path("rollups.json"))
+        except OSError:
+            pass  # read-only location: keep the rollups in memory only
+
+    # -- refresh -----------------------------------------------------------
+
+    def seen(self) -> Dict[str, Tuple[int, int, int]]:
+        return {name: (m["rows"], m["last_ns"], m["checksum"]) for name, m in self.machines.items()}
+
+    def refresh(self, src, tail: bool = False) -> int:
+        """Bring the rollups up to date with `src` (TelemetryFrame or SparseSignals) and persist them.
+
+        Same contract as EventTracker.refresh. Returns the number of rows aggregated.
+        """
+        with self._lock:
+            ranges = src.appended_ranges(self.seen(), tail)
+            if ranges is None:
+                self.reset()
+                ranges = src.appended_ranges({})
+            if not ranges:
+                return 0
+            new = src.take_ranges(ranges)
+            self.update(new)
+            self.save()
+            return len(new)
+
+    def update(self, new) -> None:
+        """Aggregate `new` (rows after each machine's watermark) into every level."""
+        cols = new.signal_columns()
+        machine_ids = np.asarray([self._id(self.machine_names, str(m)) for m in new.machines], dtype=np.int64)
+        signal_ids = np.asarray([self._id(self.signal_names, c) for c in cols], dtype=np.int64)
+        ts = new.time_ns()
+        width = ROLLUP_LEVELS["10s"] * NS
+        parts, mode_parts = [], []
+        for col_idx, rows, values in new.samples(cols):
+            if not len(values):
+                continue
+            # samples are ordered by column, then [machine, time]: buckets are contiguous runs
+            code, t = new.codes[rows], ts[rows]
+            bucket = t // width * width
+            starts = _segments(col_idx, code, bucket)
+            ends = np.append(starts[1:], len(values)) - 1
+            parts.append(pd.DataFrame({
+                "machine": machine_ids[code[starts]],
+                "signal": signal_ids[col_idx[starts]],
+                "bucket": bucket[starts],
+                "count": np.diff(np.append(starts, len(values))),
+                "sum": np.add.reduceat(values, starts),
+                "min": np.minimum.reduceat(values, starts),
+                "max": np.maximum.reduceat(values, starts),
+                "last_ns": t[ends],
+                "last": values[ends],
+            }))
+            mode_parts.append(self._value_counts(cols, col_idx, machine_ids[code], signal_ids, bucket, values))
+        new_level = pd.concat(parts, ignore_index=True) if parts else _empty(LEVEL_COLUMNS)
+        mode_parts = [m for m in mode_parts if len(m)]
+        new_modes = pd.concat(mode_parts, ignore_index=True) if mode_parts else _empty(MODE_COLUMNS)
+        dropped = [self.signal_names.index(s) for s, v in self.mode_values.items() if v is None]
+
+        # all aggregates merge, so every level = its rows in buckets holding an old watermark
+        # (they get more samples) + the new partials, rolled up from the level below
+        old_last = np.full(len(self.machine_names), np.nan)  # ids without a watermark stay NaN
+        for name, m in self.machines.items():
+            old_last[self.machine_names.index(name)] = m["last_ns"]
+        for rule, seconds in ROLLUP_LEVELS.items():
+            width = seconds * NS
+            # the new partials stay grouped by (signal, machine) in time order
+            new_level, new_modes = _reduce(new_level, width, grouped=True), _reduce_modes(new_modes, width)
+            level, modes = self.levels[rule], self.modes[rule]
+            reopen = self._reopened(level, old_last, width)
+            reopen_modes = self._reopened(modes, old_last, width)
+            merged = _reduce(pd.concat([level[reopen], new_level], ignore_index=True), width) if reopen.any() else new_level
+            self.levels[rule] = pd.concat([level[~reopen], merged], ignore_index=True)
+            modes = pd.concat(
+                [modes[~reopen_modes], _reduce_modes(pd.concat([modes[reopen_modes], new_modes], ignore_index=True), width)],
+                ignore_index=True)
+            self.modes[rule] = modes[~modes["signal"].isin(dropped)] if dropped else modes
+
+        checksums = new.checksums()
+        for name, (start, end) in (new.keys if isinstance(new, SparseSignals) else new).offsets.items():
+            m = self.machines.setdefault(str(name), {"rows": 0, "last_ns": 0, "checksum": 0})
+            m["rows"] += end - start
+            m["last_ns"] = int(ts[end - 1])
+            m["checksum"] = (m["checksum"] + checksums[str(name)]) % CHECKSUM_MOD
+
+    @staticmethod
+    def _id(names: List[str], name: str) -> int:
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def _value_counts(self, cols, col_idx, machine, signal_ids, bucket, values) -> pd.DataFrame:
+        """(machine, signal, bucket, value, n) for the samples of signals that still have few values."""
+        keep = np.zeros(len(values), dtype=bool)
+        slot = np.zeros(len(values), dtype=np.int64)  # position of the value in the signal's sorted values
+        table = np.full((len(cols), MODE_MAX_VALUES), np.nan)
+        bounds = np.searchsorted(col_idx, np.arange(len(cols) + 1))  # samples are grouped by column
+        for i in np.flatnonzero(np.diff(bounds)):
+            known = self.mode_values.get(cols[i], [])
+            if known is None:
+                continue
+            part = slice(bounds[i], bounds[i + 1])
+            seen = np.union1d(known, np.unique(values[part]))
+            if len(seen) > MODE_MAX_VALUES:
+                self.mode_values[cols[i]] = None
+                continue
+            self.mode_values[cols[i]] = seen.tolist()
+            keep[part] = True
+            slot[part] = np.searchsorted(seen, values[part])
+            table[i, :len(seen)] = seen
+        if not keep.any():
+            return _empty(MODE_COLUMNS)
+        col_idx, machine, bucket, slot = col_idx[keep], machine[keep], bucket[keep], slot[keep]
+        # (signal, machine, bucket) groups are contiguous runs: count slots per run
+        starts = _segments(col_idx, machine, bucket)
+        run = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(slot))))
+        counts = np.bincount(run * MODE_MAX_VALUES + slot)
+        hit = np.flatnonzero(counts)
+        first = starts[hit // MODE_MAX_VALUES]
+        return pd.DataFrame({
+            "machine": machine[first],
+            "signal": signal_ids[col_idx[first]],
+            "bucket": bucket[first],
+            "value": table[col_idx[first], hit % MODE_MAX_VALUES],
+            "n": counts[hit],
+        })
+
+    @staticmethod
+    def _reopened(level: pd.DataFrame, old_last: np.ndarray, width: int) -> np.ndarray:
+        """Rows of buckets that contain a machine's previous watermark (`old_last` by machine id)."""
+        if level.empty:
+            return np.zeros(len(level), dtype=bool)
+        cut = np.floor(old_last[level["machine"].to_numpy()] / width) * width
+        return level["bucket"].to_numpy() >= cut  # NaN (machine without watermark) compares False
+
+    # -- lookups -----------------------------------------------------------
+
+    def lookup(self, cols: List[str], rule: str, machines, from_dt, to_dt,
+               mode_cols: List[str] = ()) -> Optional[pd.DataFrame]:
+        """Bucket means (modes for `mode_cols`) over the selected machines and [from_dt, to_dt).
+
+        Same shape as resample_frame: one row per bucket from the first to the
+        last bucket with data, empty buckets NaN. The bounds select whole
+        buckets, so they should lie on bucket edges (midnight does for every
+        rule). Returns None if the rule is unknown here or a mode column has no
+        value counts (caller resamples).
+        """
+        base = "1d" if rule == "1w" else rule
+        if base not in ROLLUP_LEVELS:
+            return None
+        with self._lock:
+            level, modes = self.levels[base], self.modes[base]
+            if any(self.mode_values.get(c) is None for c in mode_cols):
+                return None
+            machine_ids = [i for i, name in enumerate(self.machine_names) if name in set(map(str, machines))]
+            signal_ids = {name: i for i, name in enumerate(self.signal_names)}
+        lo, hi = pd.Timestamp(from_dt).value, pd.Timestamp(to_dt).value
+
+        def window(frame: pd.DataFrame, signals: List[str]) -> pd.DataFrame:
+            b = frame["bucket"].to_numpy()
+            ids = [signal_ids[c] for c in signals if c in signal_ids]
+            mask = (b >= lo) & (b < hi) & np.isin(frame["machine"].to_numpy(), machine_ids) \
+                & np.isin(frame["signal"].to_numpy(), ids)
+            out = frame[mask]
+            if rule == "1w":
+                out = out.assign(bucket=_week_label(out["bucket"].to_numpy()))
+            return out
+
+        mean_cols = [c for c in cols if c not in mode_cols]
+        rows = window(level, cols)
+        if rows.empty:
+            return pd.DataFrame(columns=cols)
+        sums = rows.groupby(["bucket", "signal"])[["sum", "count"]].sum()
+        mean = (sums["sum"] / sums["count"]).unstack("signal")
+        out = mean.rename(columns=dict(enumerate(self.signal_names))).reindex(columns=mean_cols)
+        if mode_cols:
+            counts = window(modes, list(mode_cols)).groupby(["signal", "bucket", "value"], as_index=False)["n"].sum()
+            top = {}
+            for signal, c in counts.groupby("signal"):
+                buckets, mode = mode_from_counts(c["bucket"].to_numpy(), c["value"].to_numpy(), c["n"].to_numpy())
+                top[self.signal_names[signal]] = pd.Series(mode, index=buckets)
+            out = out.join(pd.DataFrame(top).reindex(columns=list(mode_cols)), how="outer")
+        step = 7 * 86400 * NS if rule == "1w" else ROLLUP_LEVELS[rule] * NS
+        buckets = rows["bucket"].to_numpy()
+        index = np.arange(buckets.min(), buckets.max() + 1, step)
+        out = out.reindex(index)[list(cols)]
+        out.columns.name = None
+        out.index = pd.DatetimeIndex(pd.to_datetime(index, utc=True), freq=None)
+        return out
+
+
+def _week_label(day_ns: np.ndarray) -> np.ndarray:
+    """Daily buckets -> pandas '1W' (W-SUN) labels: the Sunday ending the week, whole days per week."""
+    day = day_ns // (86400 * NS)
+    weekday = (day + 3) % 7  # 1970-01-01 was a Thursday; 0 = Monday
+    return (day + 6 - weekday) * 86400 * NS
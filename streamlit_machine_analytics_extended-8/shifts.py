@@ -0,0 +1,61 @@
+"""Shift calendar: the three CNC shifts of every day as UTC intervals.
+
+Shifts are defined in local plant time (SHIFT_TZ). Start and end are
+localized per day, so the calendar stays correct across DST changes (the
+night shift of a switch-over night lasts 7 or 9 hours) and the KPI query
+joins plain UTC timestamps against it, with no time zone math per row.
+"""
+from typing import List, Tuple
+
+import pandas as pd
+
+SHIFT_TZ = "Europe/Berlin"
+# name, local start hour, local end hour (past 24 = next day); a night shift belongs to the day it starts
+SHIFTS: List[Tuple[str, int, int]] = [("06-14", 6, 14), ("14-22", 14, 22), ("22-06", 22, 30)]
+SHIFT_NAMES = [name for name, _, _ in SHIFTS]
+
+# Pieces, average cycle time and setup minutes per shift and per (day, shift),
+# from interval joins of part_events/setup_intervals against the calendar.
+# Parameters: $1 machines, $2 from, $3 to (as for the other presets);
+# rows with day NULL are the per-shift totals.
+SHIFT_KPI_SQL = """
+WITH shift_parts AS (
+  SELECT c.shift_id, COUNT(*) AS pieces, SUM(p.cycle_time_s) AS cycle_sum
+  FROM part_events($1::VARCHAR[], $2, $3) p
+  JOIN shift_calendar c ON p.time >= c.start AND p.time < c."end"
+  GROUP BY c.shift_id
+), shift_setups AS (
+  SELECT c.shift_id, SUM(s.setup_s) AS setup_s
+  FROM setup_intervals($1::VARCHAR[], $2, $3) s
+  JOIN shift_calendar c ON s.start >= c.start AND s.start < c."end"
+  GROUP BY c.shift_id
+)
+SELECT c.shift, c.day,
+  COALESCE(SUM(p.pieces), 0) AS pieces,
+  SUM(p.cycle_sum) / SUM(p.pieces) AS avg_ct_s,
+  COALESCE(SUM(s.setup_s), 0) / 60.0 AS setup_min
+FROM shift_calendar c
+LEFT JOIN shift_parts p USING (shift_id)
+LEFT JOIN shift_setups s USING (shift_id)
+WHERE c."end" > $2 AND c.start < $3
+GROUP BY GROUPING SETS ((c.shift), (c.day, c.shift))
+ORDER BY c.day NULLS FIRST, c.shift
+"""
+
+
+def shift_calendar(from_dt, to_dt, tz: str = SHIFT_TZ) -> pd.DataFrame:
+    """[shift_id, day, shift, start, end] for every shift overlapping [from_dt, to_dt]; start/end in UTC."""
+    lo = pd.Timestamp(from_dt).tz_convert(tz).tz_localize(None).normalize() - pd.Timedelta(days=1)
+    hi = pd.Timestamp(to_dt).tz_convert(tz).tz_localize(None).normalize()
+    days = pd.date_range(lo, hi, freq="D")
+
+    def utc(hours: int) -> pd.DatetimeIndex:
+        local = days + pd.Timedelta(hours=hours)
+        return local.tz_localize(tz, ambiguous=False, nonexistent="shift_forward").tz_convert("UTC")
+
+    cal = pd.concat([
+        pd.DataFrame({"day": days.date, "shift": name, "start": utc(h0), "end": utc(h1)})
+        for name, h0, h1 in SHIFTS
+    ], ignore_index=True).sort_values("start", ignore_index=True)
+    cal.insert(0, "shift_id", range(len(cal)))
+    return cal
@@ -0,0 +1,89 @@
+"""Keyed results and instrumentation of the app's expensive stages.
+
+A widget change reruns app.py or only one of its fragments. The stages
+behind it (window cut, part/setup detection, catalog summary, dynamic
+metric scores, ...) are looked up in StageCache under explicit keys, the
+dataset version and the filter window, so a rerun only recomputes what its
+inputs changed: switching the aggregation rule never reaches part or setup
+detection again. Every run records the stages it reached in a StageLog
+(ran or cached, and how long), which the app shows per rerun.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+STAGE_CACHE_ENTRIES = int(os.environ.get("CNC_STAGE_CACHE_ENTRIES", "64"))
+
+
+class StageLog:
+    """Stages reached by one script run or fragment rerun: (stage, "ran" | "cached", seconds)."""
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.started = time.time()
+        self.entries: List[Tuple[str, str, float]] = []
+
+    def record(self, stage: str, status: str, seconds: float) -> None:
+        self.entries.append((stage, status, seconds))
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """Record a stage that always runs (not keyed), with its duration."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, "ran", time.perf_counter() - t0)
+
+    def ran(self) -> List[str]:
+        return [stage for stage, status, _ in self.entries if status == "ran"]
+
+    def summary(self) -> str:
+        """One line: `stage 12 ms` for stages that ran, `stage (cached)` for hits."""
+        parts = [f"{stage} {seconds * 1000:.0f} ms" if status == "ran" else f"{stage} (cached)"
+                 for stage, status, seconds in self.entries]
+        return " · ".join(parts) if parts else "no stages"
+
+
+class StageCache:
+    """LRU of stage results keyed by (stage, key), shared by all sessions.
+
+    Keys must contain everything the stage reads (dataset version, window,
+    parameters); results are returned as stored, so stages must not modify
+    them afterwards.
+    """
+
+    def __init__(self, max_entries: int = STAGE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, stage: str, key: Hashable, fn: Callable[[], Any], log: Optional[StageLog] = None) -> Any:
+        """fn() once per (stage, key); later calls with the same key return the stored result."""
+        t0 = time.perf_counter()
+        with self._lock:
+            if (stage, key) in self._entries:
+                self._entries.move_to_end((stage, key))
+                self.hits += 1
+                value = self._entries[(stage, key)]
+                if log is not None:
+                    log.record(stage, "cached", time.perf_counter() - t0)
+                return value
+            self.misses += 1
+        value = fn()
+        with self._lock:
+            self._entries[(stage, key)] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if log is not None:
+            log.record(stage, "ran", time.perf_counter() - t0)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
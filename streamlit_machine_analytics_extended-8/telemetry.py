@@ -0,0 +1,756 @@
+"""Canonical in-memory telemetry container for the CNC analytics app.
+
+The frame is sorted by [machine, time] exactly once. Event detectors and
+metric scorers then work on positional per-machine slices (via the offsets
+index) instead of sorting or grouping the frame again, and the sidebar
+filters cut machine/time windows by binary search on that order.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_BLOCK_BYTES = 64 * 1024 * 1024  # sample arrays handed out per block by TelemetryFrame.samples()
+CHECKSUM_MOD = 1 << 64  # TelemetryFrame.checksums() are wrapping uint64 sums
+
+
+def as_machine_category(s: pd.Series) -> pd.Series:
+    """Machine names as a categorical with sorted string categories (sorting then groups by code)."""
+    if isinstance(s.dtype, pd.CategoricalDtype) and s.cat.categories.inferred_type in ("string", "empty"):
+        return s
+    return s.astype(str).astype("category")
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer on a uint64 array (wrapping arithmetic): every input bit moves the whole hash."""
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _cell_hashes(name, values) -> np.ndarray:
+    """uint64 hash of every cell of one column from its name and value, 0 where the value is missing.
+
+    Numbers and booleans hash as float64 (also inside text columns),
+    timestamps as epoch ns and anything else as text, so a value keeps its
+    hash whatever type a load inferred for the column, in wide or sparse
+    storage.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        cats = series.cat.categories
+        codes = series.cat.codes.to_numpy()
+        missing = codes < 0
+        bits = pd.util.hash_array(np.asarray(cats.astype(str), dtype=object))[codes] if len(cats) \
+            else np.zeros(len(series), dtype=np.uint64)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        missing = series.isna().to_numpy()
+        bits = pd.DatetimeIndex(series).as_unit("ns").asi8.view(np.uint64)
+    elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        v = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(v)
+        bits = (v + 0.0).view(np.uint64)  # + 0.0 folds -0.0 into 0.0
+    else:
+        missing = series.isna().to_numpy()
+        bits = pd.util.hash_array(series.astype(str).to_numpy(dtype=object))
+        number = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        is_number = ~np.isnan(number)
+        bits[is_number] = (number[is_number] + 0.0).view(np.uint64)
+    h = _mix(bits ^ pd.util.hash_array(np.array([str(name)], dtype=object))[0])
+    h[missing] = 0
+    return h
+
+
+def _cell_sums(df: pd.DataFrame) -> np.ndarray:
+    """Per row, the wrapping sum of its cell hashes (missing cells add nothing)."""
+    sums = np.zeros(len(df), dtype=np.uint64)
+    for col in df.columns:
+        sums += _cell_hashes(col, df[col])
+    return sums
+
+
+def _take_hashes(hashes: Optional[np.ndarray], ranges: List[Tuple[int, int]]) -> Optional[np.ndarray]:
+    """Row hashes of the sorted [lo, hi) ranges, when they were computed for the whole frame."""
+    if hashes is None or not ranges:
+        return None
+    return np.concatenate([hashes[lo:hi] for lo, hi in ranges])
+
+
+class TelemetryFrame:
+    """Telemetry sorted by [machine, time] with a per-machine start/end offsets index."""
+
+    def __init__(self, df: pd.DataFrame, machine_col: str = "name", timestamp_col: str = "time",
+                 assume_sorted: bool = False):
+        if not assume_sorted:
+            df = df.sort_values([machine_col, timestamp_col], kind="stable", ignore_index=True)
+        self.df = df
+        self.machine_col = machine_col
+        self.timestamp_col = timestamp_col
+
+        names = self.df[machine_col]
+        if isinstance(names.dtype, pd.CategoricalDtype):
+            # compare integer codes instead of materializing the name strings
+            keys = names.cat.codes.to_numpy()
+            labels = names.cat.categories
+        else:
+            keys = names.to_numpy()
+            labels = None
+        n = len(keys)
+        if n:
+            breaks = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            self.starts = np.concatenate(([0], breaks))
+            self.ends = np.concatenate((breaks, [n]))
+        else:
+            self.starts = np.empty(0, dtype=np.int64)
+            self.ends = np.empty(0, dtype=np.int64)
+        self.offsets: Dict[object, Tuple[int, int]] = {
+            (labels[keys[s]] if labels is not None else keys[s]): (int(s), int(e))
+            for s, e in zip(self.starts, self.ends)
+        }
+        self._codes: Optional[np.ndarray] = None
+        self._time_order: Optional[np.ndarray] = None
+        self._row_hashes: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.df.columns)
+
+    def head(self, n: int) -> pd.DataFrame:
+        return self.df.head(n)
+
+    @property
+    def machines(self) -> List[object]:
+        return list(self.offsets)
+
+    def machine(self, name) -> pd.DataFrame:
+        """Rows of one machine as a positional slice of the sorted frame (no boolean mask, no copy)."""
+        start, end = self.offsets[name]
+        return self.df.iloc[start:end]
+
+    def groups(self) -> Iterator[Tuple[object, pd.DataFrame]]:
+        """(machine, slice) pairs in sorted machine order, like groupby() without the regrouping."""
+        for name, (start, end) in self.offsets.items():
+            yield name, self.df.iloc[start:end]
+
+    @property
+    def codes(self) -> np.ndarray:
+        """Machine number (0..n_machines-1) for every row."""
+        if self._codes is None:
+            self._codes = np.repeat(np.arange(len(self.starts)), self.ends - self.starts)
+        return self._codes
+
+    def first_rows(self) -> np.ndarray:
+        """Boolean mask of the first row of each machine."""
+        mask = np.zeros(len(self.df), dtype=bool)
+        mask[self.starts] = True
+        return mask
+
+    def shift_within(self, values: np.ndarray, fill) -> np.ndarray:
+        """Previous value per machine (groupby(machine).shift()) on the sorted order."""
+        prev = np.empty_like(values)
+        if len(values):
+            prev[1:] = values[:-1]
+            prev[self.starts] = fill
+        return prev
+
+    def time_ns(self) -> np.ndarray:
+        """Timestamps as int64 nanoseconds since the epoch (UTC), without boxing."""
+        return self.df[self.timestamp_col].to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+    def time_range(self) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        """(min, max) timestamp from the first/last row of every machine, without a full scan."""
+        if not len(self.starts):
+            return None, None
+        ts = self.df[self.timestamp_col]
+        return ts.iloc[self.starts].min(), ts.iloc[self.ends - 1].max()
+
+    def window_ranges(self, machines, from_dt, to_dt) -> List[Tuple[int, int]]:
+        """Sorted, non-empty [lo, hi) row ranges of `machines` with from_dt <= time < to_dt."""
+        ts = self.time_ns()
+        lo_ns = pd.Timestamp(from_dt).value
+        hi_ns = pd.Timestamp(to_dt).value
+        ranges = []
+        for name in machines:
+            if name not in self.offsets:
+                continue
+            start, end = self.offsets[name]
+            lo = start + int(np.searchsorted(ts[start:end], lo_ns, side="left"))
+            hi = start + int(np.searchsorted(ts[start:end], hi_ns, side="left"))
+            if hi > lo:
+                ranges.append((lo, hi))
+        ranges.sort()
+        return ranges
+
+    def window(self, machines, from_dt, to_dt) -> "TelemetryFrame":
+        """Rows of `machines` with from_dt <= time < to_dt, located by binary search per machine.
+
+        Cost is O(machines * log rows) plus the size of the selected window: a
+        single contiguous range comes back as a positional slice (no copy),
+        several ranges are gathered with one take().
+        """
+        return self.take_ranges(self.window_ranges(machines, from_dt, to_dt))
+
+    def appended_ranges(self, seen: Dict[str, Tuple[int, int, int]], tail: bool = False,
+                        hashes: Optional[np.ndarray] = None) -> Optional[List[Tuple[int, int]]]:
+        """Per-machine [lo, hi) ranges of rows not covered by `seen`, or None if the history changed.
+
+        `seen` maps machine name to (rows processed, last timestamp in ns,
+        checksum of those rows, see checksums()). Data is append-only: a
+        machine's first `rows` rows are the ones already processed and must
+        still end at that timestamp and sum to that checksum; anything else
+        (edited or replaced data) needs a rebuild. With `tail` the frame only
+        holds recent rows, and new rows are the ones after the timestamp.
+        `hashes` stands in for row_hashes() (SparseSignals passes its own).
+        """
+        ts = self.time_ns()
+        ranges = []
+        for name, (start, end) in self.offsets.items():
+            state = seen.get(str(name))
+            lo = start
+            if state is not None and tail:
+                lo = start + int(np.searchsorted(ts[start:end], state[1], side="right"))
+            elif state is not None:
+                lo = start + state[0]
+                if lo > end or ts[lo - 1] != state[1] or (lo < end and ts[lo] < state[1]):
+                    return None
+                hashes = self.row_hashes() if hashes is None else hashes
+                if int(hashes[start:lo].sum(dtype=np.uint64)) != state[2]:
+                    return None  # same rows and last timestamp, other values
+            if end > lo:
+                ranges.append((lo, end))
+        if not tail and not set(seen) <= {str(m) for m in self.offsets}:
+            return None  # a machine disappeared
+        return ranges
+
+    def take_ranges(self, ranges: List[Tuple[int, int]]) -> "TelemetryFrame":
+        """Rows of the sorted [lo, hi) position ranges, as a slice when they are contiguous."""
+        if not ranges:
+            sub = self.df.iloc[0:0]
+        elif all(ranges[i][1] == ranges[i + 1][0] for i in range(len(ranges) - 1)):
+            sub = self.df.iloc[ranges[0][0]:ranges[-1][1]]
+        else:
+            sub = self.df.take(np.concatenate([np.arange(lo, hi) for lo, hi in ranges]))
+        out = TelemetryFrame(sub, self.machine_col, self.timestamp_col, assume_sorted=True)
+        out._row_hashes = _take_hashes(self._row_hashes, ranges)
+        return out
+
+    def row_hashes(self) -> np.ndarray:
+        """uint64 hash of every row from its non-missing cells and their column names, computed once.
+
+        A column added later or widened from int to float leaves the hashes
+        of the existing rows as they were. take_ranges() carries them over.
+        """
+        if self._row_hashes is None:
+            self._row_hashes = _mix(_cell_sums(self.df))
+        return self._row_hashes
+
+    def checksums(self, hashes: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Wrapping sum of the row hashes per machine, the checksum the incremental states keep in `seen`.
+
+        `hashes` stands in for row_hashes() as in appended_ranges().
+        """
+        hashes = self.row_hashes() if hashes is None else hashes
+        sums = np.add.reduceat(hashes, self.starts) if len(hashes) else hashes
+        return {str(name): int(total) for name, total in zip(self.offsets, sums)}
+
+    def time_order(self) -> np.ndarray:
+        """Row positions in global time order (identity for a single machine), computed once."""
+        if self._time_order is None:
+            if len(self.starts) <= 1:
+                self._time_order = np.arange(len(self.df))
+            else:
+                self._time_order = np.argsort(self.time_ns(), kind="stable")
+        return self._time_order
+
+    # -- signal access (shared with SparseSignals) -------------------------
+
+    def signal_columns(self) -> List[str]:
+        """Numeric and boolean columns other than machine and time."""
+        return [
+            c for c in self.df.columns
+            if c not in (self.machine_col, self.timestamp_col)
+            and (pd.api.types.is_numeric_dtype(self.df[c]) or pd.api.types.is_bool_dtype(self.df[c]))
+        ]
+
+    def signal(self, col: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(row positions, values) of the non-null samples of one column, in [machine, time] order."""
+        series = self.df[col]
+        keep = np.flatnonzero(series.notna().to_numpy())
+        return keep, series.to_numpy()[keep]
+
+    def signal_dtype(self, col: str) -> np.dtype:
+        return self.df[col].dtype
+
+    def samples(self, cols: List[str], block_bytes: int = SAMPLE_BLOCK_BYTES) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Non-null samples of `cols` as flat (column index, row position, float value) arrays.
+
+        Samples are grouped by column, then row, and handed out in blocks of
+        about `block_bytes` so callers can process all columns with a few
+        array operations instead of one pass per column.
+        """
+        parts: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        size = 0
+        for i, col in enumerate(cols):
+            values = self.df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            rows = np.flatnonzero(~np.isnan(values))
+            parts.append((i, rows, values[rows]))
+            size += 16 * len(rows)
+            if size >= block_bytes or i == len(cols) - 1:
+                yield (
+                    np.repeat(np.array([p[0] for p in parts]), [len(p[1]) for p in parts]),
+                    np.concatenate([p[1] for p in parts]),
+                    np.concatenate([p[2] for p in parts]),
+                )
+                parts, size = [], 0
+
+    def signal_frame(self, cols: List[str]) -> pd.DataFrame:
+        """[time] + cols in global time order, keeping rows where any of `cols` is set."""
+        cols = [c for c in cols if c in self.df.columns]
+        d = self.df[[self.timestamp_col] + cols].take(self.time_order())
+        return d.dropna(subset=cols, how="all")
+
+
+def history_changed(batches: Iterable[TelemetryFrame], seens: List[Dict[str, Tuple[int, int, int]]]) -> List[bool]:
+    """For each `seen` of an incremental state, whether the data in `batches` no longer holds the rows it processed.
+
+    `batches` are the data in [machine, time] order (e.g. store query
+    batches, which keep rows of one timestamp together). Per machine, the rows
+    up to the watermark must be as many and sum to the same checksum as the
+    processed ones, as TelemetryFrame.appended_ranges checks on a full frame.
+    """
+    totals = [{name: [0, 0] for name in seen} for seen in seens]
+    for batch in batches:
+        ts = batch.time_ns()
+        hashes = batch.row_hashes()
+        for name, (start, end) in batch.offsets.items():
+            for seen, total in zip(seens, totals):
+                state = seen.get(str(name))
+                if state is None:
+                    continue
+                hi = start + int(np.searchsorted(ts[start:end], state[1], side="right"))
+                t = total[str(name)]
+                t[0] += hi - start
+                t[1] = (t[1] + int(hashes[start:hi].sum(dtype=np.uint64))) % CHECKSUM_MOD
+    return [any((total[name][0], total[name][1]) != (state[0], state[2]) for name, state in seen.items())
+            for seen, total in zip(seens, totals)]
+
+
+def signal_stats(src, cols: List[str], eps: float = 1e-9, distinct_sample: int = 4096,
+                 by_machine: bool = False, levels_cap: int = 0) -> pd.DataFrame:
+    """Per-column sample count, changes, distinct values, mean, variance, min and max in one pass.
+
+    `src` is a TelemetryFrame or SparseSignals. A change is a step of more than
+    `eps` between consecutive non-null samples of the same machine. All columns
+    are handled together on the flat samples from src.samples() (contiguous per
+    column): bincount for counts and moments, reduceat for min/max. `distinct`
+    is exact up to `distinct_sample` samples per column and an estimate (the
+    distinct values among evenly spaced samples, at least 2 when min < max)
+    beyond that.
+
+    With `by_machine` the rows are (column, machine) pairs and also carry the
+    first/last sample (timestamp and value); with `levels_cap` a `levels`
+    column holds the sorted distinct values when there are at most that many.
+    """
+    k = len(cols)
+    machines = [str(m) for m in src.machines] if by_machine else [None]
+    n_groups = k * len(machines)
+    out = {name: np.zeros(n_groups, dtype=np.int64) for name in ("samples", "changes", "distinct")}
+    out.update({name: np.full(n_groups, np.nan) for name in ("mean", "variance", "min", "max")})
+    if by_machine:
+        out.update({name: np.zeros(n_groups, dtype=np.int64) for name in ("first_ns", "last_ns")})
+        out.update({name: np.full(n_groups, np.nan) for name in ("first_value", "last_value")})
+    levels: List[Optional[tuple]] = [None] * n_groups
+    codes = src.codes
+    for col_idx, rows, values in src.samples(cols):
+        if not len(values):
+            continue
+        # samples are ordered by column, then [machine, time]: every group is one contiguous segment
+        group = col_idx * len(machines) + codes[rows] if by_machine else col_idx
+        n = np.bincount(group, minlength=n_groups)
+        present = np.flatnonzero(n)
+        starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+        step = (group[1:] == group[:-1]) & (codes[rows[1:]] == codes[rows[:-1]]) & (np.abs(np.diff(values)) > eps)
+        out["changes"] += np.bincount(group[1:][step], minlength=n_groups)
+        out["samples"] += n
+        mean = np.bincount(group, weights=values, minlength=n_groups)[present] / n[present]
+        centered = values - np.repeat(mean, n[present])
+        sq = np.bincount(group, weights=centered * centered, minlength=n_groups)[present]
+        out["mean"][present] = mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["variance"][present] = np.where(n[present] > 1, sq / (n[present] - 1), np.nan)
+        out["min"][present] = np.minimum.reduceat(values, starts[present])
+        out["max"][present] = np.maximum.reduceat(values, starts[present])
+        if by_machine:
+            first, last = starts[present], starts[present] + n[present] - 1
+            ts = src.time_ns()
+            out["first_ns"][present], out["last_ns"][present] = ts[rows[first]], ts[rows[last]]
+            out["first_value"][present], out["last_value"][present] = values[first], values[last]
+        # distinct values on at most `distinct_sample` evenly spaced samples per group
+        pick = np.concatenate([
+            np.arange(starts[i], starts[i] + n[i], max(1, -(-n[i] // distinct_sample))) for i in present
+        ])
+        order = np.lexsort((values[pick], group[pick]))
+        v, g = values[pick][order], group[pick][order]
+        new_value = np.ones(len(v), dtype=bool)
+        new_value[1:] = (g[1:] != g[:-1]) | (v[1:] != v[:-1])
+        out["distinct"] += np.bincount(g[new_value], minlength=n_groups)
+        if levels_cap:
+            v, g = v[new_value], g[new_value]
+            bounds = np.searchsorted(g, present, side="left"), np.searchsorted(g, present, side="right")
+            for i, lo, hi in zip(present, *bounds):
+                if hi - lo <= levels_cap:
+                    levels[i] = tuple(v[lo:hi].tolist())
+    varying = out["min"] < out["max"]
+    out["distinct"] = np.where(varying, np.maximum(out["distinct"], 2), out["distinct"])
+    if by_machine:
+        index = pd.MultiIndex.from_product([cols, machines], names=["column", "machine"])
+    else:
+        index = pd.Index(cols, name="column")
+    stats = pd.DataFrame(out, index=index)
+    if levels_cap:
+        stats["levels"] = levels
+    stats["is_bool"] = np.repeat([pd.api.types.is_bool_dtype(src.signal_dtype(c)) for c in cols], len(machines))
+    return stats
+
+
+MODE_TABLE_CELLS = 1 << 24  # bucket x value count tables larger than this are counted sparsely
+
+
+def mode_from_counts(bucket: np.ndarray, value: np.ndarray, n: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Most frequent value per bucket from (bucket, value, count) rows, e.g. a SQL GROUP BY.
+
+    Ties go to the smallest value, like Series.mode().iloc[0]. Returns the
+    buckets (sorted) and their modes.
+    """
+    order = np.lexsort((value, -np.asarray(n), bucket))
+    bucket, value = np.asarray(bucket)[order], np.asarray(value)[order]
+    first = np.flatnonzero(np.append(True, bucket[1:] != bucket[:-1])) if len(bucket) else np.empty(0, dtype=np.int64)
+    return bucket[first], value[first]
+
+
+def bucket_mode(values: np.ndarray, bucket: np.ndarray, n_buckets: int, empty: float = np.nan) -> np.ndarray:
+    """Mode of `values` per bucket (`bucket` = 0..n_buckets-1 for every value) without a Python call per bucket.
+
+    Values are encoded as codes into their sorted distinct values and counted
+    per (bucket, code) with one bincount, so argmax picks the smallest of tied
+    values (Series.mode().iloc[0]). Buckets whose values are all NaN get NaN,
+    buckets without any row get `empty`.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    bucket = np.asarray(bucket, dtype=np.int64)
+    out = np.full(n_buckets, empty, dtype=np.float64)
+    out[np.unique(bucket)] = np.nan
+    valid = ~np.isnan(values)
+    levels, codes = np.unique(values[valid], return_inverse=True)
+    if not len(levels):
+        return out
+    bucket = bucket[valid]
+    k = len(levels)
+    if n_buckets * k <= MODE_TABLE_CELLS:
+        counts = np.bincount(bucket * k + codes, minlength=n_buckets * k).reshape(n_buckets, k)
+        has = counts.any(axis=1)
+        out[has] = levels[counts[has].argmax(axis=1)]
+    else:
+        keys, n = np.unique(bucket * k + codes, return_counts=True)
+        buckets, modes = mode_from_counts(keys // k, keys % k, n)
+        out[buckets] = levels[modes]
+    return out
+
+
+DOWNSAMPLE_WIDTH = 1000  # pixel columns the raw time series view is reduced to (min and max of each)
+
+
+def minmax_indices(t_ns: np.ndarray, values: np.ndarray, n_bins: int) -> np.ndarray:
+    """Sorted positions of the min and max sample in each of `n_bins` equal time bins, plus first and last.
+
+    `t_ns` must be sorted. NaN samples are skipped; spikes survive because
+    every bin keeps its extremes, so a line through the kept points covers
+    the same vertical extent per pixel column as the full series. Series
+    with at most 2 * n_bins samples come back whole.
+    """
+    pos = np.flatnonzero(~np.isnan(values))
+    if len(pos) <= 2 * n_bins:
+        return pos
+    t = t_ns[pos]
+    span = max(int(t[-1] - t[0]), 1)
+    bins = np.minimum(((t - t[0]) / span * n_bins).astype(np.int64), n_bins - 1)
+    starts = np.flatnonzero(np.append(True, bins[1:] != bins[:-1]))
+    v = values[pos]
+    keep = [np.array([0, len(pos) - 1])]
+    for extreme in (np.minimum, np.maximum):
+        # first sample per bin that equals the bin's extreme (bins are sorted, so reduceat works on slices)
+        hit = np.flatnonzero(v == np.repeat(extreme.reduceat(v, starts), np.diff(np.append(starts, len(v)))))
+        keep.append(hit[np.append(True, bins[hit][1:] != bins[hit][:-1])])
+    return pos[np.unique(np.concatenate(keep))]
+
+
+def downsample_frame(d: pd.DataFrame, n_bins: int = DOWNSAMPLE_WIDTH) -> pd.DataFrame:
+    """Rows of a time-indexed, time-sorted frame that hold any column's per-bin min or max (minmax_indices)."""
+    if len(d) <= 2 * n_bins:
+        return d
+    t_ns = d.index.asi8
+    keep = np.unique(np.concatenate([np.empty(0, dtype=np.int64)] + [
+        minmax_indices(t_ns, d[col].to_numpy(dtype=np.float64, na_value=np.nan), n_bins) for col in d.columns
+    ]))
+    return d.iloc[keep]
+
+
+RESAMPLE_INTERVALS = {"10s": "10 seconds", "1m": "1 minute", "1h": "1 hour", "1d": "1 day", "1w": "1 week"}
+
+
+def _sql_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def resample_sql(cols: List[str], rule: str, mode_levels: Optional[Dict[str, Sequence[float]]] = None,
+                 machine_col: str = "name", timestamp_col: str = "time") -> str:
+    """DuckDB query that resamples the `events` view like the app's pandas resampling, in SQL.
+
+    Parameters: machine names, window start, window end. Means per
+    time_bucket; columns in `mode_levels` (column -> its distinct values) get
+    the most frequent value instead, smallest on a tie, counted per level in
+    the same aggregation. One row per bucket from the first to the last bucket
+    with data, empty buckets NULL; weekly buckets are labelled with the Sunday
+    that ends them, like pandas' 1W. Needs the connection's TimeZone set to UTC.
+    """
+    mode_levels = {c: sorted(map(float, mode_levels[c])) for c in cols if c in (mode_levels or {})}
+    interval = f"INTERVAL '{RESAMPLE_INTERVALS[rule]}'"
+    bucket = f"time_bucket({interval}, {timestamp_col})"
+    if rule == "1w":
+        bucket += " + INTERVAL '6 days'"  # time_bucket weeks start on Monday
+    aggregates, columns = ["bucket"], ["grid.bucket"]
+    for c in cols:
+        col = _sql_ident(c)
+        if c not in mode_levels:
+            aggregates.append(f"AVG({col}) AS {col}")
+            columns.append(f"agg.{col}")
+            continue
+        levels = ", ".join(repr(v) for v in mode_levels[c])
+        counts = ", ".join(f"COUNT(*) FILTER (WHERE {col} = {v!r})" for v in mode_levels[c])
+        aggregates.append(f"list_value({counts}) AS {col}")
+        # first level with the highest count; NULL when the bucket has no value
+        columns.append(f"CASE WHEN list_max(agg.{col}) > 0 "
+                       f"THEN [{levels}][list_position(agg.{col}, list_max(agg.{col}))] END AS {col}")
+    casts = ",\n    ".join(f"CAST({_sql_ident(c)} AS DOUBLE) AS {_sql_ident(c)}" for c in cols)
+    any_value = " OR ".join(f"{_sql_ident(c)} IS NOT NULL" for c in cols)
+    aggregates = ",\n    ".join(aggregates)
+    columns = ",\n  ".join(columns)
+    return (
+        f"WITH w AS (\n  SELECT {bucket} AS bucket,\n    {casts}\n  FROM events\n"
+        f"  WHERE CAST({machine_col} AS VARCHAR) IN (SELECT UNNEST(?::VARCHAR[]))\n"
+        f"    AND {timestamp_col} >= ? AND {timestamp_col} < ?\n    AND ({any_value})\n), "
+        f"agg AS (\n  SELECT {aggregates}\n  FROM w GROUP BY bucket\n), "
+        f"grid AS (\n  SELECT UNNEST(range(MIN(bucket), MAX(bucket) + {interval}, {interval})) AS bucket FROM agg\n)\n"
+        f"SELECT {columns}\nFROM grid LEFT JOIN agg USING (bucket)\nORDER BY bucket"
+    )
+
+
+def _row_dtype(n_rows: int) -> np.dtype:
+    """Smallest unsigned integer type that can address n_rows positions."""
+    return np.min_scalar_type(max(n_rows - 1, 0))
+
+
+class SparseSignals:
+    """Long (machine, time, signal_id, value) storage of the numeric signal columns.
+
+    CNC exports write one row per sample, and each row sets only the few
+    signals that changed, so most cells of the wide frame are empty. Here the
+    machine/time keys (plus any text columns) stay in a narrow, sorted
+    TelemetryFrame, and each signal keeps only its non-null samples as two
+    arrays: row positions into the keys (smallest unsigned int type) and
+    values (the column's own dtype). signal_id is the position in `signals`.
+
+    The same signal_columns()/signal()/signal_frame() interface as
+    TelemetryFrame lets the dynamic-metrics scorer and the resampler run on
+    either storage. to_long() and events_sql() serve DuckDB.
+    """
+
+    def __init__(self, keys: TelemetryFrame, signals: List[str], rows: List[np.ndarray],
+                 values: List[np.ndarray], dtypes: List[np.dtype]):
+        self.keys = keys
+        self.signals = signals
+        self.rows = rows
+        self.values = values
+        self.dtypes = dtypes
+        self.machine_col = keys.machine_col
+        self.timestamp_col = keys.timestamp_col
+        self._row_hashes: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_frame(cls, tf: TelemetryFrame) -> "SparseSignals":
+        """Split a sorted wide frame into narrow keys + per-signal (rows, values) arrays."""
+        df = tf.df
+        signals = [c for c in tf.signal_columns() if isinstance(df[c].dtype, np.dtype)]
+        row_dtype = _row_dtype(len(df))
+        rows, values, dtypes = [], [], []
+        for col in signals:
+            pos, vals = tf.signal(col)
+            rows.append(pos.astype(row_dtype))
+            values.append(vals)
+            dtypes.append(df[col].dtype)
+        keys = TelemetryFrame(df.drop(columns=signals), tf.machine_col, tf.timestamp_col, assume_sorted=True)
+        return cls(keys, signals, rows, values, dtypes)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def empty(self) -> bool:
+        return self.keys.empty
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self.keys.codes
+
+    @property
+    def columns(self) -> List[str]:
+        """Column names of the equivalent wide frame."""
+        return list(self.keys.df.columns) + self.signals
+
+    @property
+    def nnz(self) -> int:
+        return int(sum(len(r) for r in self.rows))
+
+    def nbytes(self) -> int:
+        """Memory held by keys and signal arrays (deep, like DataFrame.memory_usage)."""
+        arrays = sum(r.nbytes + v.nbytes for r, v in zip(self.rows, self.values))
+        return int(self.keys.df.memory_usage(deep=True).sum()) + arrays
+
+    def signal_columns(self) -> List[str]:
+        return list(self.signals)
+
+    def signal(self, col: str) -> Tuple[np.ndarray, np.ndarray]:
+        i = self.signals.index(col)
+        return self.rows[i], self.values[i]
+
+    def window(self, machines, from_dt, to_dt) -> "SparseSignals":
+        """Machine/time window: binary search on the keys, then per signal on its row positions."""
+        return self.take_ranges(self.keys.window_ranges(machines, from_dt, to_dt))
+
+    def take_ranges(self, ranges: List[Tuple[int, int]]) -> "SparseSignals":
+        """Key rows of the sorted [lo, hi) position ranges with the samples that fall inside them."""
+        keys = self.keys.take_ranges(ranges)
+        row_dtype = _row_dtype(len(keys))
+        rows, values = [], []
+        for pos, vals in zip(self.rows, self.values):
+            kept_rows, kept_vals, base = [], [], 0
+            for lo, hi in ranges:
+                a, b = np.searchsorted(pos, [lo, hi], side="left")
+                kept_rows.append(pos[a:b].astype(np.int64) - lo + base)
+                kept_vals.append(vals[a:b])
+                base += hi - lo
+            rows.append(np.concatenate(kept_rows).astype(row_dtype) if ranges else pos[:0].astype(row_dtype))
+            values.append(np.concatenate(kept_vals) if ranges else vals[:0])
+        out = SparseSignals(keys, self.signals, rows, values, self.dtypes)
+        out._row_hashes = _take_hashes(self._row_hashes, ranges)
+        return out
+
+    def row_hashes(self) -> np.ndarray:
+        """Same row hashes as the equivalent wide frame's TelemetryFrame.row_hashes(), computed once."""
+        if self._row_hashes is None:
+            sums = _cell_sums(self.keys.df)
+            for name, pos, vals in zip(self.signals, self.rows, self.values):
+                sums[pos] += _cell_hashes(name, vals)  # one sample per row and signal
+            self._row_hashes = _mix(sums)
+        return self._row_hashes
+
+    def checksums(self) -> Dict[str, int]:
+        return self.keys.checksums(self.row_hashes())
+
+    def appended_ranges(self, seen: Dict[str, Tuple[int, int, int]], tail: bool = False) -> Optional[List[Tuple[int, int]]]:
+        """TelemetryFrame.appended_ranges on the keys, with the checksums over keys and signals."""
+        return self.keys.appended_ranges(seen, tail, None if tail or not seen else self.row_hashes())
+
+    @property
+    def machines(self) -> List[object]:
+        return self.keys.machines
+
+    def time_ns(self) -> np.ndarray:
+        return self.keys.time_ns()
+
+    def signal_dtype(self, col: str) -> np.dtype:
+        return self.dtypes[self.signals.index(col)]
+
+    def samples(self, cols: List[str], block_bytes: int = SAMPLE_BLOCK_BYTES) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Same as TelemetryFrame.samples; the arrays already hold only the non-null samples, so one block."""
+        idx = [self.signals.index(c) for c in cols]
+        if not idx:
+            return
+        yield (
+            np.repeat(np.arange(len(idx)), [len(self.rows[i]) for i in idx]),
+            np.concatenate([self.rows[i].astype(np.int64) for i in idx]),
+            np.concatenate([self.values[i].astype(np.float64) for i in idx]),
+        )
+
+    def dense(self, col: str) -> np.ndarray:
+        """One signal as a full-length column (NaN where not sampled)."""
+        i = self.signals.index(col)
+        pos, vals = self.rows[i], self.values[i]
+        if len(pos) == len(self.keys):
+            return vals
+        out = np.full(len(self.keys), np.nan, dtype=np.result_type(self.dtypes[i], np.float32))
+        out[pos] = vals
+        return out
+
+    def to_wide(self, cols: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rebuild the wide frame (all signals, or only `cols`) in [machine, time] order."""
+        cols = self.signals if cols is None else [c for c in cols if c in self.signals]
+        wide = self.keys.df.copy()
+        for col in cols:
+            wide[col] = self.dense(col)
+        return wide
+
+    def head(self, n: int) -> pd.DataFrame:
+        """The first `n` rows of the wide frame; only those rows are widened."""
+        return self.take_ranges([(0, min(n, len(self)))]).to_wide()
+
+    def signal_frame(self, cols: List[str]) -> pd.DataFrame:
+        """[time] + cols in global time order over the rows where any of `cols` is set."""
+        cols = [c for c in cols if c in self.signals]
+        used = np.unique(np.concatenate([self.signal(c)[0] for c in cols])) if cols else np.empty(0, dtype=np.int64)
+        ts = self.keys.df[self.timestamp_col]
+        # stable time order restricted to the used rows (same tie order as the wide path)
+        used = used[np.argsort(self.keys.time_ns()[used], kind="stable")]
+        data = {self.timestamp_col: ts.take(used).array}
+        for col in cols:
+            data[col] = self.dense(col)[used]
+        return pd.DataFrame(data, columns=[self.timestamp_col] + cols)
+
+    def to_long(self) -> pd.DataFrame:
+        """(row_id, machine, time, signal_id, value) with one line per non-null sample."""
+        rows = np.concatenate([r.astype(np.int64) for r in self.rows]) if self.rows else np.empty(0, dtype=np.int64)
+        signal_id = np.repeat(np.arange(len(self.signals), dtype=np.int16), [len(r) for r in self.rows])
+        value = np.concatenate([v.astype(np.float64) for v in self.values]) if self.values else np.empty(0)
+        keys = self.keys.df
+        return pd.DataFrame({
+            "row_id": rows,
+            self.machine_col: keys[self.machine_col].take(rows).array,
+            self.timestamp_col: keys[self.timestamp_col].take(rows).array,
+            "signal_id": signal_id,
+            "value": value,
+        })
+
+    def events_sql(self, keys_table: str, long_table: str) -> str:
+        """SELECT that pivots the long table back to the wide `events` layout inside DuckDB.
+
+        `keys_table` must hold the key frame plus a `row_id` column (its position),
+        `long_table` the output of to_long().
+        """
+        pivots = ",\n    ".join(
+            f"MAX(value) FILTER (WHERE signal_id = {i}) AS {_sql_ident(name)}" for i, name in enumerate(self.signals)
+        )
+        pivot = f"SELECT row_id,\n    {pivots}\n  FROM {long_table} GROUP BY row_id" if self.signals else f"SELECT row_id FROM {long_table}"
+        return (
+            f"SELECT k.* EXCLUDE (row_id), s.* EXCLUDE (row_id)\n"
+            f"FROM {keys_table} k LEFT JOIN ({pivot}) s ON s.row_id = k.row_id\n"
+            f"ORDER BY k.row_id"
+        )
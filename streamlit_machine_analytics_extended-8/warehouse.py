@@ -0,0 +1,448 @@
+"""Persistent DuckDB database of one dataset, the app's analytical store.
+
+`telemetry` holds the rows as a typed table (VARCHAR machine, TIMESTAMPTZ
+time, BOOLEAN/BIGINT/DOUBLE/VARCHAR signals), loaded once and then only
+extended with appended rows. Every batch is inserted in [machine, time]
+order, so the min/max DuckDB keeps per row group (zone maps) lets a machine/
+time filter skip everything outside the window; no extra index is needed
+for those range scans. `parts` (the marks of every source with their cycle
+times) and `setups` hold the EventTracker output for the whole history,
+`shift_calendar` the shifts of the data's date range (shifts.shift_calendar,
+UTC start/end).
+
+Each rerun takes a cursor with the view `events` and the table macros
+`part_events(machines, from, to)` and `setup_intervals(...)` over the full
+tables, so nothing is re-registered from pandas and the preset SQL passes the
+selection as parameters. QueryCache keeps query results keyed to the
+warehouse version. EventsWindow is the selected window of `events` in
+streaming mode, where the rows are never loaded into pandas as a whole.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from ingest import STORE_BATCH_ROWS, iter_store_batches
+from shifts import SHIFT_TZ, shift_calendar
+from telemetry import CHECKSUM_MOD, SparseSignals, TelemetryFrame, _sql_ident, as_machine_category
+
+WAREHOUSE_VERSION = 2
+WAREHOUSE_FILE = "analytics.duckdb"
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("CNC_QUERY_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+def _duckdb_type(dtype: np.dtype) -> str:
+    """Column type of a sparse signal (the pivot yields DOUBLE for all of them)."""
+    if dtype.kind == "b":
+        return "BOOLEAN"
+    if dtype.kind in "iu":
+        return "BIGINT"
+    return "DOUBLE"
+
+
+class AnalyticsWarehouse:
+    """Typed DuckDB tables of one dataset in `directory`, shared by all sessions.
+
+    Uses the same per-machine watermark as EventTracker/SignalCatalog: refresh()
+    inserts only rows after it. The watermarks live in the database file and
+    are written in the same transaction as the rows. If the file cannot be
+    opened (read-only location, or held by another process) the database
+    lives in memory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, machine_col: str = "name", timestamp_col: str = "time",
+                 shift_tz: str = SHIFT_TZ):
+        self.directory = directory
+        self.machine_col = machine_col
+        self.timestamp_col = timestamp_col
+        self.shift_tz = shift_tz
+        self._lock = threading.RLock()  # the connection is shared; sessions read through cursors
+        self._events_seen: Optional[Dict[str, Tuple[int, int]]] = None
+        self.con = self._connect()
+        self.con.execute("SET TimeZone='UTC'")
+        self._load()
+        self._sync_shifts()
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                return duckdb.connect(os.path.join(self.directory, WAREHOUSE_FILE))
+            except (OSError, duckdb.Error):
+                pass
+        return duckdb.connect(database=":memory:")
+
+    # -- persistence -------------------------------------------------------
+
+    def _load(self) -> None:
+        self.machines: Dict[str, Dict[str, int]] = {}
+        tables = {r[0] for r in self.con.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+        if "warehouse_state" in tables:
+            version = self.con.execute("SELECT MAX(version) FROM warehouse_state").fetchone()[0]
+            if version == WAREHOUSE_VERSION:
+                rows = self.con.execute("SELECT machine, rows, last_ns, checksum FROM warehouse_state").fetchall()
+                self.machines = {m: {"rows": n, "last_ns": last, "checksum": c} for m, n, last, c in rows}
+                return
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop the telemetry rows and watermarks (the file is rebuilt on the next refresh)."""
+        with self._lock:
+            self.con.execute("DROP TABLE IF EXISTS telemetry")
+            self.con.execute("CREATE OR REPLACE TABLE warehouse_state "
+                             "(version INTEGER, machine VARCHAR, rows BIGINT, last_ns BIGINT, checksum UBIGINT)")
+            self.machines = {}
+
+    # -- refresh -----------------------------------------------------------
+
+    def seen(self) -> Dict[str, Tuple[int, int, int]]:
+        return {name: (m["rows"], m["last_ns"], m["checksum"]) for name, m in self.machines.items()}
+
+    def version(self) -> str:
+        """Fingerprint of the stored rows and event tables; changes with every refresh/sync that adds data."""
+        with self._lock:
+            state = (sorted(self.seen().items()), sorted((self._events_seen or {}).items()))
+        return hashlib.sha1(repr(state).encode("utf-8")).hexdigest()[:16]
+
+    def refresh(self, src, tail: bool = False) -> int:
+        """Insert the rows of `src` (TelemetryFrame or SparseSignals) newer than the watermarks.
+
+        Same contract as EventTracker.refresh. Returns the number of rows inserted.
+        """
+        with self._lock:
+            ranges = src.appended_ranges(self.seen(), tail)
+            if ranges is None:
+                self.reset()
+                ranges = src.appended_ranges({})
+            if not ranges:
+                return 0
+            new = src.take_ranges(ranges)
+            try:
+                self._insert(new)
+            except duckdb.Error:
+                # the rows do not fit the stored columns even after widening them: start over. With
+                # `tail` the older rows are not at hand; the empty watermarks make the next refresh
+                # (whose caller then reads everything, see app.store_since) rebuild the table.
+                self.reset()
+                if tail:
+                    raise
+                new = src.take_ranges(src.appended_ranges({}))
+                self._insert(new)
+            self._sync_shifts()
+            return len(new)
+
+    def _insert(self, new) -> None:
+        """update() in one transaction; on failure the file and the watermarks stay as they were."""
+        self.con.execute("BEGIN TRANSACTION")
+        try:
+            self.update(new)
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            self._load()
+            raise
+
+    def update(self, new) -> None:
+        """Insert `new` (rows after each machine's watermark) and advance the watermarks."""
+        machine = _sql_ident(self.machine_col)
+        if isinstance(new, SparseSignals):
+            self.con.register("_new_keys", new.keys.df.assign(row_id=np.arange(len(new))))
+            self.con.register("_new_samples", new.to_long())
+            casts = [f"CAST({_sql_ident(c)} AS {_duckdb_type(d)}) AS {_sql_ident(c)}"
+                     for c, d in zip(new.signals, new.dtypes) if _duckdb_type(d) != "DOUBLE"]
+            casts.append(f"CAST({machine} AS VARCHAR) AS {machine}")
+            select = f"SELECT * REPLACE ({', '.join(casts)}) FROM ({new.events_sql('_new_keys', '_new_samples')})"
+        else:
+            self.con.register("_new_keys", new.df)
+            select = f"SELECT * REPLACE (CAST({machine} AS VARCHAR) AS {machine}) FROM _new_keys"
+        try:
+            exists = self.con.execute(
+                "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'telemetry'").fetchone()[0]
+            if not exists:
+                self.con.execute(f"CREATE TABLE telemetry AS {select}")
+            else:
+                have = {r[0]: r[1] for r in self.con.execute("DESCRIBE telemetry").fetchall()}
+                casts = []
+                for name, dtype, *_ in self.con.execute(f"DESCRIBE {select}").fetchall():
+                    col = _sql_ident(name)
+                    if name not in have:
+                        self.con.execute(f"ALTER TABLE telemetry ADD COLUMN {col} {dtype}")
+                    elif dtype != have[name]:
+                        # a column whose type changed between batches: widen the stored column to the
+                        # type both fit into (e.g. BIGINT -> DOUBLE, DOUBLE -> VARCHAR), cast the batch to it
+                        wide = self._common_type(have[name], dtype)
+                        if wide != have[name]:
+                            self.con.execute(f"ALTER TABLE telemetry ALTER COLUMN {col} SET DATA TYPE {wide}")
+                        casts.append(f"CAST({col} AS {wide}) AS {col}")
+                if casts:
+                    select = f"SELECT * REPLACE ({', '.join(casts)}) FROM ({select})"
+                self.con.execute(f"INSERT INTO telemetry BY NAME {select}")
+        finally:
+            self.con.unregister("_new_keys")
+            if isinstance(new, SparseSignals):
+                self.con.unregister("_new_samples")
+
+        ts = new.time_ns()
+        keys = new.keys if isinstance(new, SparseSignals) else new
+        checksums = new.checksums()
+        for name, (start, end) in keys.offsets.items():
+            m = self.machines.setdefault(str(name), {"rows": 0, "last_ns": 0, "checksum": 0})
+            m["rows"] += end - start
+            m["last_ns"] = int(ts[end - 1])
+            m["checksum"] = (m["checksum"] + checksums[str(name)]) % CHECKSUM_MOD
+        state = pd.DataFrame({"machine": list(self.machines), "rows": [m["rows"] for m in self.machines.values()],
+                              "last_ns": [m["last_ns"] for m in self.machines.values()],
+                              "checksum": np.array([m["checksum"] for m in self.machines.values()], dtype=np.uint64)})
+        self.con.register("_new_state", state)
+        try:
+            self.con.execute("DELETE FROM warehouse_state")
+            self.con.execute(f"INSERT INTO warehouse_state SELECT {WAREHOUSE_VERSION}, machine, rows, last_ns, checksum "
+                             f"FROM _new_state")
+        finally:
+            self.con.unregister("_new_state")
+
+    def _common_type(self, a: str, b: str) -> str:
+        """The type DuckDB unifies two column types to (as in a UNION ALL)."""
+        return self.con.execute(
+            f"SELECT typeof(x) FROM (SELECT NULL::{a} AS x UNION ALL SELECT NULL::{b}) LIMIT 1").fetchone()[0]
+
+    def _sync_shifts(self) -> None:
+        """(Re)write `shift_calendar` for the date range of the stored rows."""
+        with self._lock:
+            exists = self.con.execute(
+                "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'telemetry'").fetchone()[0]
+            t = _sql_ident(self.timestamp_col)
+            lo, hi = self.con.execute(f"SELECT MIN({t}), MAX({t}) FROM telemetry").fetchone() if exists else (None, None)
+            if lo is None:
+                lo = hi = pd.Timestamp.now(tz="UTC")
+            self.con.register("_shifts", shift_calendar(pd.Timestamp(lo), pd.Timestamp(hi), self.shift_tz))
+            try:
+                self.con.execute("""CREATE OR REPLACE TABLE shift_calendar AS
+                    SELECT CAST(shift_id AS INTEGER) AS shift_id, CAST(day AS DATE) AS day, CAST(shift AS VARCHAR) AS shift,
+                           CAST(start AS TIMESTAMPTZ) AS start, CAST("end" AS TIMESTAMPTZ) AS "end"
+                    FROM _shifts""")
+            finally:
+                self.con.unregister("_shifts")
+
+    def sync_events(self, tracker) -> None:
+        """Replace `parts`/`setups` with the tracker's whole-history output when it has moved on."""
+        with self._lock:
+            seen = tracker.seen()
+            if seen == self._events_seen:
+                return
+            machine, ts = self.machine_col, self.timestamp_col
+            parts = tracker.part_marks(machine_col=machine, timestamp_col=ts)
+            setups = tracker.setup_intervals(machine_col=machine)
+            self.con.register("_parts", parts)
+            self.con.register("_setups", setups)
+            m, t = _sql_ident(machine), _sql_ident(ts)
+            try:
+                self.con.execute(f"""CREATE OR REPLACE TABLE parts AS
+                    SELECT CAST({m} AS VARCHAR) AS {m}, CAST({t} AS TIMESTAMPTZ) AS {t},
+                           CAST(cycle_time_s AS DOUBLE) AS cycle_time_s, CAST(source AS TINYINT) AS source
+                    FROM _parts""")
+                self.con.execute(f"""CREATE OR REPLACE TABLE setups AS
+                    SELECT CAST({m} AS VARCHAR) AS {m}, CAST(start AS TIMESTAMPTZ) AS start,
+                           CAST("end" AS TIMESTAMPTZ) AS "end", CAST(setup_s AS DOUBLE) AS setup_s
+                    FROM _setups""")
+            finally:
+                self.con.unregister("_parts")
+                self.con.unregister("_setups")
+            self._events_seen = seen
+
+    # -- per-session access --------------------------------------------------
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Session cursor with the view `events` and the table macros `part_events`/`setup_intervals`.
+
+        All of them cover the full tables. Queries take the selection as
+        parameters (window_params), e.g.
+        `SELECT COUNT(*) FROM part_events(?::VARCHAR[], ?, ?)` or
+        `... FROM events WHERE name IN (SELECT UNNEST(?::VARCHAR[])) AND time >= ? AND time < ?`,
+        so DuckDB pushes the time range down to the zone maps. The macros
+        expand inline; part_events picks the mark source, leaves out the first
+        mark of each machine (no cycle time inside the window) and applies the
+        IQR cycle-time cut over the window, as EventTracker.part_events does.
+        """
+        m, t = _sql_ident(self.machine_col), _sql_ident(self.timestamp_col)
+
+        def where(col: str) -> str:
+            return f"{m} IN (SELECT UNNEST(machines)) AND {col} >= from_ts AND {col} < to_ts"
+
+        with self._lock:
+            cur = self.con.cursor()
+            tables = {r[0] for r in cur.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+        cur.execute("SET TimeZone='UTC'")  # time_bucket and timestamp parameters in UTC
+        if "telemetry" in tables:
+            cur.execute("CREATE TEMP VIEW events AS SELECT * FROM telemetry")
+        else:
+            cur.execute(f"CREATE TEMP VIEW events AS SELECT NULL::VARCHAR AS {m}, NULL::TIMESTAMPTZ AS {t} LIMIT 0")
+        if "parts" in tables:
+            cur.execute(f"""CREATE TEMP MACRO part_events(machines, from_ts, to_ts) AS TABLE
+                WITH marks AS (SELECT *, ROW_NUMBER() OVER (PARTITION BY {m}, source ORDER BY {t}) AS k
+                               FROM parts WHERE {where(t)}),
+                     w AS (SELECT {m}, {t}, cycle_time_s FROM marks
+                           WHERE source = (SELECT MIN(source) FROM marks) AND k > 1 AND cycle_time_s IS NOT NULL),
+                     q AS (SELECT quantile_cont(cycle_time_s, 0.25) AS q1,
+                                  quantile_cont(cycle_time_s, 0.75) AS q3 FROM w)
+                SELECT w.* FROM w, q
+                WHERE cycle_time_s >= GREATEST(0, q1 - 1.5 * (q3 - q1)) AND cycle_time_s <= q3 + 1.5 * (q3 - q1)
+                ORDER BY {m}, {t}""")
+            cur.execute(f"""CREATE TEMP MACRO setup_intervals(machines, from_ts, to_ts) AS TABLE
+                SELECT * FROM setups WHERE {where('start')} ORDER BY {m}, start""")
+        return cur
+
+
+def window_params(machines, from_dt, to_dt) -> list:
+    """Parameters (machine names, from, to) of the window-filtered queries on a warehouse cursor."""
+    return [[str(m) for m in machines], pd.Timestamp(from_dt).to_pydatetime(), pd.Timestamp(to_dt).to_pydatetime()]
+
+
+class EventsWindow:
+    """Machine/time window of the `events` view of a warehouse cursor, read like a TelemetryFrame window.
+
+    Streaming mode never holds the window in pandas: the row count and the
+    columns are queries, head() fetches only the preview rows, signal_frame()
+    only the charted columns and batches() hands the rows out in bounded
+    batches (e.g. for SignalCatalog.of_batches). The cursor must not run other
+    queries while batches() is being consumed.
+    """
+
+    def __init__(self, cur: duckdb.DuckDBPyConnection, machines, from_dt, to_dt, machine_col: str = "name",
+                 timestamp_col: str = "time"):
+        self.cur = cur
+        self.machines = [str(m) for m in machines]
+        self.from_dt, self.to_dt = from_dt, to_dt
+        self.machine_col = machine_col
+        self.timestamp_col = timestamp_col
+        self._len: Optional[int] = None
+        self._head0: Optional[pd.DataFrame] = None
+        tables = {r[0] for r in cur.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+        # the rows of `events`, read from its table so that rows sharing a (machine, time) key keep the
+        # order they were inserted in (rowid), like the in-memory windows
+        self._table, self._ties = ("telemetry", ", rowid") if "telemetry" in tables else ("events", "")
+
+    def _query(self, select: str, suffix: str = "") -> duckdb.DuckDBPyConnection:
+        m, t = _sql_ident(self.machine_col), _sql_ident(self.timestamp_col)
+        return self.cur.execute(f"SELECT {select} FROM {self._table} WHERE {m} IN (SELECT UNNEST(?::VARCHAR[])) "
+                                f"AND {t} >= ? AND {t} < ? {suffix}",
+                                window_params(self.machines, self.from_dt, self.to_dt))
+
+    def _frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.assign(**{self.machine_col: as_machine_category(df[self.machine_col])})
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = int(self._query("COUNT(*)").fetchone()[0])
+        return self._len
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.head(0).columns)
+
+    def head(self, n: int) -> pd.DataFrame:
+        """The first `n` rows in [machine, time] order; DuckDB stops after them."""
+        if n == 0 and self._head0 is not None:
+            return self._head0
+        m, t = _sql_ident(self.machine_col), _sql_ident(self.timestamp_col)
+        df = self._frame(self._query("*", f"ORDER BY {m}, {t}{self._ties} LIMIT {int(n)}").df())
+        if n == 0:
+            self._head0 = df
+        return df
+
+    def signal_columns(self) -> List[str]:
+        """Numeric and boolean columns other than machine and time."""
+        return TelemetryFrame(self.head(0), self.machine_col, self.timestamp_col, assume_sorted=True).signal_columns()
+
+    def window(self, machines, from_dt, to_dt) -> "EventsWindow":
+        return EventsWindow(self.cur, machines, from_dt, to_dt, self.machine_col, self.timestamp_col)
+
+    def signal_frame(self, cols: List[str]) -> pd.DataFrame:
+        """[time] + cols in global time order, keeping rows where any of `cols` is set (filtered in DuckDB)."""
+        have = set(self.columns)
+        cols = [c for c in cols if c in have]
+        m, t = _sql_ident(self.machine_col), _sql_ident(self.timestamp_col)
+        if not cols:
+            return self._query(t, "LIMIT 0").df()
+        names = ", ".join(map(_sql_ident, cols))
+        any_set = " OR ".join(f"{_sql_ident(c)} IS NOT NULL" for c in cols)
+        return self._query(f"{t}, {names}", f"AND ({any_set}) ORDER BY {t}, {m}{self._ties}").df()
+
+    def batches(self, batch_rows: int = STORE_BATCH_ROWS) -> Iterator[TelemetryFrame]:
+        """The window's rows as TelemetryFrames of about `batch_rows` rows, in [machine, time] order."""
+        m, t = _sql_ident(self.machine_col), _sql_ident(self.timestamp_col)
+        result = self._query("*", f"ORDER BY {m}, {t}{self._ties}")
+        for batch in iter_store_batches(result, batch_rows, self.timestamp_col, self.machine_col):
+            yield TelemetryFrame(self._frame(batch), self.machine_col, self.timestamp_col, assume_sorted=True)
+
+
+# kept verbatim: string literals, quoted identifiers, line comments with the newline that ends them, block comments
+_SQL_VERBATIM = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*(?:\n|$)|/\*.*?\*/)""", re.S)
+
+
+def normalize_sql(sql: str) -> str:
+    """Query text with whitespace runs collapsed outside literals, quoted names and comments, no trailing semicolon."""
+    parts = _SQL_VERBATIM.split(sql)
+    parts[::2] = [re.sub(r"\s+", " ", p) for p in parts[::2]]
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class QueryCache:
+    """LRU cache of query results, bounded by their in-memory size and shared by all sessions.
+
+    Keys are the normalized SQL, its parameters and a caller fingerprint
+    (warehouse version + selected window), so a new append or another
+    window never reuses a stale result. Hits return a copy.
+    """
+
+    def __init__(self, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(sql: str, params: Optional[list], fingerprint: Hashable) -> str:
+        return hashlib.sha1(repr((normalize_sql(sql), params, fingerprint)).encode("utf-8")).hexdigest()
+
+    def fetch(self, con: duckdb.DuckDBPyConnection, sql: str, params: Optional[list] = None,
+              fingerprint: Hashable = None) -> pd.DataFrame:
+        """Result of `con.execute(sql, params).df()`, from the cache when the same query ran on the same data."""
+        key = self.key(sql, params, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0].copy()
+            self.misses += 1
+        result = con.execute(sql, params).df() if params is not None else con.execute(sql).df()
+        size = int(result.memory_usage(index=True, deep=True).sum())
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (result.copy(), size)
+                    self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, dropped) = self._entries.popitem(last=False)
+                    self.bytes -= dropped
+                    self.evictions += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized bucket mode (telemetry.bucket_mode)
+
+resample_frame used to take the mode of low-cardinality signals with
+series.resample(rule).agg(lambda x: x.mode()...), one Python call per bucket.
+Times bucket_mode (value codes + one bincount + argmax) against that lambda
+at 10 s buckets over a month of 1 Hz data. Equivalence for every
+aggregation rule is checked by tests/test_telemetry.py.
+
+    python tests/bucket_mode_benchmark.py
+    python tests/bucket_mode_benchmark.py --days 7
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from synthetic import discrete_signal
+from reference import legacy_mode
+from telemetry import bucket_mode
+
+
+def vectorized_mode(series: pd.Series, rule: str) -> pd.Series:
+    """bucket_mode as resample_frame calls it."""
+    labels = series.resample(rule).size().index
+    bins = series.groupby(pd.Grouper(freq=rule)).ngroup().to_numpy()
+    return pd.Series(bucket_mode(series.to_numpy(np.float64, na_value=np.nan), bins, len(labels)), index=labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30, help="length of the 1 Hz timing series")
+    args = parser.parse_args()
+
+    print(f"⏱️  10s buckets, {args.days} days at 1 Hz")
+    s = discrete_signal(args.days * 86400, 2, gaps=False)
+    t0 = time.perf_counter()
+    vectorized_mode(s, "10s")
+    t_new = time.perf_counter() - t0
+    print(f"  bucket_mode:       {t_new:.3f}s")
+    t0 = time.perf_counter()
+    legacy_mode(s, "10s")
+    t_old = time.perf_counter() - t0
+    print(f"  lambda per bucket: {t_old:.2f}s ({t_old / t_new:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
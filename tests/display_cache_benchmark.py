@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the cached st.dataframe adapter (display.DisplayCache)
+
+The parts/setups samples, the shift KPI tables and the raw telemetry preview
+go through one cache that converts each table to Arrow once per key (table,
+window, dataset version) and infers the schema once per column layout.
+Times one rerun's tables: the per-column cast loops the app ran before,
+a cache miss and a cache hit. Values, hits, schema reuse and the size
+bound are checked by tests/test_display.py.
+
+    python tests/display_cache_benchmark.py
+    python tests/display_cache_benchmark.py --rows 1000000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from synthetic import EXEC_PROG_COMPLETED, event_telemetry, rerun_tables, signal_telemetry, window_bounds
+from display import DisplayCache
+from events import EventTracker
+from telemetry import TelemetryFrame
+
+
+def legacy_display(df: pd.DataFrame) -> pd.DataFrame:
+    """The copy-and-cast loop the sidebar samples and the raw preview ran on every rerun."""
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype == 'object' or isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(str)
+        elif pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif pd.api.types.is_numeric_dtype(out[col]):
+            out[col] = pd.to_numeric(out[col], errors='coerce').astype('float64')
+    return pa.Table.from_pandas(out, preserve_index=not isinstance(out.index, pd.RangeIndex))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows of the timing dataset")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 90 signal columns: tables of one rerun (parts/setups samples, shift KPIs, raw preview)")
+    df = signal_telemetry(args.rows, 90, 5)
+    df[EXEC_PROG_COMPLETED] = event_telemetry(args.rows, 5, "exec")[EXEC_PROG_COMPLETED]
+    tf = TelemetryFrame(df, assume_sorted=True)
+    tracker = EventTracker()
+    tracker.refresh(tf)
+    machines = list(df["name"].cat.categories)
+    from_dt, to_dt = window_bounds(df)
+    tables = rerun_tables(tf, tracker, machines, from_dt, to_dt)
+    cache = DisplayCache()
+    for label, fn in (("cast loops (before)", lambda: [legacy_display(f) for _, f in tables]),
+                      ("cache miss", lambda: [cache.table((n, "miss", time.perf_counter()), f) for n, f in tables]),
+                      ("cache hit", lambda: [cache.table((n, "hit"), f) for n, f in tables])):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(20):
+            fn()
+        print(f"  {label:<20} {(time.perf_counter() - t0) / 20 * 1000:7.2f} ms per rerun")
+
+
+if __name__ == "__main__":
+    main()
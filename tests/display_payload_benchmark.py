@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Payload/render benchmark for native chart and table values (display.py)
+
+The time series chart used to send '%Y-%m-%d %H:%M:%S' strings as its x axis
+and the raw preview formatted timestamps and cast every column before
+st.dataframe. Now the x axis is epoch milliseconds on a date axis
+(display.plot_time) and the preview keeps native dtypes (display.arrow_safe).
+Measures the Plotly payload (bytes of the JSON Streamlit sends) and build + serialization time
+of the raw time series figure (all signals, both views), plus the Arrow
+bytes of the preview, before and after, on the default dataset
+(data_and_eda/cnc_daten.csv) and on synthetic telemetry. That the values
+stay the same is checked by tests/test_display.py.
+
+    python tests/display_payload_benchmark.py
+    python tests/display_payload_benchmark.py --rows 1000000
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+from synthetic import signal_telemetry
+from display import arrow_safe, plot_time
+from ingest import read_table, to_utc_datetime
+from telemetry import TelemetryFrame
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_and_eda", "cnc_daten.csv")
+
+
+def legacy_preview(df: pd.DataFrame) -> pd.DataFrame:
+    """The raw preview's per-column cast loop before display.arrow_safe."""
+    display_df = df.head(100).copy()
+    for col in display_df.columns:
+        if col == "name":
+            display_df[col] = display_df[col].astype(str)
+        elif col == "time":
+            display_df[col] = display_df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif display_df[col].dtype == 'object':
+            display_df[col] = display_df[col].astype(str)
+        elif pd.api.types.is_numeric_dtype(display_df[col]):
+            display_df[col] = pd.to_numeric(display_df[col], errors='coerce').astype('float64')
+    return display_df
+
+
+def figures(data: pd.DataFrame, native: bool):
+    """Both figures of timeseries_chart (multi-axis + normalized), x as strings or epoch ms."""
+    if native:
+        x = plot_time(data.index)
+    else:
+        x = data.reset_index()["time"].dt.strftime('%Y-%m-%d %H:%M:%S')
+    xaxis = {"title": "Time", "type": "date"} if native else {"title": "Time"}
+    fig, fig_norm = go.Figure(), go.Figure()
+    for i, col in enumerate(data.columns):
+        values = data[col].reset_index(drop=True).astype(float)
+        lo, hi = values.min(), values.max()
+        fig.add_trace(go.Scatter(x=x, y=values, mode="lines", yaxis=["y", "y2", "y3", "y4"][i % 4]))
+        fig_norm.add_trace(go.Scatter(x=x, y=(values - lo) / (hi - lo) if hi > lo else values * 0 + 0.5, mode="lines"))
+    fig.update_layout(xaxis=xaxis)
+    fig_norm.update_layout(xaxis=xaxis)
+    return fig, fig_norm
+
+
+def payload(data: pd.DataFrame, native: bool):
+    t0 = time.perf_counter()
+    specs = [pio.to_json(f, validate=False) for f in figures(data, native)]  # what st.plotly_chart sends
+    return time.perf_counter() - t0, sum(len(s) for s in specs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows of the synthetic timing dataset")
+    args = parser.parse_args()
+
+    df, _ = read_table(DEFAULT_DATA, "cnc_daten.csv")
+    default = TelemetryFrame(df.assign(time=to_utc_datetime(df["time"])).dropna(subset=["time"])).df  # as app.prepare_frame
+    for label, tf in (("default dataset", TelemetryFrame(default, assume_sorted=True)),
+                      (f"{args.rows:,} synthetic rows x 10 signals", TelemetryFrame(signal_telemetry(args.rows, 10, 5), assume_sorted=True))):
+        data = tf.signal_frame(tf.signal_columns()).set_index("time")
+        print(f"⏱️  {label}: raw time series chart, {len(data):,} points x {len(data.columns)} signals")
+        for name, native in (("strings", False), ("epoch ms", True)):
+            seconds, size = payload(data, native)
+            print(f"  x as {name:<9} figures + JSON {seconds:6.2f}s, {size / 1e6:7.2f} MB")
+    print("\n⏱️  default dataset: raw telemetry preview (100 rows)")
+    for name, fn in (("cast loop", legacy_preview), ("arrow_safe", lambda d: arrow_safe(d.head(100)))):
+        t0 = time.perf_counter()
+        out = fn(default)
+        size = len(convert_anything_to_arrow_bytes(out))
+        print(f"  {name:<10} {(time.perf_counter() - t0) * 1000:6.1f} ms incl. Arrow, {size / 1e3:6.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the DuckDB resampling query (telemetry.resample_sql)
+
+Times resample_sql on an `events` view built the way the app builds it
+against resample_frame's pandas path, with the Python heap peak, on a large
+window. Equivalence with pandas resampling for every aggregation rule is
+checked by tests/test_telemetry.py.
+
+    python tests/duckdb_resample_benchmark.py
+    python tests/duckdb_resample_benchmark.py --rows 5000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from synthetic import duckdb_events, signal_telemetry, window_bounds
+from telemetry import TelemetryFrame, bucket_mode, resample_sql
+
+
+def frame_resample(src, cols, rule, mode_cols) -> pd.DataFrame:
+    """resample_frame's pandas path (mean, vectorized bucket mode) for the timing comparison."""
+    d = src.signal_frame(cols).set_index("time")
+    labels = d.resample(rule).size().index
+    bins = d.groupby(pd.Grouper(freq=rule)).ngroup().to_numpy()
+    return pd.DataFrame({
+        c: bucket_mode(d[c].to_numpy(np.float64, na_value=np.nan), bins, len(labels)) if c in mode_cols
+        else d[c].resample(rule).mean().to_numpy()
+        for c in cols
+    }, index=labels)
+
+
+def duckdb_resample(con, cols, rule, mode_levels, machines, from_dt, to_dt) -> pd.DataFrame:
+    params = [[str(m) for m in machines], from_dt.to_pydatetime(), to_dt.to_pydatetime()]
+    return con.execute(resample_sql(cols, rule, mode_levels), params).df().set_index("bucket")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="rows of the timing window")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 30 signal columns, 5 machines, 10s buckets, 8 signals (2 by mode)")
+    df = signal_telemetry(args.rows, 30, 5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    cols = [c for c in tf.signal_columns() if "BOOL" in c][:2] + [c for c in tf.signal_columns() if "REAL" in c][:6]
+    machines = list(df["name"].cat.categories)
+    from_dt, to_dt = window_bounds(df)
+    con = duckdb_events(tf)
+    threads = con.execute("SELECT current_setting('threads')").fetchone()[0]
+    print(f"  (DuckDB threads: {threads})")
+    for label, fn in (
+        ("pandas resample", lambda: frame_resample(tf, cols, "10s", cols[:2])),
+        ("DuckDB time_bucket", lambda: duckdb_resample(con, cols, "10s", {c: [0.0, 1.0] for c in cols[:2]}, machines, from_dt, to_dt)),
+    ):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {label:<19} {elapsed:.2f}s, Python heap peak {peak / 2**20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
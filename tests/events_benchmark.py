@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized part-completion detector (events.py)
+
+Times events.detect_part_completed against the previous per-machine loop
+implementation (tests/reference.py) on synthetic telemetry, up to 10M rows /
+50 machines. Equivalence is checked by tests/test_events.py.
+
+    python tests/events_benchmark.py               # full run (up to 10M rows)
+    python tests/events_benchmark.py --max-rows 1000000
+"""
+
+import argparse
+import time
+
+from synthetic import event_telemetry
+from reference import legacy_detect_part_completed
+from events import detect_part_completed
+from telemetry import TelemetryFrame
+
+LEGACY_MAX_ROWS = 1_000_000  # the loop version takes minutes beyond this
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    print("⏱️  Scaling (scenario 'cycle', the default path for the CNC exports)")
+    print(f"  {'rows':>10} {'machines':>8} {'vectorized':>11} {'loops':>9}")
+    for n_rows in (100_000, 1_000_000, 10_000_000):
+        if n_rows > args.max_rows:
+            break
+        for n_machines in (1, 10, 50):
+            df = event_telemetry(n_rows, n_machines, "cycle")
+            tf = TelemetryFrame(df, assume_sorted=True)
+            _, fast = timed(detect_part_completed, tf)
+            slow = "-"
+            if n_rows <= LEGACY_MAX_ROWS:
+                _, t = timed(legacy_detect_part_completed, df)
+                slow = f"{t:8.2f}s"
+            print(f"  {n_rows:>10,} {n_machines:>8} {fast:10.2f}s {slow:>9}")
+
+
+if __name__ == "__main__":
+    main()
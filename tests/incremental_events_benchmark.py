@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the incremental event detector (events.EventTracker)
+
+Times a refresh that appends a few rows to a large history against the
+first (full) refresh. That the incremental result equals one full
+detection is checked by tests/test_events.py.
+
+    python tests/incremental_events_benchmark.py
+    python tests/incremental_events_benchmark.py --rows 10000000
+"""
+
+import argparse
+import time
+
+from synthetic import event_telemetry
+from events import EventTracker
+from telemetry import TelemetryFrame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000, help="history size for the timing run")
+    args = parser.parse_args()
+
+    print(f"⏱️  Refresh cost, {args.rows:,} rows of history")
+    df = event_telemetry(args.rows, 10, "exec")
+    tracker = EventTracker()
+    history = df.groupby("name", observed=True).head(-100).reset_index(drop=True)  # last 100 rows per machine arrive later
+    t0 = time.perf_counter()
+    tracker.refresh(TelemetryFrame(history, assume_sorted=True))
+    full = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    n = tracker.refresh(TelemetryFrame(df, assume_sorted=True))
+    print(f"  first refresh (full history): {full:.2f}s")
+    print(f"  next refresh ({n:,} new rows): {time.perf_counter() - t0:.3f}s")
+    t0 = time.perf_counter()
+    tracker.part_events()
+    print(f"  part_events() read: {time.perf_counter() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
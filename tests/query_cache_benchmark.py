@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the SQL result cache (warehouse.QueryCache)
+
+Runs the preset queries through the cache on a warehouse cursor, as app.py
+does, and times a miss against a hit. Hits, misses, copies and the LRU
+bound are checked by tests/test_warehouse.py.
+
+    python tests/query_cache_benchmark.py
+    python tests/query_cache_benchmark.py --rows 5000000
+"""
+
+import argparse
+import tempfile
+import time
+
+from synthetic import event_telemetry, window_bounds
+from events import EventTracker
+from telemetry import TelemetryFrame
+from warehouse import AnalyticsWarehouse, QueryCache, window_params
+
+PIECES_SQL = """
+            SELECT name, COUNT(*) AS pieces
+            FROM part_events(?::VARCHAR[], ?, ?)
+            GROUP BY name
+            ORDER BY pieces DESC
+            """
+SIGNAL_SQL = """SELECT name, COUNT(*) AS n, AVG(CAST(exec_program_completed_BOOL AS DOUBLE)) AS rate FROM events
+WHERE name IN (SELECT UNNEST(?::VARCHAR[])) AND time >= ? AND time < ? GROUP BY name ORDER BY name"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="rows of the timing dataset")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows, 5 machines")
+    df = event_telemetry(args.rows, 5, "exec")
+    machines = list(df["name"].cat.categories)
+    with tempfile.TemporaryDirectory() as state_dir:
+        warehouse, tracker, cache = AnalyticsWarehouse(state_dir), EventTracker(), QueryCache()
+        tf = TelemetryFrame(df, assume_sorted=True)
+        tracker.refresh(tf)
+        warehouse.refresh(tf)
+        warehouse.sync_events(tracker)
+        con, params, fingerprint = warehouse.cursor(), window_params(machines, *window_bounds(df)), warehouse.version()
+        for label, sql in (("part_events", PIECES_SQL), ("events", SIGNAL_SQL)):
+            t0 = time.perf_counter()
+            cache.fetch(con, sql, params, fingerprint)
+            miss = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            for _ in range(100):
+                cache.fetch(con, sql, params, fingerprint)
+            hit = (time.perf_counter() - t0) / 100
+            print(f"  {label:<12} miss {miss * 1000:7.1f} ms, hit {hit * 1000:.2f} ms")
+        print(f"  {cache.stats()}")
+        warehouse.con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the raw time series downsampling (telemetry.downsample_frame)
+
+The raw view reduces every selected signal to the min and max sample of each
+pixel column (DOWNSAMPLE_WIDTH equal time bins). Times the downsampling and
+the Plotly figure + JSON payload (string timestamps, as timeseries_chart
+builds it) against the raw points of the first 200,000 rows. That every
+signal keeps its per-bin extremes is checked by tests/test_telemetry.py.
+
+    python tests/raw_downsample_benchmark.py
+    python tests/raw_downsample_benchmark.py --rows 5000000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from synthetic import signal_telemetry
+from telemetry import TelemetryFrame, downsample_frame
+
+
+def figure(d: pd.DataFrame) -> go.Figure:
+    x = d.index.strftime("%Y-%m-%d %H:%M:%S")
+    return go.Figure([go.Scatter(x=x, y=d[col], mode="lines", connectgaps=False) for col in d.columns])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="rows of the timing dataset")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 10 signal columns, 5 machines")
+    df = signal_telemetry(args.rows, 10, 5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    t0 = time.perf_counter()
+    full = tf.signal_frame(tf.signal_columns()).set_index("time")  # what resample_frame(src, cols, "raw") hands on
+    t1 = time.perf_counter()
+    small = downsample_frame(full)
+    t2 = time.perf_counter()
+    print(f"  raw frame {t1 - t0:.2f}s, min/max per pixel column {t2 - t1:.3f}s: {len(full):,} -> {len(small):,} rows")
+    for label, d in (("raw, first 200k", full.iloc[:200_000]), ("downsampled", small)):
+        t0 = time.perf_counter()
+        payload = figure(d).to_json()
+        print(f"  {label:<15} figure + JSON {time.perf_counter() - t0:6.2f}s, {len(payload) / 1e6:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+The implementations the app used before each rewrite, as references
+
+The tests check the current code against them on synthetic telemetry; the
+benchmarks time them as the "before" case.
+"""
+
+import numpy as np
+import pandas as pd
+
+from synthetic import MACHINE_COL, TIMESTAMP_COL
+from events import iqr_bounds, EXEC_STRING, EXEC_PROG_COMPLETED, MODE_STRING, PGM_STRING
+from shifts import SHIFT_TZ
+from telemetry import signal_stats
+
+
+def legacy_detect_part_completed(df: pd.DataFrame) -> pd.DataFrame:
+    """Return rows [name, time, cycle_time_s] for completed units."""
+    tmp = df.copy()
+    # normalize types
+    if EXEC_PROG_COMPLETED in tmp.columns:
+        tmp[EXEC_PROG_COMPLETED] = tmp[EXEC_PROG_COMPLETED].astype(str).str.lower().isin(["1","true","t","yes","y"])
+    if EXEC_STRING in tmp.columns:
+        tmp[EXEC_STRING] = tmp[EXEC_STRING].astype(str)
+    if PGM_STRING in tmp.columns:
+        tmp[PGM_STRING] = tmp[PGM_STRING].astype(str)
+
+    tmp = tmp.sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
+
+    marks = []
+
+    # (1) Rising edge of program_completed
+    if EXEC_PROG_COMPLETED in tmp.columns:
+        tmp["_epc"] = tmp[EXEC_PROG_COMPLETED].fillna(False)
+        tmp["_epc_prev"] = tmp.groupby(MACHINE_COL)["_epc"].shift(fill_value=False)
+        rising_idx = tmp.index[(tmp["_epc"]) & (~tmp["_epc_prev"])].tolist()
+        for i in rising_idx:
+            marks.append((tmp.loc[i, MACHINE_COL], tmp.loc[i, TIMESTAMP_COL]))
+
+    # (2) Textual cues in exec string
+    if EXEC_STRING in tmp.columns:
+        cue = tmp[EXEC_STRING].str.upper().str.contains("COMPLETED|COMPLETE|END|FINISH", regex=True, na=False)
+        for i, row in tmp.loc[cue, [MACHINE_COL, TIMESTAMP_COL]].iterrows():
+            marks.append((row[MACHINE_COL], row[TIMESTAMP_COL]))
+
+    # (3) For CNC data: use changes in cycle time values as indicators
+    if not marks:
+        # Look for cycle time columns in CNC data
+        cycle_cols = [col for col in tmp.columns if 'cycleTime' in col or 'CycleTime' in col]
+        if cycle_cols:
+            # Use first cycle time column
+            cycle_col = cycle_cols[0]
+            tmp[cycle_col] = pd.to_numeric(tmp[cycle_col], errors='coerce')
+            # Detect significant changes in cycle time as completion events
+            for machine in tmp[MACHINE_COL].unique():
+                machine_data = tmp[tmp[MACHINE_COL] == machine].copy()
+                machine_data = machine_data.dropna(subset=[cycle_col])
+                if len(machine_data) > 1:
+                    # Find rows where cycle time changes significantly
+                    machine_data['cycle_diff'] = machine_data[cycle_col].diff().abs()
+                    if not machine_data['cycle_diff'].isna().all():
+                        threshold = machine_data['cycle_diff'].quantile(0.8)  # Top 20% of changes
+                        significant_changes = machine_data[machine_data['cycle_diff'] > threshold]
+                        for _, row in significant_changes.iterrows():
+                            marks.append((row[MACHINE_COL], row[TIMESTAMP_COL]))
+
+    # (4) Fallback: program change
+    if not marks and PGM_STRING in tmp.columns:
+        tmp["_pgm_change"] = tmp.groupby(MACHINE_COL)[PGM_STRING].transform(lambda s: s.ne(s.shift()))
+        idx = tmp.index[tmp["_pgm_change"]].tolist()
+        for i in idx:
+            marks.append((tmp.loc[i, MACHINE_COL], tmp.loc[i, TIMESTAMP_COL]))
+
+    # (5) Ultimate fallback: create artificial events based on time intervals
+    if not marks:
+        for machine in tmp[MACHINE_COL].unique():
+            machine_data = tmp[tmp[MACHINE_COL] == machine].copy()
+            if len(machine_data) > 10:  # Only if we have enough data
+                # Create events every ~100 rows (simulating regular production)
+                step = max(10, len(machine_data) // 20)  # At least 10, but roughly 20 events total
+                for i in range(step, len(machine_data), step):
+                    marks.append((machine, machine_data.iloc[i][TIMESTAMP_COL]))
+
+    if not marks:
+        return pd.DataFrame(columns=[MACHINE_COL, TIMESTAMP_COL, "cycle_time_s"])
+
+    parts = pd.DataFrame(marks, columns=[MACHINE_COL, TIMESTAMP_COL]).drop_duplicates().dropna()
+    parts = parts.sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
+    parts["cycle_time_s"] = parts.groupby(MACHINE_COL)[TIMESTAMP_COL].diff().dt.total_seconds()
+    parts = parts.dropna(subset=["cycle_time_s"])
+    if not parts.empty:
+        low, high = iqr_bounds(parts["cycle_time_s"])
+        parts = parts[(parts["cycle_time_s"] >= max(0, low)) & (parts["cycle_time_s"] <= high)]
+    return parts
+
+
+def legacy_detect_setup_intervals(df: pd.DataFrame) -> pd.DataFrame:
+    """The detector as it was before the run-length rewrite."""
+    d = df.copy().sort_values([MACHINE_COL, TIMESTAMP_COL]).reset_index(drop=True)
+    out = []
+    explicit_done = False
+    if MODE_STRING in d.columns:
+        mode = d[MODE_STRING].astype(str).str.upper()
+        d["_is_setup"] = mode.str.contains("SETUP|RÜST|RUEST|RUEST", regex=True, na=False)
+        for mid, g in d.groupby(MACHINE_COL, observed=True):
+            g = g[[TIMESTAMP_COL, "_is_setup"]].reset_index(drop=True)
+            block_start = None
+            for i, row in g.iterrows():
+                if row["_is_setup"] and block_start is None:
+                    block_start = row[TIMESTAMP_COL]
+                is_last = (i == len(g) - 1)
+                if (block_start is not None) and (not row["_is_setup"] or is_last):
+                    end_time = g.iloc[i][TIMESTAMP_COL]
+                    setup_s = (end_time - block_start).total_seconds()
+                    if setup_s > 0:
+                        out.append({MACHINE_COL: mid, "start": block_start, "end": end_time, "setup_s": setup_s})
+                    block_start = None
+        if out:
+            explicit_done = True
+    if not explicit_done:
+        THRESHOLD_S = 5 * 60
+        if PGM_STRING in d.columns:
+            d["_pgm_change"] = d.groupby(MACHINE_COL, observed=True)[PGM_STRING].transform(lambda s: s.ne(s.shift()))
+        else:
+            d["_pgm_change"] = False
+        for mid, g in d.groupby(MACHINE_COL, observed=True):
+            g = g[[TIMESTAMP_COL, "_pgm_change"]].reset_index(drop=True)
+            for i in range(1, len(g)):
+                prev_t = g.loc[i-1, TIMESTAMP_COL]
+                curr_t = g.loc[i, TIMESTAMP_COL]
+                gap = (curr_t - prev_t).total_seconds()
+                is_change = bool(g.loc[i, "_pgm_change"])
+                if is_change and gap >= THRESHOLD_S:
+                    out.append({MACHINE_COL: mid, "start": prev_t, "end": curr_t, "setup_s": gap})
+    return pd.DataFrame(out, columns=[MACHINE_COL, "start", "end", "setup_s"]) if out else pd.DataFrame(columns=[MACHINE_COL, "start", "end", "setup_s"])
+
+
+def legacy_scores(df: pd.DataFrame, candidates) -> dict:
+    """The scorer as it was before the one-pass rewrite (one copy + sort per column)."""
+    eps = 1e-9
+    scores = {}
+    for col in candidates:
+        g = df[[MACHINE_COL, TIMESTAMP_COL, col]].dropna().sort_values([MACHINE_COL, TIMESTAMP_COL])
+        if g.empty or g[col].nunique() <= 1:
+            scores[col] = 0
+            continue
+        if g[col].dtype == bool:
+            series = g[col].astype(int)
+            changes = (series.groupby(g[MACHINE_COL], observed=True).diff().fillna(0).abs() > 0).sum()
+        else:
+            series = pd.to_numeric(g[col], errors="coerce")
+            changes = (series.groupby(g[MACHINE_COL], observed=True).diff().abs() > eps).sum()
+            variance_bonus = series.var()
+            if variance_bonus > 0:
+                changes += min(10, int(variance_bonus / 1000))
+        scores[col] = int(changes)
+    return scores
+
+
+def one_pass_scores(src, candidates) -> dict:
+    """app.dynamic_scores on top of telemetry.signal_stats (app.py runs Streamlit on import)."""
+    stats = signal_stats(src, candidates)
+    bonus = np.where(~stats["is_bool"] & (stats["variance"] > 0), np.minimum(10, stats["variance"].fillna(0) // 1000), 0)
+    score = np.where(stats["distinct"] > 1, stats["changes"] + bonus, 0)
+    return dict(zip(candidates, score.astype(int).tolist()))
+
+
+def legacy_mode(series: pd.Series, rule: str) -> pd.Series:
+    """The per-bucket lambda resample_frame used before."""
+    return series.resample(rule).agg(lambda x: x.mode().iloc[0] if len(x.mode()) > 0 else x.iloc[0] if len(x) > 0 else 0)
+
+
+def legacy_assign_shift(ts: pd.Series, tz: str = SHIFT_TZ) -> pd.Series:
+    """The pandas shift mapping of the preset (06-14, 14-22, 22-06 by local hour)."""
+    h = ts.dt.tz_convert(tz).dt.hour
+    shift = pd.Series(index=ts.index, dtype="object")
+    shift[(h >= 6) & (h < 14)] = "06-14"
+    shift[(h >= 14) & (h < 22)] = "14-22"
+    shift[(h >= 22) | (h < 6)] = "22-06"
+    return shift.astype(str)
+
+
+def legacy_kpis(parts: pd.DataFrame, setups: pd.DataFrame, by_day: bool = False) -> pd.DataFrame:
+    p, s = parts.copy(), setups.copy()
+    p["shift"], s["shift"] = legacy_assign_shift(p["time"]), legacy_assign_shift(s["start"])
+    keys = ["shift"]
+    if by_day:  # a night shift belongs to the day it starts
+        p["day"] = (p["time"].dt.tz_convert(SHIFT_TZ).dt.tz_localize(None) - pd.Timedelta(hours=6)).dt.date
+        s["day"] = (s["start"].dt.tz_convert(SHIFT_TZ).dt.tz_localize(None) - pd.Timedelta(hours=6)).dt.date
+        keys = ["day", "shift"]
+    res = pd.concat([
+        p.groupby(keys).size().rename("pieces"),
+        p.groupby(keys)["cycle_time_s"].mean().rename("avg_ct_s"),
+        (s.groupby(keys)["setup_s"].sum() / 60.0).rename("setup_min"),
+    ], axis=1)
+    return res.fillna({"pieces": 0, "setup_min": 0.0})
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the multi-resolution rollups (rollups.RollupPyramid)
+
+Times the build over a large history, an append of a few rows and lookups
+at 10 s and 1 h. That lookups equal pandas resampling and that an appended
+pyramid equals a one-shot build is checked by tests/test_rollups.py.
+
+    python tests/rollup_pyramid_benchmark.py
+    python tests/rollup_pyramid_benchmark.py --rows 2000000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from synthetic import signal_telemetry
+from rollups import RollupPyramid
+from telemetry import TelemetryFrame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="history size for the timing run")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 90 signal columns, 10 machines")
+    df = signal_telemetry(args.rows, 90, 10)
+    history = df.groupby("name", observed=True).head(-100).reset_index(drop=True)
+    pyramid = RollupPyramid()
+    t0 = time.perf_counter()
+    pyramid.refresh(TelemetryFrame(history, assume_sorted=True))
+    print(f"  build: {time.perf_counter() - t0:.2f}s")
+    t0 = time.perf_counter()
+    n = pyramid.refresh(TelemetryFrame(df, assume_sorted=True))
+    print(f"  append {n:,} rows: {time.perf_counter() - t0:.3f}s")
+    cols = [c for c in df.columns if c.startswith("/")][:8]
+    lo, hi = df["time"].min(), df["time"].max() + pd.Timedelta(seconds=1)
+    for rule in ("10s", "1h"):
+        t0 = time.perf_counter()
+        pyramid.lookup(cols, rule, list(df["name"].cat.categories), lo, hi, cols[:1])
+        print(f"  lookup {rule}, {len(cols)} signals: {time.perf_counter() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the run-length setup interval detector (events.py)
+
+Times events.detect_setup_intervals on millions of rows per machine, with
+the previous row-by-row implementation (tests/reference.py) on a slice for
+comparison. Equivalence is checked by tests/test_events.py.
+
+    python tests/setup_intervals_benchmark.py
+    python tests/setup_intervals_benchmark.py --rows 5000000
+"""
+
+import argparse
+import time
+
+from synthetic import event_telemetry
+from reference import legacy_detect_setup_intervals
+from events import detect_setup_intervals
+from telemetry import TelemetryFrame
+
+LEGACY_ROWS = 100_000  # the row-by-row version takes minutes beyond this
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3_000_000, help="rows per machine for the timing run")
+    args = parser.parse_args()
+
+    print(f"⏱️  Timing, {args.rows:,} rows per machine")
+    for scenario in ("mode", "pgm"):
+        for n_machines in (1, 4):
+            df = event_telemetry(args.rows * n_machines, n_machines, scenario)
+            tf = TelemetryFrame(df, assume_sorted=True)
+            t0 = time.perf_counter()
+            out = detect_setup_intervals(tf)
+            print(f"  {scenario:<5} machines={n_machines}: {time.perf_counter() - t0:.2f}s ({len(out):,} intervals)")
+            t0 = time.perf_counter()
+            legacy_detect_setup_intervals(df.head(LEGACY_ROWS))
+            print(f"  {'':<5} row-by-row, first {LEGACY_ROWS:,} rows: {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
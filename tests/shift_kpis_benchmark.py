@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the SQL shift KPIs (shifts.SHIFT_KPI_SQL on the warehouse)
+
+Times pieces, average cycle time and setup minutes per shift and per
+(day, shift) as one DuckDB interval join against the pandas mapping the
+preset used before, on seven weeks of telemetry spanning the March DST
+change. The calendar and equal results are checked by tests/test_shifts.py.
+
+    python tests/shift_kpis_benchmark.py
+    python tests/shift_kpis_benchmark.py --rows 5000000
+"""
+
+import argparse
+import tempfile
+import time
+
+from synthetic import shift_telemetry, window_bounds
+from reference import legacy_kpis
+from events import EventTracker
+from shifts import SHIFT_KPI_SQL
+from telemetry import TelemetryFrame
+from warehouse import AnalyticsWarehouse, window_params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="rows of the timing dataset")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows, 5 machines, 7 weeks")
+    df = shift_telemetry(args.rows, 5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    machines = list(df["name"].cat.categories)
+    from_dt, to_dt = window_bounds(df)
+    with tempfile.TemporaryDirectory() as state_dir:
+        tracker = EventTracker()
+        tracker.refresh(tf)
+        warehouse = AnalyticsWarehouse(state_dir)
+        warehouse.refresh(tf)
+        warehouse.sync_events(tracker)
+        con = warehouse.cursor()
+        parts, setups = tracker.part_events(machines, from_dt, to_dt), tracker.setup_intervals(machines, from_dt, to_dt)
+        print(f"  ({len(parts):,} parts, {len(setups):,} setups)")
+        for label, fn in (
+            ("pandas assign_shift", lambda: (legacy_kpis(parts, setups), legacy_kpis(parts, setups, by_day=True))),
+            ("DuckDB interval join", lambda: con.execute(SHIFT_KPI_SQL, window_params(machines, from_dt, to_dt)).df()),
+        ):
+            t0 = time.perf_counter()
+            fn()
+            print(f"  {label:<21} {time.perf_counter() - t0:.3f}s (per shift + per day and shift)")
+        warehouse.con.close()
+
+
+if __name__ == "__main__":
+    main()
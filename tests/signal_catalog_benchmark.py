@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the signal statistics catalog (catalog.SignalCatalog)
+
+Times the build over a large history, an append of a few rows and
+summary(). That the appended catalog equals a one-shot build and a full
+telemetry.signal_stats scan is checked by tests/test_catalog.py.
+
+    python tests/signal_catalog_benchmark.py
+    python tests/signal_catalog_benchmark.py --rows 2000000
+"""
+
+import argparse
+import time
+
+from synthetic import signal_telemetry
+from catalog import SignalCatalog
+from telemetry import TelemetryFrame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="history size for the timing run")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 90 signal columns, 10 machines")
+    df = signal_telemetry(args.rows, 90, 10)
+    history = df.groupby("name", observed=True).head(-100).reset_index(drop=True)
+    catalog = SignalCatalog()
+    t0 = time.perf_counter()
+    catalog.refresh(TelemetryFrame(history, assume_sorted=True))
+    print(f"  build: {time.perf_counter() - t0:.2f}s")
+    t0 = time.perf_counter()
+    n = catalog.refresh(TelemetryFrame(df, assume_sorted=True))
+    print(f"  append {n:,} rows: {time.perf_counter() - t0:.3f}s")
+    t0 = time.perf_counter()
+    catalog.summary()
+    print(f"  summary(): {time.perf_counter() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the keyed app stages (stages.StageCache, stages.StageLog)
+
+Every widget change used to rerun all of app.py: part/setup cut, catalog
+summary, dynamic metric scores and the chart. Now the preset, free-text and
+preview sections are fragments and the expensive stages are looked up under
+explicit keys (filter window + dataset version). Times one rerun after a
+rule change without and with the stage cache. Which stages a rerun computes
+again is checked by tests/test_stages.py.
+
+    python tests/stage_cache_benchmark.py
+    python tests/stage_cache_benchmark.py --rows 2000000
+"""
+
+import argparse
+import time
+
+from synthetic import EXEC_PROG_COMPLETED, StageApp, event_telemetry, signal_telemetry, window_bounds
+from stages import StageCache
+from telemetry import TelemetryFrame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000, help="rows of the timing dataset")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 90 signal columns, 5 machines: rerun after a rule change")
+    df = signal_telemetry(args.rows, 90, 5)
+    df[EXEC_PROG_COMPLETED] = event_telemetry(args.rows, 5, "exec")[EXEC_PROG_COMPLETED]
+    machines = list(df["name"].cat.categories)
+    from_dt, to_dt = window_bounds(df)
+    app = StageApp(TelemetryFrame(df, assume_sorted=True), StageCache())
+    app.rerun(machines, from_dt, to_dt, "10s")
+    for label, cached in (("no stage cache", False), ("stage cache", True)):
+        t0 = time.perf_counter()
+        log, _ = app.rerun(machines, from_dt, to_dt, "1min", cached=cached)
+        print(f"  {label:<21} {(time.perf_counter() - t0) * 1000:8.1f} ms  ({log.summary()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Synthetic telemetry, app scenarios and comparison helpers shared by the tests and the benchmarks
+
+Every frame is sorted by [name, time] like app.prepare_frame leaves it, with
+machine names as category and UTC timestamps. The scenarios replay what one
+rerun of app.py does (tables, chart inputs, keyed stages), since app.py runs
+Streamlit on import. Importing this module puts the app directory on sys.path.
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streamlit_machine_analytics_extended-8")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from catalog import SignalCatalog
+from display import Y_AXES, value_ranges
+from events import EventTracker, EXEC_PROG_COMPLETED, EXEC_STRING, MODE_STRING, PGM_STRING
+from stages import StageCache, StageLog
+from telemetry import TelemetryFrame, SparseSignals, as_machine_category, signal_stats
+
+MACHINE_COL = "name"
+TIMESTAMP_COL = "time"
+PART_SCENARIOS = ["exec", "cycle", "pgm", "plain"]
+SETUP_SCENARIOS = ["mode", "pgm", "mode+pgm", "mode-none", "plain"]
+RESAMPLE_RULES = {"10s": "10s", "1m": "1min", "1h": "1h", "1d": "1D", "1w": "1W"}  # app rule -> pandas rule
+
+
+def _keys(rng: np.random.Generator, n_rows: int, n_machines: int, step_s: np.ndarray) -> pd.DataFrame:
+    machine = np.sort(rng.integers(0, n_machines, n_rows))
+    t = pd.Timestamp("2025-06-01", tz="UTC").value + np.cumsum(step_s) * 1_000_000_000
+    names = pd.Series([f"CNC_{m:02d}" for m in range(n_machines)]).take(machine).reset_index(drop=True)
+    return pd.DataFrame({MACHINE_COL: as_machine_category(names), TIMESTAMP_COL: pd.to_datetime(t, utc=True)})
+
+
+def signal_telemetry(n_rows: int, n_cols: int, n_machines: int, seed: int = 0) -> pd.DataFrame:
+    """Telemetry where each row sets only a few signals (fill rate 1-30 %), some constant, some boolean."""
+    rng = np.random.default_rng(seed)
+    df = _keys(rng, n_rows, n_machines, rng.choice([0, 1, 2], n_rows))
+    data = {}
+    for j in range(n_cols):
+        fill = rng.uniform(0.01, 0.3)
+        if j % 10 == 0:
+            data[f"/Nck/flag{j}_BOOL"] = rng.random(n_rows) < 0.5  # dense boolean
+            continue
+        values = np.round(rng.normal(0, 10 ** rng.integers(0, 4), n_rows), 1)
+        if j % 7 == 0:
+            values[:] = 42.0  # constant
+        values[rng.random(n_rows) > fill] = np.nan
+        data[f"/Channel/sig{j}_REAL"] = values
+    return pd.concat([df, pd.DataFrame(data)], axis=1)
+
+
+def event_telemetry(n_rows: int, n_machines: int, scenario: str, seed: int = 0) -> pd.DataFrame:
+    """Irregular sampling (duplicate timestamps, pauses of minutes) with the columns a detector scenario needs.
+
+    Part scenarios: exec (flag + text cue), cycle (cycle time signal), pgm
+    (program changes, with runs of missing values), plain (keys only), mixed
+    (exec and pgm columns, but the last machine never completes a program).
+    Setup scenarios: mode (AUTO/SETUP/Rüsten blocks), pgm, mode+pgm,
+    mode-none (no setup mode, gap fallback).
+    """
+    rng = np.random.default_rng(seed)
+    step_s = rng.choice([0, 1, 2, 5, 30, 400], n_rows, p=[0.1, 0.4, 0.2, 0.2, 0.07, 0.03])
+    df = _keys(rng, n_rows, n_machines, step_s)
+    if scenario in ("exec", "mixed"):
+        df[EXEC_PROG_COMPLETED] = rng.random(n_rows) < 0.02
+        df[EXEC_STRING] = np.where(rng.random(n_rows) < 0.001, "PROGRAM COMPLETED", "ACTIVE")
+    elif scenario == "cycle":
+        cycle = np.round(rng.normal(60, 8, n_rows), 1)
+        cycle[rng.random(n_rows) < 0.3] = np.nan
+        df["/Channel/ChannelDiagnose/cycleTime"] = cycle
+    if scenario in ("mode", "mode+pgm"):
+        # blocks of AUTO / SETUP / Rüsten, some of them a single row long
+        block = np.cumsum(rng.random(n_rows) < 0.05)
+        labels = np.array(["AUTO", "SETUP", "MDA", "Rüsten", "JOG"])
+        df[MODE_STRING] = labels[rng.integers(0, len(labels), block.max() + 1)][block]
+    if scenario in ("pgm", "mode+pgm", "mode-none", "mixed"):
+        pgm = np.array(["O1001", "O1002", "O2001"], dtype=object)[np.cumsum(rng.random(n_rows) < 0.02) % 3]
+        pgm[np.cumsum(rng.random(n_rows) < 0.02) % 5 == 4] = np.nan  # runs without a program value
+        df[PGM_STRING] = pgm
+    if scenario == "mixed":
+        silent = (df[MACHINE_COL] == df[MACHINE_COL].cat.categories[-1]).to_numpy()
+        df.loc[silent, EXEC_PROG_COMPLETED] = False
+        df.loc[silent, EXEC_STRING] = "ACTIVE"
+    if scenario == "mode-none":
+        df[MODE_STRING] = "AUTO"  # explicit path finds nothing, falls back to gaps
+    return df
+
+
+def shift_telemetry(n_rows: int, n_machines: int, seed: int = 0) -> pd.DataFrame:
+    """Part completions plus AUTO/SETUP blocks over ~7 weeks from 2025-03-10 (across the March DST change)."""
+    df = event_telemetry(n_rows, n_machines, "exec", seed=seed)
+    rng = np.random.default_rng(seed)
+    block = np.cumsum(rng.random(n_rows) < 0.01)
+    df[MODE_STRING] = np.array(["AUTO", "AUTO", "SETUP"])[rng.integers(0, 3, block.max() + 1)][block]
+    return stretch(df, pd.Timestamp("2025-03-10", tz="UTC"), pd.Timedelta(days=49))
+
+
+def stretch(df: pd.DataFrame, start: pd.Timestamp, span: pd.Timedelta) -> pd.DataFrame:
+    """`df` with its timestamps moved and scaled linearly onto [start, start + span] (order kept)."""
+    t0 = df[TIMESTAMP_COL].min()
+    scale = (df[TIMESTAMP_COL].max() - t0) / span
+    return df.assign(**{TIMESTAMP_COL: start + (df[TIMESTAMP_COL] - t0) / scale})
+
+
+def discrete_signal(n_rows: int, n_values: int, seed: int = 0, gaps: bool = True) -> pd.Series:
+    """1 Hz samples of a few discrete levels with NaN holes and (optionally) pauses of minutes to hours."""
+    rng = np.random.default_rng(seed)
+    step = np.ones(n_rows, dtype=np.int64)
+    if gaps:
+        pause = rng.random(n_rows) < 0.001
+        step[pause] = rng.integers(30, 7200, pause.sum())
+    t = pd.Timestamp("2025-06-01", tz="UTC").value + np.cumsum(step) * 1_000_000_000
+    values = rng.integers(0, n_values, n_rows).astype(float)
+    values[rng.random(n_rows) < 0.2] = np.nan
+    return pd.Series(values, index=pd.DatetimeIndex(pd.to_datetime(t, utc=True), name=TIMESTAMP_COL))
+
+
+def time_signals(n_points: int, n_cols: int, seed: int = 0) -> pd.DataFrame:
+    """1 Hz time-indexed random walks of very different scales with gaps, plus one constant signal."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2025-06-01", periods=n_points, freq="s", tz="UTC", name=TIMESTAMP_COL)
+    data = {}
+    for j in range(n_cols):
+        values = np.cumsum(rng.normal(0, 10.0 ** (j % 4), n_points))
+        values[rng.random(n_points) < 0.05] = np.nan
+        data[f"/Channel/sig{j}_REAL"] = values
+    data["/Channel/const_REAL"] = np.full(n_points, 7.0)
+    return pd.DataFrame(data, index=index)
+
+
+def growing_batches(df: pd.DataFrame, n_batches: int, seed: int):
+    """Prefixes of the data cut at random timestamps (what a growing log file looks like)."""
+    ts = np.sort(df[TIMESTAMP_COL].unique())
+    cuts = np.sort(np.random.default_rng(seed).choice(ts, n_batches - 1, replace=False))
+    for cut in cuts:
+        yield df[df[TIMESTAMP_COL] <= cut].reset_index(drop=True)
+    yield df
+
+
+def window_bounds(df: pd.DataFrame):
+    """Whole days around the data, as the date filter selects them."""
+    return df[TIMESTAMP_COL].min().floor("1D"), df[TIMESTAMP_COL].max().ceil("1D")
+
+
+def duckdb_events(src) -> duckdb.DuckDBPyConnection:
+    """In-memory connection with an `events` view of a TelemetryFrame or SparseSignals."""
+    con = duckdb.connect(database=":memory:")
+    con.execute("SET TimeZone='UTC'")
+    if isinstance(src, SparseSignals):
+        con.register("event_keys", src.keys.df.assign(row_id=np.arange(len(src))))
+        con.register("signal_samples", src.to_long())
+        con.execute(f"CREATE VIEW events AS {src.events_sql('event_keys', 'signal_samples')}")
+    else:
+        con.register("events", src.df)
+    return con
+
+
+def pandas_resample(df: pd.DataFrame, cols, rule: str, mode_cols) -> pd.DataFrame:
+    """Mean per bucket, mode (smallest value on ties) for `mode_cols`; buckets without samples are NaN."""
+    d = df[[TIMESTAMP_COL] + list(cols)].sort_values(TIMESTAMP_COL, kind="stable").set_index(TIMESTAMP_COL)
+    out = {}
+    for col in cols:
+        s = d[col].astype(float)
+        r = s.resample(RESAMPLE_RULES.get(rule, rule))
+        if col not in mode_cols:
+            out[col] = r.mean()
+            continue
+        labels = r.size().index
+        bucket = s.groupby(pd.Grouper(freq=RESAMPLE_RULES.get(rule, rule))).ngroup().to_numpy()
+        counts = pd.DataFrame({"bucket": bucket, "value": s.to_numpy()}).dropna().value_counts().reset_index()
+        top = counts.sort_values(["bucket", "count", "value"], ascending=[True, False, True]).drop_duplicates("bucket")
+        mode = np.full(len(labels), np.nan)
+        mode[top["bucket"].to_numpy()] = top["value"].to_numpy()
+        out[col] = pd.Series(mode, index=labels)
+    return pd.DataFrame(out)
+
+
+def rerun_tables(tf: TelemetryFrame, tracker: EventTracker, machines, from_dt, to_dt):
+    """(name, frame) of the tables one rerun of app.py shows."""
+    parts = tracker.part_events(machines, from_dt, to_dt)
+    setups = tracker.setup_intervals(machines, from_dt, to_dt)
+    kpis = parts.assign(shift=(parts["time"].dt.hour // 8).astype(str)).groupby("shift").agg(
+        pieces=("cycle_time_s", "size"), avg_ct_s=("cycle_time_s", "mean"))
+    return [("parts_sample", parts.head(3)), ("setups_sample", setups.head(3)), ("shift_kpis", kpis),
+            ("raw_preview", tf.window(machines, from_dt, to_dt).df.head(100))]
+
+
+def chart_inputs(data: pd.DataFrame):
+    """axis_assignment and ranges as timeseries_chart derives them (plotted min/max, spread by range)."""
+    ranges = value_ranges(data, list(data.columns))
+    order = sorted(ranges, key=lambda c: ranges[c]['range'], reverse=True)
+    axes = list(Y_AXES)
+    return {c: axes[i % len(axes)] for i, c in enumerate(order)}, ranges
+
+
+class StageApp:
+    """The stages app.py runs for a filter window, with the same keys."""
+
+    def __init__(self, tf: TelemetryFrame, cache: StageCache):
+        self.tracker, self.catalog, self.cache = EventTracker(), SignalCatalog(), cache
+        self.refresh(tf)
+
+    def refresh(self, tf: TelemetryFrame):
+        self.tf = tf
+        self.tracker.refresh(tf)
+        self.catalog.refresh(tf)
+        self.version = str(len(tf.df))  # stands in for warehouse.version()
+
+    def rerun(self, machines, from_dt, to_dt, rule: str, cached: bool = True):
+        log = StageLog("app")
+        cache = self.cache if cached else StageCache()
+        window_key = ("dataset", tuple(map(str, machines)), from_dt.value, to_dt.value)
+        data_version = (window_key, self.version)
+        with log.timed("window"):
+            tf = self.tf.window(machines, from_dt, to_dt)
+        summary = cache.get("catalog summary", (window_key[1], self.version), lambda: self.catalog.summary(machines), log)
+        parts = cache.get("parts", data_version, lambda: self.tracker.part_events(machines, from_dt, to_dt), log)
+        setups = cache.get("setups", data_version, lambda: self.tracker.setup_intervals(machines, from_dt, to_dt), log)
+        cols = [c for c in tf.signal_columns() if c.endswith("_REAL")]
+        scores = cache.get("dynamic scores", data_version, lambda: signal_stats(tf, cols)["changes"], log)
+        with log.timed("resample"):
+            top = scores.sort_values(ascending=False).index[:5].tolist()
+            tf.signal_frame(top).set_index("time").resample(rule).mean()
+        return log, {"summary": summary, "parts": parts, "setups": setups, "scores": scores}
+
+
+def same_frame(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Same non-empty rows (index, columns, values up to float tolerance)."""
+    a = a.dropna(how="all")
+    b = b.dropna(how="all")
+    if len(a) != len(b) or list(a.columns) != list(b.columns) or not (a.index == b.index).all():
+        return False
+    return bool(np.allclose(a.to_numpy(float), b.to_numpy(float), equal_nan=True))
+
+
+def same_parts(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    a, b = a.reset_index(drop=True), b.reset_index(drop=True)
+    return (
+        len(a) == len(b)
+        and (a[MACHINE_COL].astype(str).to_numpy() == b[MACHINE_COL].astype(str).to_numpy()).all()
+        and (a[TIMESTAMP_COL].to_numpy() == b[TIMESTAMP_COL].to_numpy()).all()
+        and np.allclose(a["cycle_time_s"].to_numpy(float), b["cycle_time_s"].to_numpy(float))
+    )
+
+
+def same_intervals(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    if len(a) != len(b):
+        return False
+    if a.empty:
+        return True
+    return (
+        (a[MACHINE_COL].astype(str).to_numpy() == b[MACHINE_COL].astype(str).to_numpy()).all()
+        and (a["start"].to_numpy() == b["start"].to_numpy()).all()
+        and (a["end"].to_numpy() == b["end"].to_numpy()).all()
+        and np.allclose(a["setup_s"].to_numpy(float), b["setup_s"].to_numpy(float))
+    )
+
+
+def same_rows(expected: pd.DataFrame, actual: pd.DataFrame) -> bool:
+    """Same rows and columns (any column order), numbers compared as floats, everything else as text."""
+    expected, actual = expected.reset_index(drop=True), actual.reset_index(drop=True)
+    if len(expected) != len(actual) or set(expected.columns) != set(actual.columns):
+        return False
+    for col in expected.columns:
+        a, b = expected[col], actual[col]
+        if pd.api.types.is_numeric_dtype(a) or pd.api.types.is_bool_dtype(a):
+            if not np.array_equal(a.to_numpy(float, na_value=np.nan), b.to_numpy(float, na_value=np.nan), equal_nan=True):
+                return False
+        elif not (a.astype(str).to_numpy() == b.astype(str).to_numpy()).all():
+            return False
+    return True
@@ -0,0 +1,41 @@
+"""Signal statistics catalog (catalog.SignalCatalog): appended vs. one-shot build, summary vs. a full scan."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import growing_batches, signal_telemetry
+from catalog import SignalCatalog, LEVELS_CAP
+from telemetry import TelemetryFrame, SparseSignals, signal_stats
+
+EXACT = ["samples", "changes", "first_ns", "last_ns"]
+CLOSE = ["mean", "variance", "min", "max", "last_value"]
+
+
+def same_columns(a: pd.DataFrame, b: pd.DataFrame, exact, close) -> bool:
+    ok = all((a[c].to_numpy() == b[c].to_numpy()).all() for c in exact)
+    return ok and all(np.allclose(a[c].to_numpy(float), b[c].to_numpy(float), equal_nan=True) for c in close)
+
+
+@pytest.mark.parametrize("n_machines", [1, 4])
+def test_appended_catalog_equals_one_shot(tmp_path, n_machines):
+    df = signal_telemetry(8_000, 20, n_machines, seed=n_machines)
+    once = SignalCatalog()
+    once.refresh(TelemetryFrame(df, assume_sorted=True))
+    for batch in growing_batches(df, 5, seed=n_machines):
+        appended = SignalCatalog(str(tmp_path))  # reloaded from disk before every append
+        appended.refresh(SparseSignals.from_frame(TelemetryFrame(batch, assume_sorted=True)))
+    assert same_columns(once.table, appended.table, EXACT, CLOSE)
+    assert list(once.table["levels"]) == list(appended.table["levels"])
+
+
+@pytest.mark.parametrize("n_machines", [1, 4])
+def test_summary_equals_full_scan(n_machines):
+    df = signal_telemetry(8_000, 20, n_machines, seed=n_machines)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    catalog = SignalCatalog()
+    catalog.refresh(tf)
+    summary = catalog.summary().reindex(tf.signal_columns())
+    scan = signal_stats(tf, tf.signal_columns())
+    assert same_columns(summary, scan, ["samples", "changes"], ["mean", "variance", "min", "max"])
+    assert (np.minimum(summary["distinct"], LEVELS_CAP + 1) == np.minimum(scan["distinct"], LEVELS_CAP + 1)).all()
@@ -0,0 +1,149 @@
+"""Native chart/table values, the cached st.dataframe adapter and the single time series figure (display.py)."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pyarrow as pa
+import pytest
+from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+from synthetic import chart_inputs, event_telemetry, rerun_tables, time_signals
+import display
+from display import (DisplayCache, NORMALIZED_AXIS, SCATTERGL_MIN_POINTS, arrow_safe, plot_time, timeseries_figure,
+                     value_ranges)
+from events import EventTracker
+from ingest import read_table, to_utc_datetime
+from telemetry import TelemetryFrame
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_and_eda", "cnc_daten.csv")
+
+
+def test_plot_time_keeps_instants():
+    ts = pd.Series(pd.to_datetime(["2025-06-01 00:00:00.250", "2025-10-26 01:30:00.000", "2025-10-26 02:30:00.000"], utc=True))
+    ms = plot_time(ts)
+    assert ms.dtype == np.int64
+    assert (pd.to_datetime(ms, unit="ms").strftime('%Y-%m-%d %H:%M:%S') == ts.dt.strftime('%Y-%m-%d %H:%M:%S')).all()
+    assert (plot_time(ts.dt.tz_convert("Europe/Berlin")) == ms).all()
+
+
+def test_arrow_safe_keeps_native_columns():
+    ts = pd.Series(pd.date_range("2025-06-01", periods=3, freq="h", tz="UTC"))
+    mixed = pd.DataFrame({"time": ts, "name": pd.Categorical(["a", "b", "a"]), "v": [1.5, np.nan, 2.0],
+                          "flag": [True, False, True], "text": ["x", None, "z"], "mixed": [1, "x", None]})
+    safe = arrow_safe(mixed)
+    assert all(safe[c].dtype == mixed[c].dtype for c in ("time", "name", "v", "flag", "text"))
+    assert safe["mixed"].tolist()[:2] == ["1", "x"]
+    assert arrow_safe(mixed.drop(columns="mixed")) is not mixed
+
+
+def test_default_dataset_preview_converts_to_arrow():
+    df, _ = read_table(DEFAULT_DATA, "cnc_daten.csv")
+    default = TelemetryFrame(df.assign(time=to_utc_datetime(df["time"])).dropna(subset=["time"])).df  # as app.prepare_frame
+    preview = arrow_safe(default.head(100))
+    assert pd.api.types.is_datetime64_any_dtype(preview["time"])
+    assert len(convert_anything_to_arrow_bytes(preview)) > 0
+
+
+def same_values(df: pd.DataFrame, table: pa.Table) -> bool:
+    back = table.to_pandas()
+    expected = arrow_safe(df)
+    if not isinstance(df.index, pd.RangeIndex):
+        expected = expected.reset_index()
+        back = back.reset_index()
+    expected = expected.reset_index(drop=True)
+    back = back[expected.columns].reset_index(drop=True)
+    return all(expected[c].astype(str).equals(back[c].astype(str)) for c in expected.columns)
+
+
+@pytest.fixture
+def tables():
+    df = event_telemetry(8_000, 3, "exec", seed=2)
+    df["program"] = np.where(np.arange(len(df)) % 7 == 0, None, "P100")  # a text column with gaps
+    tf = TelemetryFrame(df, assume_sorted=True)
+    tracker = EventTracker()
+    tracker.refresh(tf)
+    return tf, tracker, list(df["name"].cat.categories), df["time"].min().floor("1h")
+
+
+def test_display_cache_converts_once_per_key_and_layout(tables, monkeypatch):
+    tf, tracker, machines, t0 = tables
+    cache = DisplayCache()
+    frames = rerun_tables(tf, tracker, machines, t0, t0 + pd.Timedelta(days=30))
+    converted = {name: cache.table((name, "w0", "v1"), frame) for name, frame in frames}
+    assert all(same_values(frame, converted[name]) for name, frame in frames)
+    assert pa.types.is_timestamp(converted["raw_preview"].schema.field("time").type)
+
+    inferred = []
+    real = display.arrow_fix_columns
+    monkeypatch.setattr(display, "arrow_fix_columns", lambda d: inferred.append(1) or real(d))
+    again = {name: cache.table((name, "w0", "v1"), frame) for name, frame in frames}
+    assert all(again[n] is converted[n] for n in again) and cache.hits == len(frames) and not inferred
+    schemas = cache.stats()["schemas"]
+    for hours in (1, 2, 5):
+        for name, frame in rerun_tables(tf, tracker, machines[:2], t0 + pd.Timedelta(hours=hours), t0 + pd.Timedelta(days=30)):
+            cache.table((name, f"w{hours}", "v1"), frame)
+    assert cache.stats()["schemas"] == schemas and not inferred
+
+
+def test_display_cache_reinfers_mixed_columns_and_is_bounded(tables):
+    tf, tracker, machines, t0 = tables
+    cache = DisplayCache()
+    mixed = tf.df.head(100).copy()
+    mixed["program"] = mixed["program"].astype(object)
+    cache.table(("raw_preview", "w0", "v1"), mixed)
+    mixed.loc[3, "program"] = 17
+    table = cache.table(("raw_preview", "mixed", "v1"), mixed)
+    assert table.schema.field("program").type == pa.string() and table.column("program")[3].as_py() == "17"
+
+    preview = tf.df.head(100)
+    small = DisplayCache(max_bytes=DisplayCache().table(("raw_preview",), preview).nbytes + 100)
+    for version in range(3):
+        small.table(("raw_preview", "w0", version), preview)
+    st = small.stats()
+    assert st["entries"] == 1 and st["evictions"] == 2
+
+
+def test_timeseries_figure_views():
+    data = time_signals(SCATTERGL_MIN_POINTS + 1, 6, seed=1)
+    axis_assignment, ranges = chart_inputs(data)
+    fig = timeseries_figure(data, plot_time(data.index), axis_assignment, ranges, "raw", "normalized")
+    layout = fig.layout.to_plotly_json()
+    cols = list(axis_assignment)
+    assert len(fig.data) == len(cols)
+    for t, c in zip(fig.data, cols):  # one trace per signal with its raw values
+        assert np.array_equal(t.y, data[c].to_numpy(), equal_nan=True) and t.yaxis == axis_assignment[c]
+
+    raw_button, norm_button = layout["updatemenus"][0]["buttons"]
+    scale = layout["yaxis" + NORMALIZED_AXIS[1:]]["range"]
+    for t, c, axis in zip(fig.data, cols, norm_button["args"][0]["yaxis"]):
+        lo, hi = layout["yaxis" + axis[1:]]["range"]
+        shown = scale[0] + (t.y - lo) / (hi - lo) * (scale[1] - scale[0])  # same height on the 0-1 axis
+        r = ranges[c]
+        expected = (t.y - r['min']) / r['range'] if r['range'] > 0 else np.full(len(t.y), 0.5)
+        assert np.allclose(shown, expected, equal_nan=True), c
+    assert raw_button["args"][0]["yaxis"] == [t.yaxis for t in fig.data]
+    assert raw_button["args"][0]["name"] == [t.name for t in fig.data]
+    assert len(norm_button["args"][0]["yaxis"]) == len(set(norm_button["args"][0]["yaxis"])) == len(cols)
+
+
+def test_timeseries_figure_switches_to_webgl_above_threshold():
+    data = time_signals(SCATTERGL_MIN_POINTS + 1, 2)
+    axis_assignment, ranges = chart_inputs(data)
+    large = timeseries_figure(data, plot_time(data.index), axis_assignment, ranges, "raw", "n")
+    small = timeseries_figure(data.iloc[:100], plot_time(data.index[:100]), axis_assignment, ranges, "raw", "n")
+    assert all(isinstance(t, go.Scattergl) for t in large.data)
+    assert all(isinstance(t, go.Scatter) for t in small.data)
+
+
+def test_value_ranges_use_the_catalog_only_when_it_covers_the_window():
+    data = time_signals(600, 3, seed=1)
+    cols = list(data.columns)
+    stats = pd.DataFrame({"min": -1e6, "max": 1e6}, index=cols[:2])  # whole history, wider than the window
+    own = value_ranges(data, cols)
+    assert all(own[c]['min'] == data[c].min() and own[c]['max'] == data[c].max() for c in cols)
+    covered = value_ranges(data, cols, stats)
+    assert all(covered[c] == {'min': -1e6, 'max': 1e6, 'range': 2e6} for c in cols[:2])
+    assert covered[cols[2]] == own[cols[2]]  # a signal the catalog does not know keeps its plotted range
+    assert value_ranges(data.assign(**{cols[0]: np.nan}), cols, stats).keys() == set(cols[1:])
@@ -0,0 +1,108 @@
+"""Part and setup detection (events.py): vectorized detectors and the incremental EventTracker."""
+
+import os
+
+import pandas as pd
+import pytest
+
+from synthetic import (MACHINE_COL, TIMESTAMP_COL, PART_SCENARIOS, event_telemetry, growing_batches,
+                       same_intervals, same_parts)
+from reference import legacy_detect_part_completed, legacy_detect_setup_intervals
+from events import (EventTracker, detect_part_completed, detect_setup_intervals, evict_state_dirs, state_dirs,
+                    EXEC_PROG_COMPLETED, MODE_STRING)
+from telemetry import TelemetryFrame, SparseSignals, as_machine_category
+
+SETUP_SCENARIOS = ["mode", "pgm", "mode+pgm", "mode-none", "plain"]
+EXACT_INCREMENTAL = ["exec", "pgm", "mode", "mode+pgm", "mode-none"]  # no thresholds frozen at the first batch
+
+
+@pytest.mark.parametrize("n_machines", [1, 5])
+@pytest.mark.parametrize("scenario", PART_SCENARIOS)
+def test_parts_match_loop_implementation(scenario, n_machines):
+    df = event_telemetry(4_000, n_machines, scenario, seed=n_machines)
+    assert same_parts(legacy_detect_part_completed(df), detect_part_completed(TelemetryFrame(df, assume_sorted=True)))
+
+
+@pytest.mark.parametrize("n_machines", [1, 5])
+@pytest.mark.parametrize("scenario", SETUP_SCENARIOS)
+def test_setups_match_row_implementation(scenario, n_machines):
+    df = event_telemetry(4_000, n_machines, scenario, seed=n_machines)
+    assert same_intervals(legacy_detect_setup_intervals(df), detect_setup_intervals(TelemetryFrame(df, assume_sorted=True)))
+
+
+def test_setup_runs_at_machine_boundaries():
+    # setup run on the last row, run reaching the machine's end, runs across machine boundaries
+    t = pd.date_range("2025-06-01", periods=8, freq="1min", tz="UTC")
+    edge = pd.DataFrame({
+        MACHINE_COL: as_machine_category(pd.Series(["A"] * 4 + ["B"] * 4)),
+        TIMESTAMP_COL: t,
+        MODE_STRING: ["AUTO", "SETUP", "SETUP", "SETUP", "SETUP", "AUTO", "AUTO", "SETUP"],
+    })
+    assert same_intervals(legacy_detect_setup_intervals(edge), detect_setup_intervals(TelemetryFrame(edge, assume_sorted=True)))
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("scenario", EXACT_INCREMENTAL)
+def test_incremental_equals_full_detection(tmp_path, scenario, sparse):
+    df = event_telemetry(4_000, 3, scenario, seed=3)
+    for batch in growing_batches(df, 4, seed=3):
+        tf = TelemetryFrame(batch, assume_sorted=True)
+        tracker = EventTracker(str(tmp_path))  # state comes back from disk every time
+        tracker.refresh(SparseSignals.from_frame(tf) if sparse else tf)
+    full = TelemetryFrame(df, assume_sorted=True)
+    if scenario == "exec" or scenario == "pgm":
+        assert same_parts(detect_part_completed(full), tracker.part_events())
+    if scenario != "exec":
+        assert same_intervals(detect_setup_intervals(full), tracker.setup_intervals())
+
+
+def test_edited_history_is_detected_again(tmp_path):
+    df = event_telemetry(4_000, 3, "exec", seed=4)
+    first = df[df[TIMESTAMP_COL] <= df[TIMESTAMP_COL].quantile(0.6)].reset_index(drop=True)
+    EventTracker(str(tmp_path)).refresh(TelemetryFrame(first, assume_sorted=True))
+    edited = df.copy()
+    edited.loc[len(first) // 2, EXEC_PROG_COMPLETED] = not edited.loc[len(first) // 2, EXEC_PROG_COMPLETED]
+    tracker = EventTracker(str(tmp_path))
+    assert tracker.refresh(TelemetryFrame(edited, assume_sorted=True)) == len(df)  # rebuilt, not extended
+    assert same_parts(detect_part_completed(TelemetryFrame(edited, assume_sorted=True)), tracker.part_events())
+
+
+def test_window_parts_match_a_run_over_the_window():
+    # completion flags: the same marks as a run over the window rows, whose first parts have no cycle time
+    df = event_telemetry(6_000, 2, "exec", seed=7)
+    tracker = EventTracker()
+    tracker.refresh(TelemetryFrame(df, assume_sorted=True))
+    flags = df[EXEC_PROG_COMPLETED].to_numpy()
+    lo = next(i for i in range(1_000, len(df)) if not flags[i] and df[TIMESTAMP_COL][i] > df[TIMESTAMP_COL][i - 1])
+    from_dt, to_dt = df[TIMESTAMP_COL][lo], df[TIMESTAMP_COL].iloc[-1000]
+    window = TelemetryFrame(df, assume_sorted=True).window(["CNC_00", "CNC_01"], from_dt, to_dt)
+    expected = detect_part_completed(window)
+    actual = tracker.part_events(["CNC_00", "CNC_01"], from_dt, to_dt)
+    assert len(expected) and same_parts(expected, actual)
+
+
+def test_mark_source_is_chosen_per_window(tmp_path):
+    df = event_telemetry(4_000, 2, "mixed", seed=5)  # CNC_01 only changes programs
+    tracker = EventTracker(str(tmp_path))
+    tracker.refresh(TelemetryFrame(df, assume_sorted=True))
+    only_pgm = df[df[MACHINE_COL] == "CNC_01"]
+    only_pgm = only_pgm.assign(**{MACHINE_COL: as_machine_category(only_pgm[MACHINE_COL].astype(str))})
+    expected = detect_part_completed(TelemetryFrame(only_pgm, assume_sorted=True))
+    assert len(expected) and same_parts(expected, tracker.part_events(["CNC_01"]))
+    both = tracker.part_events()
+    assert same_parts(detect_part_completed(TelemetryFrame(df, assume_sorted=True)), both)
+    assert set(both[MACHINE_COL]) == {"CNC_00"}
+
+
+def test_state_dirs_evict_least_recently_used(tmp_path):
+    df = event_telemetry(2_000, 2, "exec", seed=1)
+    for i, key in enumerate(["a", "b", "c"]):
+        EventTracker(str(tmp_path / key)).refresh(TelemetryFrame(df, assume_sorted=True))
+        os.utime(tmp_path / key, (1_000 + i, 1_000 + i))
+    entries = state_dirs(str(tmp_path))
+    assert [os.path.basename(p) for p, _, _ in entries] == ["a", "b", "c"]
+    # "a" is the open dataset: it stays and counts as used, "b" is now the oldest
+    assert evict_state_dirs("a", str(tmp_path), max_bytes=sum(size for _, size, _ in entries) - 1) == 1
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
+    assert evict_state_dirs("a", str(tmp_path), max_bytes=0) == 1
+    assert os.listdir(tmp_path) == ["a"]
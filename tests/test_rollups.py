@@ -0,0 +1,61 @@
+"""Multi-resolution rollups (rollups.RollupPyramid): lookup vs. pandas resampling, appended vs. one-shot build."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import growing_batches, pandas_resample, same_frame, signal_telemetry, stretch, window_bounds
+from rollups import RollupPyramid, ROLLUP_LEVELS
+from telemetry import TelemetryFrame, SparseSignals
+
+
+@pytest.fixture(scope="module")
+def stretched():
+    """Samples spread over ~5 weeks so weekly buckets are meaningful, with a pyramid built on them."""
+    df = signal_telemetry(30_000, 12, 3, seed=1)
+    df = stretch(df, df["time"].min(), pd.Timedelta(days=35))
+    pyramid = RollupPyramid()
+    pyramid.refresh(TelemetryFrame(df, assume_sorted=True))
+    cols = [c for c in df.columns if c.startswith("/")]
+    return df, pyramid, cols, [c for c in cols if df[c].nunique() <= 10]
+
+
+@pytest.mark.parametrize("rule", list(ROLLUP_LEVELS) + ["1w"])
+def test_lookup_matches_pandas_resample(stretched, rule):
+    df, pyramid, cols, mode_cols = stretched
+    lo, hi = window_bounds(df)
+    machines = list(df["name"].cat.categories)
+    for subset in (machines, machines[:1]):
+        expected = pandas_resample(df[df["name"].isin(subset)], cols, rule, mode_cols)
+        assert same_frame(expected, pyramid.lookup(cols, rule, subset, lo, hi, mode_cols)), len(subset)
+
+
+def test_lookup_window_cuts_on_bucket_boundaries(stretched):
+    df, pyramid, cols, mode_cols = stretched
+    lo = df["time"].min().ceil("1h")
+    from_dt, to_dt = lo + pd.Timedelta(hours=5), lo + pd.Timedelta(hours=29)
+    window = df[(df["time"] >= from_dt) & (df["time"] < to_dt)]
+    actual = pyramid.lookup(cols, "1h", list(df["name"].cat.categories), from_dt, to_dt, mode_cols)
+    assert same_frame(pandas_resample(window, cols, "1h", mode_cols), actual)
+
+
+@pytest.mark.parametrize("n_machines", [1, 4])
+def test_appended_pyramid_equals_one_shot(tmp_path, n_machines):
+    df = signal_telemetry(8_000, 12, n_machines, seed=n_machines)
+    once = RollupPyramid()
+    once.refresh(TelemetryFrame(df, assume_sorted=True))
+    for batch in growing_batches(df, 5, seed=n_machines):
+        appended = RollupPyramid(str(tmp_path))  # reloaded from disk before every append
+        appended.refresh(SparseSignals.from_frame(TelemetryFrame(batch, assume_sorted=True)))
+    assert once.mode_values == appended.mode_values
+    for rule in ROLLUP_LEVELS:
+        for a, b, key in ((once.levels[rule], appended.levels[rule], ["machine", "signal", "bucket"]),
+                          (once.modes[rule], appended.modes[rule], ["machine", "signal", "bucket", "value"])):
+            a = a.sort_values(key, ignore_index=True)
+            b = b.sort_values(key, ignore_index=True)[list(a.columns)]
+            assert len(a) == len(b)
+            for c in a.columns:
+                if a[c].dtype == object:
+                    assert (a[c].to_numpy() == b[c].to_numpy()).all(), (rule, c)
+                else:
+                    assert np.allclose(a[c].to_numpy(float), b[c].to_numpy(float)), (rule, c)
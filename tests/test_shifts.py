@@ -0,0 +1,59 @@
+"""Shift calendar and the SQL shift KPIs (shifts.SHIFT_KPI_SQL on the warehouse) vs. the pandas preset."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import shift_telemetry, window_bounds
+from reference import legacy_kpis
+from events import EventTracker
+from shifts import SHIFT_KPI_SQL, SHIFT_NAMES, shift_calendar
+from telemetry import TelemetryFrame
+from warehouse import AnalyticsWarehouse, window_params
+
+
+def test_calendar_is_gap_free_with_dst_nights():
+    cal = shift_calendar(pd.Timestamp("2025-01-01", tz="UTC"), pd.Timestamp("2025-12-31", tz="UTC"))
+    hours = (cal["end"] - cal["start"]).dt.total_seconds() / 3600
+    night = cal["shift"] == "22-06"
+    assert (cal["start"].iloc[1:].to_numpy() == cal["end"].iloc[:-1].to_numpy()).all()
+    assert (hours[~night] == 8).all()
+    assert sorted(cal.loc[night & (hours != 8), "day"].astype(str)) == ["2025-03-29", "2025-10-25"]
+
+
+@pytest.fixture(scope="module")
+def shift_warehouse(tmp_path_factory):
+    df = shift_telemetry(40_000, 3, seed=1)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    tracker = EventTracker()
+    tracker.refresh(tf)
+    warehouse = AnalyticsWarehouse(str(tmp_path_factory.mktemp("shifts")))
+    warehouse.refresh(tf)
+    warehouse.sync_events(tracker)
+    yield df, tracker, warehouse
+    warehouse.con.close()
+
+
+@pytest.mark.parametrize("by_day", [False, True])
+@pytest.mark.parametrize("window", ["all", "dst week", "last day"])
+def test_sql_kpis_match_pandas(shift_warehouse, window, by_day):
+    df, tracker, warehouse = shift_warehouse
+    machines = list(df["name"].cat.categories)
+    t_min, t_max = window_bounds(df)
+    subset, from_dt, to_dt = {
+        "all": (machines, t_min, t_max),
+        "dst week": (machines[:2], t_min + pd.Timedelta(days=18), t_min + pd.Timedelta(days=23)),
+        "last day": (machines[2:], t_max - pd.Timedelta(days=1), t_max),
+    }[window]
+    kpis = warehouse.cursor().execute(SHIFT_KPI_SQL, window_params(subset, from_dt, to_dt)).df()
+    actual = kpis[kpis["day"].notna() if by_day else kpis["day"].isna()]
+    actual = actual.assign(day=pd.to_datetime(actual["day"]).dt.date).set_index(["day", "shift"] if by_day else "shift")
+    actual = actual[["pieces", "avg_ct_s", "setup_min"]]
+    expected = legacy_kpis(tracker.part_events(subset, from_dt, to_dt), tracker.setup_intervals(subset, from_dt, to_dt), by_day)
+    if not by_day:
+        expected = expected.reindex(SHIFT_NAMES).fillna({"pieces": 0, "setup_min": 0.0})
+    else:  # the calendar also lists shifts without parts or setups
+        actual = actual[(actual["pieces"] > 0) | (actual["setup_min"] > 0)]
+    expected, actual = expected.sort_index(), actual.sort_index()
+    assert expected.index.equals(actual.index)
+    assert np.allclose(expected.to_numpy(float), actual.to_numpy(float), equal_nan=True)
@@ -0,0 +1,50 @@
+"""Keyed app stages (stages.StageCache, stages.StageLog): what a rerun recomputes."""
+
+import pytest
+
+from synthetic import EXEC_PROG_COMPLETED, StageApp, event_telemetry, signal_telemetry, window_bounds
+from stages import StageCache
+from telemetry import TelemetryFrame
+
+DETECTION = {"catalog summary", "parts", "setups", "dynamic scores"}
+
+
+@pytest.fixture
+def app_data():
+    """Signals plus the part completion flag, so both detection and scores have work."""
+    df = signal_telemetry(12_000, 15, 3, seed=1)
+    df[EXEC_PROG_COMPLETED] = event_telemetry(12_000, 3, "exec", seed=1)[EXEC_PROG_COMPLETED]
+    return df, list(df["name"].cat.categories), *window_bounds(df)
+
+
+def test_rule_change_reuses_detection(app_data):
+    df, machines, from_dt, to_dt = app_data
+    app = StageApp(TelemetryFrame(df.iloc[:10_000], assume_sorted=True), StageCache())
+    first, results = app.rerun(machines, from_dt, to_dt, "10s")
+    log, again = app.rerun(machines, from_dt, to_dt, "1min")
+    assert set(first.ran()) >= DETECTION
+    assert set(log.ran()) == {"window", "resample"}
+    assert all(again[k] is results[k] for k in results)
+    assert "(cached)" in log.summary()
+
+
+def test_filter_change_and_appended_rows_recompute(app_data):
+    df, machines, from_dt, to_dt = app_data
+    app = StageApp(TelemetryFrame(df.iloc[:10_000], assume_sorted=True), StageCache())
+    _, results = app.rerun(machines, from_dt, to_dt, "10s")
+    log, narrowed = app.rerun(machines[:2], from_dt, to_dt, "1min")
+    assert set(log.ran()) >= DETECTION
+    assert narrowed["parts"].equals(app.tracker.part_events(machines[:2], from_dt, to_dt))
+    app.refresh(TelemetryFrame(df, assume_sorted=True))
+    log, grown = app.rerun(machines, from_dt, to_dt, "1min")
+    assert set(log.ran()) >= DETECTION
+    assert len(grown["parts"]) > len(results["parts"])
+
+
+def test_entry_bound_evicts_least_recently_used():
+    small = StageCache(max_entries=2)
+    calls = []
+    for key in (1, 2, 3, 1):
+        small.get("stage", key, lambda: calls.append(key) or key)
+    assert calls == [1, 2, 3, 1]
+    assert small.stats()["entries"] == 2
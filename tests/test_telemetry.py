@@ -0,0 +1,171 @@
+"""Signal statistics, bucket mode, raw downsampling and the DuckDB resampling query (telemetry.py)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import (duckdb_events, discrete_signal, pandas_resample, same_frame, same_rows, signal_telemetry,
+                       stretch, window_bounds)
+from reference import legacy_mode, legacy_scores, one_pass_scores
+import telemetry
+from telemetry import (TelemetryFrame, SparseSignals, bucket_mode, downsample_frame, history_changed, minmax_indices,
+                       mode_from_counts, resample_sql, DOWNSAMPLE_WIDTH, RESAMPLE_INTERVALS)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("n_machines", [1, 6])
+def test_signal_scores_match_per_column_implementation(n_machines, sparse):
+    df = signal_telemetry(6_000, 25, n_machines, seed=n_machines)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    cols = tf.signal_columns()
+    src = SparseSignals.from_frame(tf) if sparse else tf
+    assert one_pass_scores(src, cols) == legacy_scores(df, cols)
+
+
+@pytest.mark.parametrize("rule", ["10s", "1min", "1h", "1D", "1W"])
+@pytest.mark.parametrize("n_values", [1, 2, 10])
+def test_bucket_mode_matches_per_bucket_lambda(n_values, rule):
+    s = discrete_signal(20_000, n_values, seed=n_values)
+    sizes = s.resample(rule).size()
+    expected = legacy_mode(s, rule).where(sizes > 0)  # the lambda gave 0 for empty buckets, now NaN everywhere
+    bins = s.groupby(pd.Grouper(freq=rule)).ngroup().to_numpy()
+    actual = bucket_mode(s.to_numpy(np.float64, na_value=np.nan), bins, len(sizes))
+    assert expected.index.equals(sizes.index) and np.isnan(actual[(sizes == 0).to_numpy()]).all()
+    assert np.array_equal(expected.to_numpy(float), actual, equal_nan=True)
+
+
+def test_sparse_counting_and_counts_give_the_bincount_mode(monkeypatch):
+    s = discrete_signal(20_000, 10, seed=7)
+    bins = s.groupby(pd.Grouper(freq="10s")).ngroup().to_numpy()
+    n_buckets = bins.max() + 1
+    table = bucket_mode(s.to_numpy(), bins, n_buckets)
+    keys = pd.DataFrame({"bucket": bins, "value": s.to_numpy()}).dropna().value_counts().reset_index()
+    buckets, modes = mode_from_counts(keys["bucket"].to_numpy(), keys["value"].to_numpy(), keys["count"].to_numpy())
+    from_counts = np.full(n_buckets, np.nan)
+    from_counts[buckets] = modes
+    monkeypatch.setattr(telemetry, "MODE_TABLE_CELLS", 0)
+    assert np.array_equal(table, from_counts, equal_nan=True)
+    assert np.array_equal(table, bucket_mode(s.to_numpy(), bins, n_buckets), equal_nan=True)
+
+
+def bin_extremes(s: pd.Series, n_bins: int) -> pd.DataFrame:
+    """Min/max per bin of one signal, bins spanning its own first..last sample."""
+    s = s.dropna()
+    t = s.index.asi8
+    span = max(int(t[-1] - t[0]), 1)
+    bins = np.minimum(((t - t[0]) / span * n_bins).astype(np.int64), n_bins - 1)
+    return s.groupby(bins).agg(["min", "max"])
+
+
+@pytest.mark.parametrize("n_bins", [DOWNSAMPLE_WIDTH, 37])
+@pytest.mark.parametrize("sparse", [False, True])
+def test_downsample_keeps_per_bin_extremes(sparse, n_bins):
+    df = signal_telemetry(40_000, 12, 4, seed=2)
+    spike_col = "/Channel/sig1_REAL"
+    df.loc[df.index[df[spike_col].notna()][len(df) // 30], spike_col] = 1e6
+    tf = TelemetryFrame(df, assume_sorted=True)
+    src = SparseSignals.from_frame(tf) if sparse else tf
+    full = src.signal_frame(tf.signal_columns()).set_index("time")
+    small = downsample_frame(full, n_bins)
+    assert small.index.is_monotonic_increasing
+    assert (small[spike_col] == 1e6).any()
+    for col in full.columns:
+        a, b = full[col].dropna(), small[col].dropna()
+        if a.empty:
+            assert b.empty
+            continue
+        if len(a) <= 2 * n_bins:
+            assert a.equals(b)
+            continue
+        own = minmax_indices(full.index.asi8, full[col].to_numpy(dtype=np.float64, na_value=np.nan), n_bins)
+        assert len(own) <= 2 * n_bins + 2
+        assert (b.index[0], b.index[-1]) == (a.index[0], a.index[-1])
+        assert bin_extremes(full[col], n_bins).equals(bin_extremes(small[col], n_bins))
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_narrow_visible_range_is_full_resolution(sparse):
+    df = signal_telemetry(40_000, 12, 4, seed=2)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    src = SparseSignals.from_frame(tf) if sparse else tf
+    t0 = df["time"].min()
+    narrow = src.window(list(df["name"].cat.categories), t0 + pd.Timedelta(minutes=10), t0 + pd.Timedelta(minutes=20))
+    full = narrow.signal_frame(tf.signal_columns()).set_index("time")
+    assert len(full) <= 2 * DOWNSAMPLE_WIDTH
+    assert downsample_frame(full).equals(full)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_resample_sql_matches_pandas(sparse):
+    df = signal_telemetry(8_000, 10, 3, seed=2)
+    df = stretch(df, df["time"].min(), pd.Timedelta(days=35))  # weekly buckets are meaningful
+    tf = TelemetryFrame(df, assume_sorted=True)
+    cols = tf.signal_columns()
+    mode_cols = [c for c in cols if df[c].nunique() <= 10]
+    mode_levels = {c: df[c].dropna().unique() for c in mode_cols}
+    from_dt, to_dt = window_bounds(df)
+    machines = list(df["name"].cat.categories)
+    con = duckdb_events(SparseSignals.from_frame(tf) if sparse else tf)
+    for rule in RESAMPLE_INTERVALS:
+        for subset in (machines, machines[1:2]):
+            params = [[str(m) for m in subset], from_dt.to_pydatetime(), to_dt.to_pydatetime()]
+            actual = con.execute(resample_sql(cols, rule, mode_levels), params).df().set_index("bucket")
+            assert same_frame(pandas_resample(df[df["name"].isin(subset)], cols, rule, mode_cols), actual), (rule, len(subset))
+
+
+def test_events_sql_quotes_signal_names():
+    df = signal_telemetry(2_000, 4, 2, seed=3)
+    df = df.rename(columns={df.columns[3]: '/Channel/sig"1"_REAL'})
+    signals = SparseSignals.from_frame(TelemetryFrame(df, assume_sorted=True))
+    events = duckdb_events(signals).execute("SELECT * FROM events").df()
+    assert list(events.columns) == list(df.columns)
+    assert same_frame(events[df.columns[2:]], df[df.columns[2:]].astype(float))
+
+
+def test_sparse_head_widens_only_the_preview_rows(monkeypatch):
+    df = signal_telemetry(5_000, 12, 3, seed=5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    machines = list(df["name"].cat.categories)[1:]
+    window = SparseSignals.from_frame(tf).window(machines, *window_bounds(df))
+    expected = tf.window(machines, *window_bounds(df))
+    assert len(window) == len(expected) and window.columns == expected.columns
+    widened = []
+    dense = SparseSignals.dense
+    monkeypatch.setattr(SparseSignals, "dense", lambda self, col: widened.append(len(self)) or dense(self, col))
+    assert same_rows(expected.head(100), window.head(100))
+    assert set(widened) == {100}
+    assert window.head(0).empty and len(window.head(len(window) + 1)) == len(window)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_appended_ranges_check_the_processed_rows(sparse):
+    df = signal_telemetry(4_000, 12, 2, seed=8).assign(count=1)
+    cut = df["time"].quantile(0.75)
+    first = df[df["time"] <= cut].reset_index(drop=True)
+
+    def frame(d):
+        tf = TelemetryFrame(d, assume_sorted=True)
+        return SparseSignals.from_frame(tf) if sparse else tf
+
+    old = frame(first)
+    keys, checksums = (old.keys if sparse else old), old.checksums()
+    seen = {str(m): (e - s, int(keys.time_ns()[e - 1]), checksums[str(m)]) for m, (s, e) in keys.offsets.items()}
+    ranges = frame(df).appended_ranges(seen)
+    assert ranges == [(len(first), len(df))]
+    # a column that only the new rows set, and an int column that becomes float, keep the checksums
+    grown = df.assign(extra=np.where(df["time"] > cut, 1.5, np.nan), count=np.where(df["time"] > cut, 0.5, 1))
+    assert frame(grown).appended_ranges(seen) == ranges
+    edited = df.copy()
+    edited.loc[len(first) - 1, "/Nck/flag0_BOOL"] = not edited.loc[len(first) - 1, "/Nck/flag0_BOOL"]
+    assert frame(edited).appended_ranges(seen) is None
+    assert frame(edited).appended_ranges(seen, tail=True) == ranges  # a tail holds no processed rows to check
+    # the same check over batches of a store query
+    split = len(df) // 3
+
+    def batches(d):
+        return (TelemetryFrame(part.reset_index(drop=True), assume_sorted=True) for part in (d[:split], d[split:]))
+
+    assert history_changed(batches(grown), [seen, {}]) == [False, False]
+    assert history_changed(batches(edited), [seen]) == [True]
+    assert history_changed(batches(df[df["name"] != "CNC_00"]), [seen]) == [True]
+
@@ -0,0 +1,229 @@
+"""Persistent DuckDB store (warehouse.AnalyticsWarehouse) and the SQL result cache (warehouse.QueryCache)."""
+
+import duckdb
+import pandas as pd
+import pytest
+
+from synthetic import (duckdb_events, event_telemetry, growing_batches, same_frame, same_intervals, same_parts,
+                       same_rows, signal_telemetry, window_bounds)
+from catalog import SignalCatalog
+from events import EventTracker
+from telemetry import TelemetryFrame, SparseSignals, resample_sql
+from warehouse import AnalyticsWarehouse, EventsWindow, QueryCache, normalize_sql, window_params
+
+WINDOW_SQL = "SELECT * FROM events WHERE name IN (SELECT UNNEST(?::VARCHAR[])) AND time >= ? AND time < ?"
+PIECES_SQL = """
+            SELECT name, COUNT(*) AS pieces
+            FROM part_events(?::VARCHAR[], ?, ?)
+            GROUP BY name
+            ORDER BY pieces DESC
+            """
+SIGNAL_SQL = """SELECT name, COUNT(*) AS n, AVG(CAST(exec_program_completed_BOOL AS DOUBLE)) AS rate FROM events
+WHERE name IN (SELECT UNNEST(?::VARCHAR[])) AND time >= ? AND time < ? GROUP BY name ORDER BY name"""
+NUMERIC_STATS = ["samples", "changes", "mean", "variance", "min", "max", "first_ns", "last_ns"]
+
+
+def load_batches(df: pd.DataFrame, sparse: bool, tail: bool, state_dir: str) -> AnalyticsWarehouse:
+    prev_end = None
+    for batch in growing_batches(df, 4, seed=3):
+        tf = TelemetryFrame(batch, assume_sorted=True)
+        if tail and prev_end is not None:
+            tf = TelemetryFrame(batch[batch["time"] >= prev_end].reset_index(drop=True), assume_sorted=True)
+        warehouse = AnalyticsWarehouse(state_dir)  # rows and watermarks come back from the file every time
+        warehouse.refresh(SparseSignals.from_frame(tf) if sparse else tf, tail=tail and prev_end is not None)
+        prev_end = batch["time"].max()
+    return warehouse
+
+
+def load_events(warehouse: AnalyticsWarehouse, tracker: EventTracker, df: pd.DataFrame) -> None:
+    tf = TelemetryFrame(df, assume_sorted=True)
+    tracker.refresh(tf)
+    warehouse.refresh(tf)
+    warehouse.sync_events(tracker)
+
+
+@pytest.mark.parametrize("tail", [False, True])
+@pytest.mark.parametrize("sparse", [False, True])
+def test_window_queries_match_in_memory_registration(tmp_path, sparse, tail):
+    df = signal_telemetry(10_000, 12, 3, seed=4)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    cols = tf.signal_columns()
+    machines = list(df["name"].cat.categories)
+    t_min, t_max = window_bounds(df)
+    warehouse = load_batches(df, sparse, tail, str(tmp_path))
+    try:
+        for subset, from_dt, to_dt in ((machines, t_min, t_max), (machines[1:], t_min + pd.Timedelta(hours=4), t_max),
+                                       ([], t_min, t_max)):
+            con, params = warehouse.cursor(), window_params(subset, from_dt, to_dt)
+            assert same_rows(tf.window(subset, from_dt, to_dt).df, con.execute(WINDOW_SQL, params).df()), len(subset)
+            if subset:
+                sql = resample_sql(cols, "1m")
+                assert same_frame(duckdb_events(tf).execute(sql, params).df().set_index("bucket"),
+                                  con.execute(sql, params).df().set_index("bucket"))
+    finally:
+        warehouse.con.close()
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_events_window_reads_like_the_in_memory_window(tmp_path, sparse):
+    df = signal_telemetry(10_000, 12, 3, seed=5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    machines = list(df["name"].cat.categories)
+    t_min, t_max = window_bounds(df)
+    warehouse = load_batches(df, sparse, True, str(tmp_path))
+    try:
+        for subset, from_dt, to_dt in ((machines, t_min, t_max), (machines[1:], t_min + pd.Timedelta(hours=4), t_max),
+                                       ([], t_min, t_max)):
+            expected = tf.window(subset, from_dt, to_dt)
+            window = EventsWindow(warehouse.cursor(), subset, from_dt, to_dt)
+            assert (len(window), window.empty, window.columns) == (len(expected), expected.empty, expected.columns)
+            assert window.signal_columns() == expected.signal_columns()
+            assert same_rows(expected.head(100), window.head(100)) and window.head(0).empty
+            cols = expected.signal_columns()[::4]
+            assert same_rows(expected.signal_frame(cols), window.signal_frame(cols))
+            stats = SignalCatalog.of_batches(window.batches(batch_rows=2048)).summary()
+            expected_stats = SignalCatalog.of_batches([expected]).summary()
+            assert stats.index.equals(expected_stats.index)  # `distinct` beyond the levels is an estimate
+            assert stats["levels"].tolist() == expected_stats["levels"].tolist()
+            assert same_frame(expected_stats[NUMERIC_STATS].astype(float), stats[NUMERIC_STATS].astype(float))
+    finally:
+        warehouse.con.close()
+
+
+@pytest.mark.parametrize("read, scenario, same", [("part_events", "exec", same_parts),
+                                                  ("part_events", "mixed", same_parts),
+                                                  ("setup_intervals", "mode", same_intervals)])
+def test_event_macros_match_tracker(tmp_path, read, scenario, same):
+    df = event_telemetry(6_000, 3, scenario, seed=5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    machines = list(df["name"].cat.categories)
+    tracker = EventTracker()
+    warehouse = AnalyticsWarehouse(str(tmp_path))
+    try:
+        load_events(warehouse, tracker, df)
+        for subset, hours in ((machines, 0), (machines[:1], 2), (machines[1:], 6), (machines[-1:], 0)):
+            from_dt, to_dt = window_bounds(df)
+            from_dt += pd.Timedelta(hours=hours)
+            expected = getattr(tracker, read)(subset, from_dt, to_dt)
+            actual = warehouse.cursor().execute(f"SELECT * FROM {read}(?::VARCHAR[], ?, ?)",
+                                                window_params(subset, from_dt, to_dt)).df()
+            assert same(expected, actual), (len(subset), hours)
+    finally:
+        warehouse.con.close()
+
+
+@pytest.mark.parametrize("tail", [False, True])
+def test_changed_column_types_widen_the_table(tmp_path, tail):
+    df = signal_telemetry(6_000, 4, 2, seed=6).assign(**{"/Channel/count_REAL": 1, "/Channel/label_REAL": 2.5})
+    cut = df["time"].quantile(0.5)
+    old, rows = df[df["time"] <= cut].reset_index(drop=True), df[df["time"] > cut]
+    rows = rows.assign(**{"/Channel/count_REAL": 1.5, "/Channel/label_REAL": "n/a"})
+    # without `tail` the full data comes again: the old rows are unchanged, only their columns' types are wider
+    rows = (rows if tail else pd.concat([old, rows])).sort_values(["name", "time"], kind="stable").reset_index(drop=True)
+    warehouse = AnalyticsWarehouse(str(tmp_path))
+    try:
+        warehouse.refresh(TelemetryFrame(old, assume_sorted=True))
+        assert warehouse.refresh(TelemetryFrame(rows, assume_sorted=True), tail=tail) == len(df) - len(old)
+        types = dict(warehouse.con.execute("SELECT column_name, data_type FROM duckdb_columns() "
+                                           "WHERE table_name = 'telemetry'").fetchall())
+        assert (types["/Channel/count_REAL"], types["/Channel/label_REAL"]) == ("DOUBLE", "VARCHAR")
+        stored = warehouse.con.execute('SELECT "/Channel/count_REAL" AS n, "/Channel/label_REAL" AS l, COUNT(*) AS rows '
+                                       "FROM telemetry GROUP BY ALL ORDER BY n").fetchall()
+        assert stored == [(1.0, "2.5", len(old)), (1.5, "n/a", len(df) - len(old))]
+    finally:
+        warehouse.con.close()
+
+
+def test_unconvertible_column_rebuilds_from_the_full_data(tmp_path):
+    df = signal_telemetry(6_000, 4, 2, seed=6)
+    first = df[df["time"] <= df["time"].quantile(0.5)].reset_index(drop=True)
+    rest = df[df["time"] > first["time"].max()].reset_index(drop=True)
+    for tail in (False, True):
+        warehouse = AnalyticsWarehouse(str(tmp_path / str(tail)))
+        try:
+            warehouse.refresh(TelemetryFrame(first.assign(stamp=first["time"]), assume_sorted=True))
+            # the same column is now numeric: a DOUBLE does not fit into TIMESTAMPTZ
+            if tail:  # only the tail at hand: the watermarks are emptied for a full refresh
+                with pytest.raises(duckdb.Error):
+                    warehouse.refresh(TelemetryFrame(rest.assign(stamp=1.5), assume_sorted=True), tail=True)
+                assert warehouse.seen() == {}
+            assert warehouse.refresh(TelemetryFrame(df.assign(stamp=1.5), assume_sorted=True)) == len(df)
+            assert warehouse.con.execute("SELECT COUNT(*), MIN(stamp) FROM telemetry").fetchone() == (len(df), 1.5)
+        finally:
+            warehouse.con.close()
+
+
+class Session:
+    """What one rerun of app.py holds: the cursor, the window parameters and the data version."""
+
+    def __init__(self, warehouse: AnalyticsWarehouse, cache: QueryCache, machines, from_dt, to_dt):
+        self.con = warehouse.cursor()
+        self.params = window_params(machines, from_dt, to_dt)
+        self.fingerprint = warehouse.version()
+        self.cache = cache
+
+    def run(self, sql, params=None):
+        return self.cache.fetch(self.con, sql, self.params if params is None and "?" in sql else params, self.fingerprint)
+
+    def execute(self, sql):
+        return self.con.execute(sql, self.params).df()
+
+
+@pytest.fixture
+def events_warehouse(tmp_path):
+    df = event_telemetry(8_000, 3, "exec", seed=1)
+    warehouse, tracker = AnalyticsWarehouse(str(tmp_path)), EventTracker()
+    load_events(warehouse, tracker, df[df["time"] <= df["time"].quantile(0.7)].reset_index(drop=True))
+    yield df, warehouse, tracker
+    warehouse.con.close()
+
+
+def test_query_cache_hits_and_misses(events_warehouse):
+    df, warehouse, tracker = events_warehouse
+    machines = list(df["name"].cat.categories)
+    from_dt, to_dt = window_bounds(df)
+    cache = QueryCache()
+    s = Session(warehouse, cache, machines, from_dt, to_dt)
+    first = s.run(PIECES_SQL)
+    again = s.run(" ".join(PIECES_SQL.split()) + ";")
+    assert cache.hits == 1 and again.equals(first)  # other whitespace is a hit
+    again["pieces"] = -1
+    assert s.run(PIECES_SQL).equals(first)  # hits are copies
+
+    other = Session(warehouse, cache, machines[:1], from_dt, to_dt)
+    misses = cache.misses
+    assert other.run(PIECES_SQL).equals(other.execute(PIECES_SQL)) and cache.misses == misses + 1
+
+    count_sql = "SELECT COUNT(*) AS n FROM part_events(?::VARCHAR[], ?, ?)"
+    later = window_params(machines, from_dt + pd.Timedelta(hours=3), to_dt)
+    assert int(s.run(count_sql)["n"].iloc[0]) > int(s.run(count_sql, later)["n"].iloc[0])
+
+    load_events(warehouse, tracker, df)
+    s = Session(warehouse, cache, machines, from_dt, to_dt)
+    fresh = s.run(PIECES_SQL)
+    assert fresh["pieces"].sum() > first["pieces"].sum() and fresh.equals(s.execute(PIECES_SQL))
+
+
+def test_query_cache_is_size_bounded(events_warehouse):
+    df, warehouse, _ = events_warehouse
+    from_dt, to_dt = window_bounds(df)
+    s = Session(warehouse, QueryCache(), list(df["name"].cat.categories), from_dt, to_dt)
+    bound = int(s.run(PIECES_SQL).memory_usage(index=True, deep=True).sum()) + 100
+    s.cache = small = QueryCache(max_bytes=bound)
+    for sql in (PIECES_SQL, SIGNAL_SQL, "SELECT 1 AS one", PIECES_SQL):
+        s.run(sql)
+    st = small.stats()
+    assert st["bytes"] <= bound and st["evictions"] >= 2 and st["hits"] == 0
+
+
+def test_normalize_sql_keeps_string_literals():
+    assert normalize_sql("SELECT 'a  b'  AS x ;") == "SELECT 'a  b' AS x"
+    assert normalize_sql("SELECT\n  1\t AS one;") == "SELECT 1 AS one"
+
+
+def test_normalize_sql_keeps_comments_and_quoted_names():
+    assert normalize_sql("-- x\nSELECT 1") != normalize_sql("-- x SELECT 1")
+    assert normalize_sql("-- x\nSELECT  1") == "-- x\nSELECT 1"
+    assert normalize_sql('SELECT "a  b"  FROM t') == 'SELECT "a  b" FROM t'
+    assert normalize_sql("SELECT /* a   b */  1 ;") == "SELECT /* a   b */ 1"
+    assert normalize_sql("SELECT '--  x'  ,\n 2") == "SELECT '--  x' , 2"
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the single time series figure (display.timeseries_figure)
+
+timeseries_chart used to build two SVG figures, the multi-axis chart and a
+normalized copy of every signal. Now one figure carries each signal once and
+switches between both views in the browser (buttons that move the traces to
+per-signal axes spanning [min, max]), with Scattergl above
+SCATTERGL_MIN_POINTS. Compares payload and build + JSON time with the
+two former figures for 1M-point signals. Traces, axes and buttons are
+checked by tests/test_display.py.
+
+    python tests/timeseries_figure_benchmark.py
+    python tests/timeseries_figure_benchmark.py --points 2000000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from synthetic import chart_inputs, time_signals
+from display import Y_AXES, plot_time, timeseries_figure
+
+
+def legacy_figures(data: pd.DataFrame, axis_assignment, ranges):
+    """The two SVG figures of timeseries_chart before (x already as epoch ms)."""
+    x = plot_time(data.index)
+    fig, fig_norm = go.Figure(), go.Figure()
+    for col, axis in axis_assignment.items():
+        fig.add_trace(go.Scatter(x=x, y=data[col], mode='lines', yaxis=axis, connectgaps=False))
+        r = ranges[col]
+        norm = (data[col] - r['min']) / r['range'] if r['range'] > 0 else pd.Series([0.5] * len(data))
+        fig_norm.add_trace(go.Scatter(x=x, y=norm, mode='lines', connectgaps=False))
+    layout = {k: v for k, v in (("yaxis" + a[1:], Y_AXES[a]) for a in set(axis_assignment.values()))}
+    fig.update_layout(xaxis={'type': 'date'}, **layout)
+    fig_norm.update_layout(xaxis={'type': 'date'})
+    return [fig, fig_norm]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=1_000_000, help="points per signal of the timing figure")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.points:,} points x 5 signals")
+    data = time_signals(args.points, 4)
+    axis_assignment, ranges = chart_inputs(data)
+    for label, build in (("two SVG figures (before)", lambda: legacy_figures(data, axis_assignment, ranges)),
+                         ("one figure, Scattergl", lambda: [timeseries_figure(data, plot_time(data.index), axis_assignment,
+                                                                              ranges, "raw", "normalized")])):
+        t0 = time.perf_counter()
+        size = sum(len(pio.to_json(f, validate=False)) for f in build())
+        print(f"  {label:<25} build + JSON {time.perf_counter() - t0:6.2f}s, {size / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
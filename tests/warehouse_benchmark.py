@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the persistent DuckDB store (warehouse.AnalyticsWarehouse)
+
+Times the initial load and a refresh without new rows, then one rerun of
+each: connect + register of the in-memory connection the app used to build
+vs. a cursor on the warehouse, plus a preset query. That window queries and
+the event macros return what the in-memory path returns is checked by
+tests/test_warehouse.py.
+
+    python tests/warehouse_benchmark.py
+    python tests/warehouse_benchmark.py --rows 5000000
+"""
+
+import argparse
+import tempfile
+import time
+
+import duckdb
+
+from synthetic import event_telemetry, signal_telemetry, window_bounds
+from events import EventTracker
+from telemetry import TelemetryFrame
+from warehouse import AnalyticsWarehouse, window_params
+
+PRESET_SQL = "SELECT name, COUNT(*) AS pieces FROM part_events GROUP BY name ORDER BY pieces DESC"
+PRESET_SQL_PARAMS = "SELECT name, COUNT(*) AS pieces FROM part_events(?::VARCHAR[], ?, ?) GROUP BY name ORDER BY pieces DESC"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="rows of the timing dataset")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.rows:,} rows x 30 signal columns, 5 machines")
+    df = signal_telemetry(args.rows, 30, 5)
+    tf = TelemetryFrame(df, assume_sorted=True)
+    machines = list(df["name"].cat.categories)
+    from_dt, to_dt = window_bounds(df)
+    with tempfile.TemporaryDirectory() as state_dir:
+        t0 = time.perf_counter()
+        warehouse = AnalyticsWarehouse(state_dir)
+        warehouse.refresh(tf)
+        print(f"  initial load into the database file:  {time.perf_counter() - t0:.2f}s")
+        t0 = time.perf_counter()
+        warehouse.refresh(tf)
+        print(f"  refresh without new rows:             {time.perf_counter() - t0:.4f}s")
+        tracker = EventTracker()
+        tracker.refresh(TelemetryFrame(event_telemetry(100_000, 5, "exec"), assume_sorted=True))
+        warehouse.sync_events(tracker)
+
+        def legacy_rerun():
+            con = duckdb.connect(database=":memory:")
+            con.execute("SET TimeZone='UTC'")
+            con.register("events", tf.window(machines, from_dt, to_dt).df)
+            con.register("part_events", tracker.part_events(machines, from_dt, to_dt))
+            con.register("setup_intervals", tracker.setup_intervals(machines, from_dt, to_dt))
+            return con.execute(PRESET_SQL).df()
+
+        def warehouse_rerun():
+            return warehouse.cursor().execute(PRESET_SQL_PARAMS, window_params(machines, from_dt, to_dt)).df()
+
+        for label, fn in (("in-memory connect + register", legacy_rerun), ("warehouse cursor", warehouse_rerun)):
+            t0 = time.perf_counter()
+            for _ in range(10):
+                fn()
+            print(f"  {label:<29} + preset: {(time.perf_counter() - t0) / 10 * 1000:.1f} ms per rerun")
+        warehouse.con.close()
+
+
+if __name__ == "__main__":
+    main()